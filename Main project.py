@@ -1,183 +1,94 @@
 """
 The main idea of this code is to implement a GUI-based car management and shopping application.
 It supports user login, shopping cart functionality, and admin management for users and cars.
-The app uses Pickle library to persist data, Tkinter for the graphical interface, Glob to automatically
-gather all PNG files in the current directory instead of hard-coding the filenames and Math to specifically
-calculate the number of rows needed for the “Available Cars” panel (the main user panel where available cars are shown).
+The app persists data through the stores in database.py (Pickle files by default, SQLite with --storage sqlite),
+uses Tkinter for the graphical interface, Glob to automatically gather all PNG files in the current directory
+instead of hard-coding the filenames, and a virtualized grid (widgets.py) for the “Available Cars” panel (the main
+user panel where available cars are shown) so only the cars in view are turned into widgets. Users can search that
+panel by text, brand and price range. The shop's rules (logins, validation, carts, purchases) live in service.py,
+which the App only calls, so the same shop can also be served over HTTP by server.py.
+Start it with --profile to see panel build times, widget counts and store and image timings in an overlay (F12
+hides it) and to get them as JSON (metrics.json) on exit.
 """
 
+import argparse
 import glob
-import pickle
-import math
+import time
 from tkinter import *
 from tkinter import messagebox, ttk
 
-#Shows a car with basic attributes: brand, model, price, description, and image.
-class Car:
-    def __init__(self, brand, model, price, description, photo):
-        self.brand = brand
-        self.model = model
-        self.price = price
-        self.description = description
-        self.photo = photo
-
-# Represents a user with a username, password, and an account balance.
-class User:
-    def __init__(self, username, password, balance=0.0):
-        self.username = username
-        self.password = password
-        self.balance = balance
-
-# Shows an admin user, extending the User class with authentication logic.
-class Admin(User):
-    # Stores admin credentials
-    admin_credentials = {"admin": "admin123"}
-
-    #Validates if the given username and password match the admin credentials
-    def authenticate(self, username, password):
-        return Admin.admin_credentials.get(username) == password
-
-#Handles shopping cart functionality, including adding, removing, clearing, and saving items.
-class Cart:
-    def __init__(self):
-        self.items = []
-        self.load_cart()  # Loads saved cart data
-
-    def add(self, car):
-        self.items.append(car)
-        print(f"{car.model} added to the cart!")
-
-    def remove(self, car):
-        if car in self.items:
-            self.items.remove(car)
-            print(f"{car.model} removed from the cart!")
-
-    def clear(self):
-        self.items = []
-        print("Cart cleared!")
-
-    #Calculates the total cost of all items in the cart.
-    def get_total_cost(self):
-        return sum(car.price for car in self.items)
-
-    # Saves cart items to a file.
-    def save_cart(self):
-        with open('cart.pickle', 'wb') as f:
-            pickle.dump(self.items, f)
-
-    # Loads cart items from a file, or initializes as empty if the file doesn't exist.
-    def load_cart(self):
-        try:
-            with open('cart.pickle', 'rb') as f:
-                self.items = pickle.load(f)
-        except FileNotFoundError:
-            self.items = []
-
-#Manages the database of cars, including adding, updating, deleting, and saving cars.
-class CarDatabase:
-    def __init__(self):
-        self.cars = []
-        self.load_car_database()  # Loads saved car data
-
-    def add(self, car):
-        self.cars.append(car)
-        self.save_car_database()  # Saves changes to the database
-
-    def update(self, index, updated_car):
-        if 0 <= index < len(self.cars):
-            self.cars[index] = updated_car
-            self.save_car_database()
-
-    def delete(self, index):
-        if 0 <= index < len(self.cars):
-            del self.cars[index]
-            self.save_car_database()
-
-    #Saves the car database to a file.
-    def save_car_database(self):
-        with open('car_database.pickle', 'wb') as f:
-            pickle.dump(self.cars, f)
-
-    # Loads the car database from a file, or initializes with default cars if the file doesn't exist.
-    def load_car_database(self):
-        try:
-            with open('car_database.pickle', 'rb') as f:
-                car_data = pickle.load(f)
-                self.cars = [Car(**car) if isinstance(car, dict) else car for car in car_data]
-        except FileNotFoundError:
-            #default car data if no database exists.
-            self.cars = [
-                Car("Mercedes-Benz", "S500", 60000, "Luxury Sedan", "mers_s500.png"),
-                Car("Mercedes-Benz", "G 63 AMG", 63000, "Brutal", "mers_gwagon.png"),
-                Car("Volkswagen", "ID.6", 3500, "Compact Car", "vw.png"),
-                Car("Porsche", "Panamera 4S", 22000, "Luxury Sports Car", "pors.png")
-            ]
-
-# Manages the database of users, including adding, updating, deleting, and authenticating users.
-class UserDatabase:
-    def __init__(self):
-        self.users = {}
-        self.load_user_database()  #loads saved user data
-
-    def add(self, user):
-        self.users[user.username] = user
-        self.save_user_database()
-
-    def update(self, username, updated_user):
-        self.users[username] = updated_user
-        self.save_user_database()
-
-    def delete(self, username):
-        if username in self.users:
-            del self.users[username]
-        self.save_user_database()
-
-    def authenticate(self, username, password):
-        user = self.users.get(username)
-        if user and user.password == password:
-            return user
-        return None
-
-    #saves the user database to a file.
-    def save_user_database(self):
-        with open('user_database.pickle', 'wb') as f:
-            pickle.dump(self.users, f)
-
-    # loads the user database from a file, or initializes as empty if the file doesn't exist.
-    def load_user_database(self):
-        try:
-            with open('user_database.pickle', 'rb') as f:
-                self.users = pickle.load(f)
-                for username, data in self.users.items():
-                    if isinstance(data, str):
-                        self.users[username] = User(username, data, 0.0)
-        except FileNotFoundError:
-            self.users = {}
+from images import ImageLoader, detail_size, thumbnail_size
+from profiling import Overlay, metrics
+from service import ShopError, ShopService
+from storage import PickleBackend, SqliteBackend
+from widgets import PagedTable, Router, VirtualGrid
 
 #The main application class, responsible for managing GUI components and interactions.
 class App:
-    def __init__(self, root):
+    poll_ms = 1000  # how often to look for changes made by other kiosks sharing the data files
+    # Stores shown by each panel: when another kiosk changes one of them, the panel on screen is refreshed
+    panel_stores = {"user": {"cars", "users"}, "car_info": {"cars", "stock"}, "checkout": {"cars", "users", "carts"},
+                    "car_management": {"cars"}, "user_management": {"users"}, "stats": {"cars", "users"}}
+
+    def __init__(self, root, backend=None):
         self.root = root
         self.root.geometry("1200x1000")
         self.root.resizable(True, True)
         self.root.configure(bg='black')
         self.root.bind("<F11>", self.toggle_fullscreen)  #enables fullscreen toggling with F11 key
 
-        self.cart = Cart()            #runs the shopping cart
-        self.car_db = CarDatabase()   # runs the car database
-        self.user_db = UserDatabase() #Runs the user database
+        self.service = ShopService(backend)  # accounts, catalogue, carts and purchases
+        self.car_db = self.service.car_db    # runs the car database
+        self.user_db = self.service.user_db  #Runs the user database
         self.current_user = None      # Keeps track of the logged-in user
+        self.cart = None              # shopping cart of the logged-in user
+        self.car_shown = None         # ID of the car in the car info panel
+        self.image_loader = ImageLoader(root)  # reads car images on worker threads
+        self.router = Router(root)  # shows one panel at a time and frees the panels that are left
 
         self.start_panel()  #launches the start panel
+        self.root.after(self.poll_ms, self.poll_changes)
 
     def toggle_fullscreen(self, event=None):
         #toggles fullscreen mode for the app window
         self.root.attributes("-fullscreen", not self.root.attributes("-fullscreen"))
 
+    def wait_for(self, future, callback): # calls callback() on the Tk thread once a future from a worker thread is done
+        if future.done():
+            callback()
+        else:
+            self.root.after(20, self.wait_for, future, callback)
+
+    def poll_changes(self):# picks up changes other kiosks made to the shared files and refreshes the panel on screen if it shows them
+        try:
+            changed = self.service.poll()
+            if "users" in changed and self.current_user:  # the balance may have been changed by an admin
+                self.current_user = self.user_db.users.get(self.current_user.username) or self.current_user
+            if "carts" in changed and self.cart:
+                self.cart.load_cart()
+            panel = self.router.current
+            if changed & self.panel_stores.get(panel, set()):
+                if panel == "checkout":
+                    self.checkout()
+                elif panel == "car_info":
+                    self.show_car_info(self.car_shown)
+                else:
+                    self.router.reopen(panel)  # kept panels only reload what they show
+        finally:
+            self.root.after(self.poll_ms, self.poll_changes)
+
+    def logout(self):# logs out and returns to the start panel; the next user gets fresh panels, not this session's search, filters and scroll position
+        for name in ("user", "car_management", "user_management", "stats"):
+            self.router.discard(name)
+        self.current_user = None
+        self.cart = None
+        self.start_panel()
+
     def start_panel(self):
         #Displays the initial panel with options to log in as admin, user, or exit
-        start_frame = Frame(self.root, bg="black")
-        start_frame.place(relx=0, rely=0, relwidth=1, relheight=1)
+        if self.router.reopen("start"):  # built once, nothing on it ever changes
+            return
+        start_frame = self.router.open("start", keep=True)
 
         # Button for admin login, goes to the admin login panel
         admin_btn = Button(start_frame, text="Admin", font=("Comic Sans Ms", 30),
@@ -196,8 +107,7 @@ class App:
 
     def login_panel_admin(self):
         #displays the login panel for admin users.
-        login_frame = Frame(self.root, bg="black")
-        login_frame.place(relx=0, rely=0, relwidth=1, relheight=1)
+        login_frame = self.router.open("admin_login")
 
         #Username label and entry field
         username_lbl = Label(login_frame, text="Username", font=("Comic Sans Ms", 25),
@@ -214,14 +124,27 @@ class App:
         password_entry.place(relx=0.3, rely=0.2, relwidth=0.3)
 
         def check_admin(): # Authenticates the admin using the provided credentials and redirects to the admin panel on success and displays an error message on failure
-            admin = Admin(username_entry.get(), password_entry.get())
-            if admin.authenticate(username_entry.get(), password_entry.get()):
-                messagebox.showinfo(title="Login Success",
-                                    message=f"Welcome, {username_entry.get()}!")
-                self.admin_panel()
-            else:
-                messagebox.showerror(title="Login Failed",
-                                     message="Invalid username or password")
+            username = username_entry.get()
+            try:  # the password is checked on a worker thread, the window keeps responding meanwhile
+                future = self.service.begin_login(username, password_entry.get(), admin=True)
+            except ShopError as e:
+                messagebox.showerror(title=e.title, message=str(e))
+                return
+            login_btn.config(state=DISABLED)
+
+            def done():
+                try:
+                    self.service.finish_login(username, future, admin=True)
+                except ShopError as e:
+                    if login_frame.winfo_exists():
+                        login_btn.config(state=NORMAL)
+                        messagebox.showerror(title=e.title, message=str(e))
+                    return
+                if login_frame.winfo_exists():  # still on this panel
+                    messagebox.showinfo(title="Login Success", message=f"Welcome, {username}!")
+                    self.admin_panel()
+
+            self.wait_for(future, done)
 
         # Button to initiate admin login authentication
         login_btn = Button(login_frame, text="Login", font=("Comic Sans Ms", 25), command=check_admin)
@@ -232,8 +155,7 @@ class App:
         back_btn.place(relx=0.9, rely=0, relwidth=0.1)
 
     def login_panel_user(self): # Displays the login panel for users (with login and create account options).
-        login_frame = Frame(self.root, bg="black")
-        login_frame.place(relx=0, rely=0, relwidth=1, relheight=1)
+        login_frame = self.router.open("user_login")
 
         #Username label and entry field
         username_lbl = Label(login_frame, text="Username", font=("Comic Sans Ms", 25),
@@ -250,29 +172,54 @@ class App:
         password_entry.place(relx=0.3, rely=0.2, relwidth=0.3)
 
         def check_user(): #authenticates the user using the provided credentials. If successful, logs the user in and redirects to the user panel. Otherwise, displays an error message
-            user = self.user_db.authenticate(username_entry.get(), password_entry.get())
-            if user:
-                self.current_user = user
-                messagebox.showinfo(title="Login Success",
-                                    message=f"Welcome, {username_entry.get()}!")
-                self.show_user_panel()
-            else:
-                messagebox.showerror(title="Login Failed",
-                                     message="Invalid username or password")
+            username = username_entry.get()
+            try:  # the password is checked on a worker thread, the window keeps responding meanwhile
+                future = self.service.begin_login(username, password_entry.get())
+            except ShopError as e:
+                messagebox.showerror(title=e.title, message=str(e))
+                return
+            login_btn.config(state=DISABLED)
+
+            def done():
+                try:
+                    user = self.service.finish_login(username, future)
+                except ShopError as e:
+                    if login_frame.winfo_exists():
+                        login_btn.config(state=NORMAL)
+                        messagebox.showerror(title=e.title, message=str(e))
+                    return
+                if login_frame.winfo_exists():  # still on this panel
+                    self.current_user = user
+                    self.cart = self.service.cart(user.username)
+                    messagebox.showinfo(title="Login Success", message=f"Welcome, {username}!")
+                    self.show_user_panel()
+
+            self.wait_for(future, done)
 
         def create_account():# creates a new user account with the entered username and password and checks for duplicate usernames (or passwords) or empty fields and displays appropriate error messages
-            username = username_entry.get()
-            password = password_entry.get()
-            if username in self.user_db.users:
-                messagebox.showerror(title="Error", message="User already exists!")
-            elif not username or not password:
-                messagebox.showerror(title="Error",
-                                     message="Username and Password must not be empty!")
-            else:
-                new_user = User(username, password)
-                self.user_db.add(new_user)
-                messagebox.showinfo(title="Success",
-                                    message="Account created successfully!")
+            username, password = username_entry.get(), password_entry.get()
+            try:  # checked before the password is hashed, which happens on a worker thread
+                self.service.check_new_account(username, password)
+            except ShopError as e:
+                messagebox.showerror(title=e.title, message=str(e))
+                return
+            future = self.service.begin_hash(password)
+            create_account_btn.config(state=DISABLED)
+
+            def done():
+                try:
+                    self.service.create_account(username, password, future.result())
+                except ShopError as e:
+                    if login_frame.winfo_exists():
+                        create_account_btn.config(state=NORMAL)
+                        messagebox.showerror(title=e.title, message=str(e))
+                    return
+                if login_frame.winfo_exists():  # still on this panel
+                    create_account_btn.config(state=NORMAL)
+                    messagebox.showinfo(title="Success",
+                                        message="Account created successfully!")
+
+            self.wait_for(future, done)
 
         # Button to log in the user
         login_btn = Button(login_frame, text="Login", font=("Comic Sans Ms", 25),
@@ -289,9 +236,9 @@ class App:
                           command=self.start_panel)
         back_btn.place(relx=0.9, rely=0, relwidth=0.1)
 
-    def checkout(self):#displays the checkout panel with a scrollable list of cart items
-        checkout_frame = Frame(self.root, bg="black")
-        checkout_frame.place(relx=0, rely=0, relwidth=1, relheight=1)
+    def checkout(self):#displays the checkout panel with a scrollable list of cart items; removing a car only updates its own row and the total
+        checkout_frame = self.router.open("checkout")
+        self.cart.recount()  # prices may have changed elsewhere since the cart was last counted
 
         # title of the checkout page
         title_label = Label(checkout_frame, text="Your Cart", font=("Comic Sans Ms", 35),
@@ -309,24 +256,50 @@ class App:
         canvas.create_window((0, 0), window=inner_frame, anchor="nw")
         inner_frame.bind("<Configure>", lambda e: canvas.configure(scrollregion=canvas.bbox("all")))
 
+        def car_details(car, quantity): # text of one cart row
+            details = f"Brand: {car.brand} | Model: {car.model} | Price: ${car.price:.2f}"
+            return details + f" x {quantity}" if quantity > 1 else details
+
+        rows = {}  # car ID -> (label, delete button) of its row
+
         #fills the inner frame with each cart item with extra spacing
-        for i, car in enumerate(self.cart.items):
-            car_details = f"Brand: {car.brand} | Model: {car.model} | Price: ${car.price:.2f}"
-            car_lbl = Label(inner_frame, text=car_details, font=("Comic Sans Ms", 18),
+        for i, (car, quantity) in enumerate(self.cart.items()):
+            car_lbl = Label(inner_frame, text=car_details(car, quantity), font=("Comic Sans Ms", 18),
                             bg="lightgray", fg="black")
             car_lbl.grid(row=i, column=0, padx=30, pady=15, sticky="w")
             #Button to delete this item from the cart
             delete_btn = Button(inner_frame, text="Delete", font=("Comic Sans Ms", 15),
-                                command=lambda i=i: self.remove_from_cart(i))
+                                command=lambda c=car.car_id: remove(c))
             delete_btn.grid(row=i, column=1, padx=30, pady=15)
+            rows[car.car_id] = (car_lbl, delete_btn)
 
-        total_cost = self.cart.get_total_cost() # Calculates the total cost of items in the cart
-
-        # Label to display the total cost
-        total_label = Label(checkout_frame, text=f"Total Cost: ${total_cost:.2f}",
-                            font=("Comic Sans Ms", 25), bg="black", fg="white")
+        # Label to display the total cost (kept up to date by the cart, nothing is added up here)
+        total_label = Label(checkout_frame, font=("Comic Sans Ms", 25), bg="black", fg="white")
         total_label.place(relx=0.1, rely=0.8)
 
+        def show_total():
+            count = self.cart.get_count()
+            total_label.configure(text=f"Total Cost: ${self.cart.get_total_cost():.2f} "
+                                       f"({count} car{'s' if count != 1 else ''})")
+
+        def remove(car_id): # removes one of the car, then updates its row (or drops it) and the total
+            others = {c: q for c, q in self.cart.lines.items() if c != car_id}
+            self.remove_from_cart(car_id)
+            if {c: q for c, q in self.cart.lines.items() if c != car_id} != others:
+                self.checkout()  # the cart was also changed from elsewhere: show it all again
+                return
+            quantity = self.cart.lines.get(car_id, 0)
+            car_lbl, delete_btn = rows[car_id]
+            if quantity and car_id in self.car_db.cars:
+                car_lbl.configure(text=car_details(self.car_db.cars[car_id], quantity))
+            else:
+                car_lbl.destroy()
+                delete_btn.destroy()
+                del rows[car_id]
+            show_total()
+
+        show_total()
+
         # Button to confirm the purchase
         purchase_btn = Button(checkout_frame, text="Purchase", font=("Comic Sans Ms", 20),
                               command=self.confirm_purchase)
@@ -338,80 +311,123 @@ class App:
         back_btn.place(relx=0.9, rely=0, relwidth=0.1)
 
     def confirm_purchase(self):# confirms the purchase: checks balance, deducts cost, updates database, and clears the cart.
-        total_cost = self.cart.get_total_cost()
-        if total_cost > self.current_user.balance: #Notifies the user if they don't have enough funds
-            messagebox.showerror("Insufficient Funds",
-                                 "You do not have enough balance to complete the purchase.")
+        try:  # deducts the total cost from the balance and clears the cart, unless the funds are too low
+            self.current_user = self.service.purchase(self.current_user.username)
+        except ShopError as e:
+            messagebox.showerror(e.title, str(e))
+            self.checkout()  # shows the cart as it is now (a car that was deleted meanwhile has been taken out)
             return
 
-        self.current_user.balance -= total_cost # Deducts total cost from user's balance
-        self.user_db.update(self.current_user.username, self.current_user) #updates user data in the database
-
-        #Clears the cart and saves it
-        self.cart.clear()
-        self.cart.save_cart()
-
         # Notifies the user of a successful purchase
         messagebox.showinfo("Success",
                             "Purchase completed successfully! Your order will arrive soon.")
         self.show_user_panel() #Redirects the user back to the user panel
 
-    def remove_from_cart(self, index):# Removes a specific item from the user's cart by index and saves the updated cart data and refreshes the checkout panel.
-        self.cart.items.pop(index)  #Removes the item from the cart
-        self.cart.save_cart()       #Saves the updated cart to file
-        self.checkout()             # Refreshes the checkout panel to reflect the change
+    def remove_from_cart(self, car_id):# Removes one of a car from the user's cart and saves the updated cart data (the checkout panel updates its row).
+        self.service.remove_from_cart(self.current_user.username, car_id)  #Removes the item and saves the cart
 
     def show_user_panel(self):# Displays the main user panel where available cars are shown.
-        user_frame = Frame(self.root, bg="black")
-        user_frame.place(relx=0, rely=0, relwidth=1, relheight=1)
+        if self.router.reopen("user"):  # already built, only the balance and the car list are refreshed
+            return
+
+        def refresh_user_panel():
+            balance_label.configure(text=f"Balance: ${self.current_user.balance:.2f}")
+            show_results(to_top=False)  # the catalogue may have changed since the panel was last shown
+
+        user_frame = self.router.open("user", keep=True, refresh=refresh_user_panel)
 
         #Title of the user panel
         title_label = Label(user_frame, text="Available Cars", font=("Comic Sans Ms", 35),
                             bg="black", fg="white")
         title_label.place(relx=0.05, rely=0.05)
 
-        #creates a scrollable canvas
-        cars_canvas = Canvas(user_frame, bg="black", highlightthickness=0)
-        cars_canvas.place(relx=0.05, rely=0.15, relwidth=0.9, relheight=0.7)
-        scrollbar = Scrollbar(user_frame, orient="vertical", command=cars_canvas.yview)
-        scrollbar.place(relx=0.95, rely=0.15, relwidth=0.03, relheight=0.7)
-        cars_canvas.configure(yscrollcommand=scrollbar.set)
-
-        user_frame.update_idletasks()
-        canvas_width = int(cars_canvas.winfo_width())
-        row_height = 260  #Fixed height per row
-        num_rows = math.ceil(len(self.car_db.cars) / 3)
-        inner_height = num_rows * row_height
-
-        inner_frame = Frame(cars_canvas, bg="black", width=canvas_width, height=inner_height)
-        cars_canvas.create_window((0, 0), window=inner_frame, anchor="nw")
-        inner_frame.bind("<Configure>", lambda e: cars_canvas.configure(scrollregion=cars_canvas.bbox("all")))
-
-        inner_width = canvas_width
-
-        # Displays all available cars
-        for i, car in enumerate(self.car_db.cars):
-            col = i % 3
-            row = i // 3
-            x = int(0.05 * inner_width + col * (0.3 * inner_width))
-            y = row * row_height
-            widget_width = int(0.25 * inner_width)
-
-            #Displays car image
+        # Search bar: free text, brand, price range and sort order
+        search_font = ("Comic Sans Ms", 15)
+        sort_orders = {"Catalogue order": None, "Price: low to high": "price", "Price: high to low": "-price"}
+
+        Label(user_frame, text="Search", font=search_font, bg="black", fg="white").place(relx=0.05, rely=0.115)
+        text_entry = Entry(user_frame, font=search_font)
+        text_entry.place(relx=0.11, rely=0.115, relwidth=0.17)
+        Label(user_frame, text="Brand", font=search_font, bg="black", fg="white").place(relx=0.29, rely=0.115)
+        brand_combo = ttk.Combobox(user_frame, values=["All brands"], font=search_font, state="readonly",
+                                   postcommand=lambda: brand_combo.configure(
+                                       values=["All brands"] + self.car_db.brands()))
+        brand_combo.current(0)
+        brand_combo.place(relx=0.34, rely=0.115, relwidth=0.14)
+        Label(user_frame, text="Price", font=search_font, bg="black", fg="white").place(relx=0.49, rely=0.115)
+        min_price_entry = Entry(user_frame, font=search_font)
+        min_price_entry.place(relx=0.54, rely=0.115, relwidth=0.07)
+        Label(user_frame, text="-", font=search_font, bg="black", fg="white").place(relx=0.615, rely=0.115)
+        max_price_entry = Entry(user_frame, font=search_font)
+        max_price_entry.place(relx=0.63, rely=0.115, relwidth=0.07)
+        sort_combo = ttk.Combobox(user_frame, values=list(sort_orders), font=search_font, state="readonly")
+        sort_combo.current(0)
+        sort_combo.place(relx=0.71, rely=0.115, relwidth=0.14)
+
+        # Results of the current search, fetched a page at a time as the grid scrolls
+        results = {"query": {}, "pages": {}}
+        page_size = 30
+
+        def result_at(index):
+            page = index // page_size
+            if page not in results["pages"]:
+                results["pages"][page] = self.car_db.search(**results["query"], offset=page * page_size,
+                                                            limit=page_size)[1]
+            return results["pages"][page][index % page_size]
+
+        def show_results(to_top):
+            results["pages"] = {}
+            cars_grid.set_count(self.car_db.search(**results["query"], limit=0)[0], to_top=to_top)
+
+        def run_search(event=None):
             try:
-                car_image = PhotoImage(file=car.photo)
-            except Exception:
-                car_image = None
-            if car_image:
-                image_label = Label(inner_frame, image=car_image, bg="black")
-                image_label.image = car_image #keeps a reference to avoid garbage collection
-                image_label.place(x=x, y=y, width=widget_width, height=150)
+                min_price = float(min_price_entry.get()) if min_price_entry.get() else None
+                max_price = float(max_price_entry.get()) if max_price_entry.get() else None
+            except ValueError:
+                messagebox.showerror("Error", "Price must be a number!")
+                return
+            brand = brand_combo.get()
+            results["query"] = dict(text=text_entry.get(), brand=None if brand == "All brands" else brand,
+                                    min_price=min_price, max_price=max_price, sort=sort_orders[sort_combo.get()])
+            show_results(to_top=True)
+
+        search_btn = Button(user_frame, text="Search", font=search_font, command=run_search)
+        search_btn.place(relx=0.86, rely=0.11, relwidth=0.1)
+        for widget in (text_entry, min_price_entry, max_price_entry):
+            widget.bind("<Return>", run_search)
+        for widget in (brand_combo, sort_combo):
+            widget.bind("<<ComboboxSelected>>", run_search)
+
+        # Scrollable grid of cars; only the rows in view get widgets, which are reused while scrolling
+        def make_car_cell(parent):
+            cell = Frame(parent, bg="black")
+            cell.image_label = Label(cell, bg="black", fg="gray", font=("Comic Sans Ms", 15))
+            cell.image_label.place(x=0, y=0, relwidth=1, height=150)
+            cell.car_btn = Button(cell, font=("Comic Sans Ms", 18))
+            cell.car_btn.place(x=0, y=160, relwidth=1, height=100)
+            return cell
+
+        def show_car_image(cell, index, car_image):
+            if cell.winfo_exists() and cell.index == index: # the cell may show another car by now
+                cell.image_label.configure(image=car_image or "", text="")
+                cell.image_label.image = car_image #keeps a reference to avoid garbage collection
+
+        def fill_car_cell(cell, index):
+            car = result_at(index)
+            cell.index = index
+            #Displays a placeholder until the car image (a cached thumbnail) has been loaded in the background
+            cell.image_label.configure(image="", text="Loading...")
+            cell.image_label.image = None
+            self.image_loader.request(car.photo, thumbnail_size,
+                                      lambda car_image: show_car_image(cell, index, car_image))
 
             # Shows car details and button to view more information
             details = f"Brand: {car.brand}\nModel: {car.model}\nPrice: ${car.price:.2f}"
-            car_btn = Button(inner_frame, text=details, font=("Comic Sans Ms", 18),
-                             command=lambda c=car: self.show_car_info(c))
-            car_btn.place(x=x, y=y+160, width=widget_width, height=100)
+            cell.car_btn.configure(text=details, command=lambda c=car.car_id: self.show_car_info(c))
+
+        cars_grid = VirtualGrid(user_frame, len(self.car_db.cars), make_car_cell, fill_car_cell,
+                                columns=3, row_height=260)
+        cars_grid.place(relx=0.05, rely=0.17, relwidth=0.93, relheight=0.68)
 
         #Displays user's current balance
         balance_label = Label(user_frame, text=f"Balance: ${self.current_user.balance:.2f}",
@@ -425,32 +441,41 @@ class App:
 
         #Back button to log out and return to the start panel
         back_btn = Button(user_frame, text="Back", font=("Comic Sans Ms", 20),
-                          command=self.start_panel)
+                          command=self.logout)
         back_btn.place(relx=0.9, rely=0, relwidth=0.1)
 
-    def show_car_info(self, car):#shows detailed information about a specific car, including its image, brand, model, price, and description. Users can add the car to their cart from this panel.
-        car_info_frame = Frame(self.root, bg="black")
-        car_info_frame.place(relx=0, rely=0, relwidth=1, relheight=1)
+    def show_car_info(self, car_id):#shows detailed information about a specific car, including its image, brand, model, price, and description. Users can add the car to their cart from this panel.
+        car = self.car_db.cars.get(car_id)
+        if car is None:  # deleted by an admin since the list was shown
+            messagebox.showerror("Error", "This car is no longer available.")
+            self.show_user_panel()
+            return
+        car_info_frame = self.router.open("car_info")
+        self.car_shown = car_id
 
         #Displays car details (brand, model, price, description)
         info = f"Brand: {car.brand}\nModel: {car.model}\nPrice: ${car.price:.2f}\nDescription: {car.description}"
+        available = self.service.available(car_id, self.current_user.username)
+        if available is not None:  # only cars with a stock count can run out
+            info += f"\nIn stock: {available}" if available else "\nSold out"
         info_label = Label(car_info_frame, text=info, font=("Comic Sans Ms", 25),
                            bg="black", fg="white", anchor="w", justify=LEFT)
         info_label.place(relx=0.1, rely=0.1, relwidth=0.6)
 
-        # Shows car image
-        try:
-            car_image = PhotoImage(file=car.photo)
-        except Exception:
-            car_image = None
-        if car_image:
-            image_label = Label(car_info_frame, image=car_image, bg="black")
-            image_label.image = car_image  #keeps a reference to avoid garbage collection
-            image_label.place(relx=0.1, rely=0.4, relwidth=0.5, relheight=0.4)
+        # Shows car image once it has been loaded in the background
+        image_label = Label(car_info_frame, text="Loading...", font=("Comic Sans Ms", 15), bg="black", fg="gray")
+        image_label.place(relx=0.1, rely=0.4, relwidth=0.5, relheight=0.4)
+
+        def show_car_image(car_image):
+            if image_label.winfo_exists():
+                image_label.configure(image=car_image or "", text="")
+                image_label.image = car_image  #keeps a reference to avoid garbage collection
+
+        self.image_loader.request(car.photo, detail_size, show_car_image)
 
         # Button to add this car to the cart
         add_to_cart_btn = Button(car_info_frame, text="Add to Cart", font=("Comic Sans Ms", 20),
-                                 command=lambda: self.add_to_cart(car))
+                                 command=lambda: self.add_to_cart(car_id))
         add_to_cart_btn.place(relx=0.1, rely=0.85, relwidth=0.2)
 
         #Back button to return to the user panel
@@ -458,14 +483,18 @@ class App:
                           command=self.show_user_panel)
         back_btn.place(relx=0.9, rely=0, relwidth=0.1)
 
-    def add_to_cart(self, car): # Adds the selected car to the user's cart, saves the updated cart data, and notifies the user of the addition.
-        self.cart.add(car)  #Adds the car to the cart
-        self.cart.save_cart()  # Saves the updated cart
+    def add_to_cart(self, car_id): # Adds the selected car to the user's cart, saves the updated cart data, and notifies the user of the addition.
+        try:  # the car may have been deleted by an admin in the meantime
+            car = self.service.add_to_cart(self.current_user.username, car_id)
+        except ShopError as e:
+            messagebox.showerror(e.title, str(e))
+            return
         messagebox.showinfo("Cart", f"{car.model} added to your cart!")  # Notifies the user
 
     def admin_panel(self):#displays the admin panel with options to manage cars or users
-        admin_frame = Frame(self.root, bg="black")
-        admin_frame.place(relx=0, rely=0, relwidth=1, relheight=1)
+        if self.router.reopen("admin"):  # built once, nothing on it ever changes
+            return
+        admin_frame = self.router.open("admin", keep=True)
         
         # Button to manage cars, redirects to the car management panel
         cars_btn = Button(admin_frame, text="Cars", font=("Comic Sans Ms", 30),
@@ -477,88 +506,140 @@ class App:
                            command=self.user_management_panel)
         users_btn.place(relx=0.3, rely=0.45, relwidth=0.3)
 
+        #button to show statistics about the cars and users
+        stats_btn = Button(admin_frame, text="Stats", font=("Comic Sans Ms", 30),
+                           command=self.stats_panel)
+        stats_btn.place(relx=0.3, rely=0.6, relwidth=0.3)
+
         # Button to log out and return to the start panel
         back_btn = Button(admin_frame, text="Log Out", font=("Comic Sans Ms", 20),
-                          command=self.start_panel)
+                          command=self.logout)
         back_btn.place(relx=0.9, rely=0, relwidth=0.1)
 
-    def car_management_panel(self):# displays the admin car management panel with a scrollable list of cars.
-        car_frame = Frame(self.root, bg="black")
-        car_frame.place(relx=0, rely=0, relwidth=1, relheight=1)
+    def car_management_panel(self):# displays the admin car management panel: a table of the cars, one page at a time, that can be sorted and filtered
+        if self.router.reopen("car_management"):  # keeps its sort order, filter and page, only the rows are reloaded
+            return
+        car_frame = self.router.open("car_management", keep=True, refresh=lambda: car_table.refresh())
 
         #Title for the car management panel
         title_label = Label(car_frame, text="Car Management", font=("Comic Sans Ms", 35),
                             bg="black", fg="white")
         title_label.place(relx=0.05, rely=0.05)
 
-        # Column headers for the car list
-        brand_label = Label(car_frame, text="Brand", font=("Comic Sans Ms", 20),
-                            bg="black", fg="white")
-        brand_label.place(relx=0.05, rely=0.2)
-        model_label = Label(car_frame, text="Model", font=("Comic Sans Ms", 20),
-                            bg="black", fg="white")
-        model_label.place(relx=0.25, rely=0.2)
-        price_label = Label(car_frame, text="Price", font=("Comic Sans Ms", 20),
-                            bg="black", fg="white")
-        price_label.place(relx=0.45, rely=0.2)
-        action_label = Label(car_frame, text="Action", font=("Comic Sans Ms", 20),
-                             bg="black", fg="white")
-        action_label.place(relx=0.65, rely=0.2)
+        def fetch_cars(sort, text, offset, limit): # one page of cars as table rows, sorted and filtered by the car database
+            total, cars = self.service.search_cars(text=text, sort=sort, offset=offset, limit=limit)
+            return total, [(car.car_id, (car.car_id, car.brand, car.model, f"${car.price:.2f}")) for car in cars]
 
-        #creates a canvas with a light gray background.
-        canvas = Canvas(car_frame, bg="lightgray", highlightthickness=0)
-        canvas.place(relx=0.05, rely=0.25, relwidth=0.9, relheight=0.55)
-        scrollbar = Scrollbar(car_frame, orient="vertical", command=canvas.yview)
-        scrollbar.place(relx=0.95, rely=0.25, relwidth=0.05, relheight=0.55)
-        canvas.configure(yscrollcommand=scrollbar.set)
+        # Table of the cars: click a column heading to sort, type in the filter box to search
+        car_table = PagedTable(car_frame, [("id", "ID", 80), ("brand", "Brand", 260), ("model", "Model", 260),
+                                           ("price", "Price", 200)],
+                               fetch_cars, sortable=("brand", "model", "price"))
+        car_table.place(relx=0.05, rely=0.15, relwidth=0.9, relheight=0.67)
+        car_table.show_page(0)
 
-        inner_frame = Frame(canvas, bg="lightgray")
-        canvas.create_window((0, 0), window=inner_frame, anchor="nw")
-        inner_frame.bind("<Configure>", lambda e: canvas.configure(scrollregion=canvas.bbox("all")))
+        def selected_car(): # ID of the car selected in the table, or None (after telling the admin to select one)
+            car_id = car_table.selected()
+            if car_id is None:
+                messagebox.showerror("No Car Selected", "Select a car in the table first.")
+            return car_id
 
-        #Shows each car in the database with update and delete options
-        for i, car in enumerate(self.car_db.cars):
-            brand_lbl = Label(inner_frame, font=("Comic Sans Ms", 18), text=car.brand,
-                              bg="lightgray", fg="black")
-            brand_lbl.grid(row=i, column=0, padx=30, pady=15, sticky="w")
-            model_lbl = Label(inner_frame, font=("Comic Sans Ms", 18), text=car.model,
-                              bg="lightgray", fg="black")
-            model_lbl.grid(row=i, column=1, padx=30, pady=15, sticky="w")
-            price_lbl = Label(inner_frame, font=("Comic Sans Ms", 18),
-                              text=f"${car.price:.2f}", bg="lightgray", fg="black")
-            price_lbl.grid(row=i, column=2, padx=30, pady=15, sticky="w")
-
-            # Button to update this car's details
-            update_btn = Button(inner_frame, text="Update", font=("Comic Sans Ms", 15),
-                                command=lambda i=i: self.open_car_form("Update", i))
-            update_btn.grid(row=i, column=3, padx=30, pady=15)
-
-            #Button to delete this car from the database
-            delete_btn = Button(inner_frame, text="Delete", font=("Comic Sans Ms", 15),
-                                command=lambda i=i: self.delete_car(i))
-            delete_btn.grid(row=i, column=4, padx=30, pady=15)
+        def update_car():
+            car_id = selected_car()
+            if car_id is not None:
+                self.open_car_form("Update", car_id)
+
+        def delete_car():
+            car_id = selected_car()
+            if car_id is not None:
+                self.delete_car(car_id)
+
+        car_table.tree.bind("<Double-1>", lambda e: update_car())  # double-clicking a car opens it for updating
 
         # Button to add a new car
         add_car_btn = Button(car_frame, text="Add a new car", font=("Comic Sans Ms", 20),
                              command=lambda: self.open_car_form("Add"))
-        add_car_btn.place(relx=0.1, rely=0.85, relwidth=0.2)
+        add_car_btn.place(relx=0.05, rely=0.85, relwidth=0.2)
+
+        # Buttons to update or delete the selected car
+        update_btn = Button(car_frame, text="Update", font=("Comic Sans Ms", 20), command=update_car)
+        update_btn.place(relx=0.3, rely=0.85, relwidth=0.12)
+        delete_btn = Button(car_frame, text="Delete", font=("Comic Sans Ms", 20), command=delete_car)
+        delete_btn.place(relx=0.45, rely=0.85, relwidth=0.12)
 
         #Back button to return to the admin panel
         back_btn = Button(car_frame, text="Back", font=("Comic Sans Ms", 20),
                           command=self.admin_panel)
         back_btn.place(relx=0.8, rely=0.85, relwidth=0.1)
 
-    def delete_car(self, index): #Deletes a car from the database by its index and refreshes the car management panel to reflect the updated list.
-        self.car_db.delete(index)  # Removes the car from the database
+    def stats_panel(self):# displays statistics for the admin: catalogue size, prices per brand, total user balance and the richest users
+        if self.router.reopen("stats"):  # the statistics are kept up to date on every change, so only the numbers are shown again
+            return
+        stats_frame = self.router.open("stats", keep=True, refresh=lambda: show_stats())
+
+        #Title for the statistics panel
+        title_label = Label(stats_frame, text="Statistics", font=("Comic Sans Ms", 35),
+                            bg="black", fg="white")
+        title_label.place(relx=0.05, rely=0.05)
+
+        # Number of cars and users and the balance of all users together
+        totals_label = Label(stats_frame, font=("Comic Sans Ms", 20), bg="black", fg="white", anchor="w")
+        totals_label.place(relx=0.05, rely=0.14, relwidth=0.9)
+
+        columns = ["brand", "cars", "lowest", "lower", "median", "upper", "highest", "average"]
+
+        def fetch_brands(sort, text, offset, limit): # one page of the price statistics per brand, sorted and filtered
+            rows = [row for row in self.service.stats()[0].brand_prices() if (text or "").lower() in row[0].lower()]
+            if sort:
+                column = columns.index(sort.lstrip("-"))
+                rows.sort(key=lambda row: row[column] if column else row[0].lower(), reverse=sort.startswith("-"))
+            return len(rows), [(row[0], (row[0], row[1], *(f"${price:,.0f}" for price in row[2:])))
+                               for row in rows[offset:offset + limit]]
+
+        # Table of the price distribution per brand: lowest price, quartiles, highest and average
+        brand_table = PagedTable(stats_frame, [("brand", "Brand", 180), ("cars", "Cars", 70),
+                                               ("lowest", "Lowest", 110), ("lower", "25%", 110),
+                                               ("median", "Median", 110), ("upper", "75%", 110),
+                                               ("highest", "Highest", 110), ("average", "Average", 110)],
+                                 fetch_brands, sortable=("brand", "cars", "median", "average"), page_size=20)
+        brand_table.place(relx=0.05, rely=0.22, relwidth=0.6, relheight=0.6)
+
+        # The users with the highest balances
+        top_label = Label(stats_frame, text="Top users by balance", font=("Comic Sans Ms", 20),
+                          bg="black", fg="white")
+        top_label.place(relx=0.68, rely=0.2)
+        top_users = ttk.Treeview(stats_frame, columns=("user", "balance"), show="headings", style="Shop.Treeview")
+        top_users.heading("user", text="User")
+        top_users.heading("balance", text="Balance")
+        top_users.column("user", width=160, anchor="w")
+        top_users.column("balance", width=140, anchor="e")
+        top_users.place(relx=0.68, rely=0.27, relwidth=0.27, relheight=0.55)
+
+        def show_stats():
+            car_stats, user_stats = self.service.stats()
+            totals_label.configure(text=f"Cars: {car_stats.count}    Users: {len(user_stats.balances)}    "
+                                        f"Total balance: ${user_stats.total:,.2f}")
+            brand_table.refresh()
+            top_users.delete(*top_users.get_children())
+            for username, balance in user_stats.top(10):
+                top_users.insert("", "end", values=(username, f"${balance:,.2f}"))
+
+        show_stats()
+
+        #Back button to return to the admin panel
+        back_btn = Button(stats_frame, text="Back", font=("Comic Sans Ms", 20),
+                          command=self.admin_panel)
+        back_btn.place(relx=0.8, rely=0.87, relwidth=0.1)
+
+    def delete_car(self, car_id): #Deletes a car from the database by its ID and refreshes the car management panel to reflect the updated list.
+        self.service.delete_car(car_id)  # Removes the car from the database
         self.car_management_panel()  #Refreshes the panel
 
     def delete_user(self, username):# Deletes a user from the user database by username and refreshes the user management panel to reflect the updated list.
-        self.user_db.delete(username)  #removes the user from the database
+        self.service.delete_user(username)  #removes the user from the database
         self.user_management_panel()  # Refresh the panel
 
-    def open_car_form(self, action, car_index=None):# Opens a form for adding/updating a car.
-        form_frame = Frame(self.root, bg="black")
-        form_frame.place(relx=0, rely=0, relwidth=1, relheight=1)
+    def open_car_form(self, action, car_id=None):# Opens a form for adding/updating a car.
+        form_frame = self.router.open("car_form")
 
         #Title of the form, depending on whether the action is "Add" or "Update"
         title_label = Label(form_frame, text=f"{action} Car", font=("Comic Sans Ms", 35),
@@ -599,37 +680,34 @@ class App:
         if image_list:
             photo_combo.current(0)
 
-        if action == "Update" and car_index is not None:
+        # Cars in stock; left empty the car is not counted and never sells out
+        stock_label = Label(form_frame, text="Stock", font=("Comic Sans Ms", 20),
+                            bg="black", fg="white")
+        stock_label.place(relx=0.3, rely=0.77)
+        stock_entry = Entry(form_frame, font=("Comic Sans Ms", 20))
+        stock_entry.place(relx=0.4, rely=0.77, relwidth=0.1)
+
+        if action == "Update" and car_id is not None:
             # Pre-fill form fields with existing car data
-            car = self.car_db.cars[car_index]
+            car = self.car_db.cars[car_id]
             brand_entry.insert(0, car.brand)
             model_entry.insert(0, car.model)
             price_entry.insert(0, str(car.price))
             description_entry.insert(0, car.description)
             photo_combo.set(car.photo)
+            stock = self.service.stock(car_id)
+            if stock is not None:
+                stock_entry.insert(0, str(stock))
 
         def save_car():
-            brand = brand_entry.get()
-            model = model_entry.get()
-            price = price_entry.get()
-            description = description_entry.get()
-            photo = photo_combo.get()
-
-            if not brand or not model or not price or not description:
-                messagebox.showerror("Error", "All fields must be filled!")
-                return
-            try:
-                price = float(price)
-            except ValueError:
-                messagebox.showerror("Error", "Price must be a number!")
+            try:  # checks that every field is filled and the price is a number
+                self.service.save_car(brand_entry.get(), model_entry.get(), price_entry.get(),
+                                      description_entry.get(), photo_combo.get(),
+                                      car_id if action == "Update" else None, stock_entry.get())
+            except ShopError as e:
+                messagebox.showerror(e.title, str(e))
                 return
-
-            if action == "Add":
-                self.car_db.add(Car(brand, model, price, description, photo))
-                messagebox.showinfo("Success", "Car added successfully!")
-            elif action == "Update" and car_index is not None:
-                self.car_db.update(car_index, Car(brand, model, price, description, photo))
-                messagebox.showinfo("Success", "Car updated successfully!")
+            messagebox.showinfo("Success", f"Car {'added' if action == 'Add' else 'updated'} successfully!")
 
             self.car_management_panel()
 
@@ -641,8 +719,7 @@ class App:
         back_btn.place(relx=0.8, rely=0.85)
 
     def open_user_form(self, action, username=None):# opens a form for adding/updating a user.
-        form_frame = Frame(self.root, bg="black")
-        form_frame.place(relx=0, rely=0, relwidth=1, relheight=1)
+        form_frame = self.router.open("user_form")
 
         title_label = Label(form_frame, text=f"{action} User", font=("Comic Sans Ms", 35),
                             bg="black", fg="white")
@@ -666,38 +743,43 @@ class App:
         balance_entry = Entry(form_frame, font=("Comic Sans Ms", 20))
         balance_entry.place(relx=0.4, rely=0.5, relwidth=0.3)
 
+        version = None  # version of the user shown, so saving can't overwrite changes made in the meantime
         if action == "Update" and username:
             user = self.user_db.users.get(username)
+            version = user.version
             username_entry.insert(0, user.username)
             password_entry.insert(0, user.password)
             balance_entry.insert(0, str(user.balance))
 
         def save_user():
-            username_val = username_entry.get()
-            password_val = password_entry.get()
-            balance_val = balance_entry.get()
-            if not username_val or not password_val or not balance_val:
-                messagebox.showerror("Error", "All fields must be filled!")
-                return
-            try:
-                balance_val = float(balance_val)
-            except ValueError:
-                messagebox.showerror("Error", "Balance must be a valid number!")
+            name, password, balance = username_entry.get(), password_entry.get(), balance_entry.get()
+            try:  # checks that every field is filled, the balance is a number and new usernames are free
+                self.service.check_user_form(action, name, password, balance)
+            except ShopError as e:
+                messagebox.showerror(e.title, str(e))
                 return
-
-            if action == "Add":
-                if username_val in self.user_db.users:
-                    messagebox.showerror("Error", "User already exists!")
-                else:
-                    new_user = User(username_val, password_val, balance_val)
-                    self.user_db.add(new_user)
-                    messagebox.showinfo("Success", "User added successfully!")
-            elif action == "Update":
-                user = User(username_val, password_val, balance_val)
-                self.user_db.update(username_val, user)
-                messagebox.showinfo("Success", "User updated successfully!")
-
-            self.user_management_panel()
+            # a changed password is hashed on a worker thread, the window keeps responding meanwhile
+            # compared with the user the form was opened for, whose stored hash it shows, even if renamed
+            future = self.service.begin_hash(password) if self.service.password_changed(username, password) else None
+            save_btn.config(state=DISABLED)
+
+            def done():
+                try:
+                    self.service.save_user(action, name, password, balance, version if name == username else None,
+                                           future.result() if future else None, username)
+                except ShopError as e:
+                    if form_frame.winfo_exists():
+                        save_btn.config(state=NORMAL)
+                        messagebox.showerror(e.title, str(e))
+                    return
+                if form_frame.winfo_exists():  # still on this panel
+                    messagebox.showinfo("Success", f"User {'added' if action == 'Add' else 'updated'} successfully!")
+                    self.user_management_panel()
+
+            if future:
+                self.wait_for(future, done)
+            else:
+                done()
 
         save_btn = Button(form_frame, text="Save", font=("Comic Sans Ms", 20),
                           command=save_user)
@@ -706,65 +788,78 @@ class App:
                           command=self.user_management_panel)
         back_btn.place(relx=0.8, rely=0.7)
 
-    def user_management_panel(self):#displays the admin user management panel with a scrollable list of users.
-        user_frame = Frame(self.root, bg="black")
-        user_frame.place(relx=0, rely=0, relwidth=1, relheight=1)
+    def user_management_panel(self):#displays the admin user management panel: a table of the users, one page at a time, that can be sorted and filtered
+        if self.router.reopen("user_management"):  # keeps its sort order, filter and page, only the rows are reloaded
+            return
+        user_frame = self.router.open("user_management", keep=True, refresh=lambda: user_table.refresh())
 
         title_label = Label(user_frame, text="User Management", font=("Comic Sans Ms", 35),
                             bg="black", fg="white")
         title_label.place(relx=0.05, rely=0.05)
 
-        username_label = Label(user_frame, text="Username", font=("Comic Sans Ms", 20),
-                               bg="black", fg="white")
-        username_label.place(relx=0.05, rely=0.2)
-        password_label = Label(user_frame, text="Password", font=("Comic Sans Ms", 20),
-                               bg="black", fg="white")
-        password_label.place(relx=0.2, rely=0.2)
-        balance_label = Label(user_frame, text="Balance", font=("Comic Sans Ms", 20),
-                              bg="black", fg="white")
-        balance_label.place(relx=0.35, rely=0.2)
-        action_label = Label(user_frame, text="Action", font=("Comic Sans Ms", 20),
-                             bg="black", fg="white")
-        action_label.place(relx=0.6, rely=0.2)
+        def fetch_users(sort, text, offset, limit): # one page of users as table rows, sorted and filtered by the user database
+            total, users = self.service.search_users(text=text, sort=sort, offset=offset, limit=limit)
+            return total, [(user.username, (user.username, "*" * 8, f"${user.balance:.2f}")) for user in users]
 
-        #creates a canvas with same light gray background as before
-        canvas = Canvas(user_frame, bg="lightgray", highlightthickness=0)
-        canvas.place(relx=0.05, rely=0.25, relwidth=0.9, relheight=0.55)
-        scrollbar = Scrollbar(user_frame, orient="vertical", command=canvas.yview)
-        scrollbar.place(relx=0.95, rely=0.25, relwidth=0.05, relheight=0.55)
-        canvas.configure(yscrollcommand=scrollbar.set)
+        # Table of the users: click a column heading to sort, type in the filter box to search by username
+        user_table = PagedTable(user_frame, [("username", "Username", 300), ("password", "Password", 200),
+                                             ("balance", "Balance", 200)],
+                                fetch_users, sortable=("username", "balance"))
+        user_table.place(relx=0.05, rely=0.15, relwidth=0.9, relheight=0.67)
+        user_table.show_page(0)
 
-        inner_frame = Frame(canvas, bg="lightgray")
-        canvas.create_window((0, 0), window=inner_frame, anchor="nw")
-        inner_frame.bind("<Configure>", lambda e: canvas.configure(scrollregion=canvas.bbox("all")))
+        def selected_user(): # username selected in the table, or None (after telling the admin to select one)
+            username = user_table.selected()
+            if username is None:
+                messagebox.showerror("No User Selected", "Select a user in the table first.")
+            return username
 
-        #Shows each user in the database with update and delete options
-        for i, (username, user) in enumerate(self.user_db.users.items()):
-            username_lbl = Label(inner_frame, font=("Comic Sans Ms", 18), text=username,
-                                 bg="lightgray", fg="black")
-            username_lbl.grid(row=i, column=0, padx=50, pady=25, sticky="w")
-            password_lbl = Label(inner_frame, font=("Comic Sans Ms", 18),
-                                 text="*" * len(user.password), bg="lightgray", fg="black")
-            password_lbl.grid(row=i, column=1, padx=50, pady=25, sticky="w")
-            balance_lbl = Label(inner_frame, font=("Comic Sans Ms", 18),
-                                text=f"${user.balance:.2f}", bg="lightgray", fg="black")
-            balance_lbl.grid(row=i, column=2, padx=50, pady=25, sticky="w")
-            update_btn = Button(inner_frame, text="Update", font=("Comic Sans Ms", 15),
-                                command=lambda u=username: self.open_user_form("Update", u))
-            update_btn.grid(row=i, column=3, padx=50, pady=25)
-            delete_btn = Button(inner_frame, text="Delete", font=("Comic Sans Ms", 15),
-                                command=lambda u=username: self.delete_user(u))
-            delete_btn.grid(row=i, column=4, padx=50, pady=25)
+        def update_user():
+            username = selected_user()
+            if username is not None:
+                self.open_user_form("Update", username)
+
+        def delete_user():
+            username = selected_user()
+            if username is not None:
+                self.delete_user(username)
+
+        user_table.tree.bind("<Double-1>", lambda e: update_user())  # double-clicking a user opens it for updating
 
         add_user_btn = Button(user_frame, text="Add a new user", font=("Comic Sans Ms", 20),
                               command=lambda: self.open_user_form("Add"))
-        add_user_btn.place(relx=0.1, rely=0.85, relwidth=0.2)
+        add_user_btn.place(relx=0.05, rely=0.85, relwidth=0.2)
+        update_btn = Button(user_frame, text="Update", font=("Comic Sans Ms", 20), command=update_user)
+        update_btn.place(relx=0.3, rely=0.85, relwidth=0.12)
+        delete_btn = Button(user_frame, text="Delete", font=("Comic Sans Ms", 20), command=delete_user)
+        delete_btn.place(relx=0.45, rely=0.85, relwidth=0.12)
         back_btn = Button(user_frame, text="Back", font=("Comic Sans Ms", 20),
                           command=self.admin_panel)
         back_btn.place(relx=0.8, rely=0.85, relwidth=0.1)
 
 #Main function to initialize and run the application.
-root = Tk()
-root.title("Car Management Panel")
-app = App(root)
-root.mainloop()
\ No newline at end of file
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Car Management Panel")
+    parser.add_argument("--storage", choices=["pickle", "sqlite"], default="pickle",
+                        help="keep data in the .pickle files (default) or in carapp.db")
+    parser.add_argument("--profile", action="store_true",
+                        help="time store loads, image decodes and panel builds, show them in an overlay and save them")
+    parser.add_argument("--profile-output", default="metrics.json", help="where --profile saves the metrics on exit")
+    args = parser.parse_args()
+
+    if args.profile:
+        metrics.enable()
+    root = Tk()
+    root.title("Car Management Panel")
+    started = time.perf_counter()
+    app = App(root, SqliteBackend() if args.storage == "sqlite" else PickleBackend())
+    if args.profile:
+        # startup lasts until the first panel is built
+        root.after_idle(lambda: metrics.record("startup", time.perf_counter() - started))
+        Overlay(root)
+    root.mainloop()
+    app.image_loader.close()
+    app.service.close()  # writes the changes that are still waiting (carts, car edits)
+    if args.profile:
+        metrics.dump(args.profile_output)
+        print(f"Metrics saved to {args.profile_output}")
@@ -0,0 +1,617 @@
+"""
+Benchmarks for the car shop. Every benchmark is repeatable (made-up data from fixed seeds, in a temporary
+directory) and `--json results.json` before the command name saves its results, with the Python version, machine
+and git revision, for comparing releases.
+
+    python benchmark.py stores [--storage pickle snapshot sqlite] [--sizes 1000 10000 100000 1000000] [--users 100000]
+
+times CarDatabase load, add, update, delete and save, UserDatabase load and authenticate, and Cart.get_total_cost
+on synthetic catalogues of each size.
+
+    python benchmark.py panels [--storage pickle] [--sizes 1000 10000]
+
+times building the "Available Cars" panel (show_user_panel) and the car management panel with those catalogues.
+It needs a display; without one it starts Xvfb if that is installed.
+
+    python benchmark.py memory [--sizes 10000 100000 1000000]
+
+compares how much memory a catalogue takes in the old layout (plain objects with a __dict__ each), as __slots__
+Car objects, and in the columnar CarColumns store.
+
+    python benchmark.py search [--sizes 10000 100000 1000000] [--runs 50]
+
+times CarIndex.search (the index behind the "Available Cars" search bar) for typical queries on synthetic
+catalogues of each size: by brand, word and price range, each with and without sorting by price, 30 cars a page.
+
+    python benchmark.py purchases [--storage pickle|sqlite] [--processes 8] [--rounds 200]
+
+is a stress test for purchases: several processes fill carts, buy them and top up balances (with versioned
+saves) on the same few accounts at once, then it checks that no money was created or lost.
+
+    python benchmark.py crash [--kills 200]
+
+is a fault injection test for the pickle files: a writer process saving cars, users and carts is killed at random
+moments, and after every kill the files must still load and be consistent.
+
+    python benchmark.py logins [--logins 64] [--workers 1 2 4 8] [--iterations 600000]
+
+measures login throughput when many logins arrive at once, for each size of the password hashing pool.
+
+    python benchmark.py orders [--orders 1000000] [--years 3]
+
+times sales reports over an order history spread across that many years: the first report (which writes the
+monthly summaries), the next ones (summaries only), a report for one month and recording an order, with the
+memory a report peaks at. It checks that the report adds up to the orders written.
+"""
+
+import argparse
+import concurrent.futures
+import contextlib
+import datetime
+import gc
+import glob
+import importlib.util
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from database import Cart, CarDatabase, CarIndex, UserDatabase
+from models import Car, CarColumns, User
+from orders import Order, OrderItem, OrderLedger, encode_order, month_of, order_total
+from passwords import PasswordHasher, hash_password
+from service import ShopService
+from snapshot import write_snapshot
+from storage import ConflictError, PickleBackend, SqliteBackend, default_cars, dump_atomic
+
+repo_dir = os.path.dirname(os.path.abspath(__file__))
+
+brands = ["Mercedes-Benz", "BMW", "Audi", "Volkswagen", "Porsche", "Lada", "Maserati", "Rolls-Royce", "Land Rover"]
+models = [f"Model {n}" for n in range(200)]
+photos = ["audi.png", "bmw_3er.png", "bmw_7er.png", "bmw_x5.png", "lada_07.png", "maserati.png", "pors.png", "vw.png"]
+words = ["luxury", "sedan", "compact", "family", "sports", "electric", "diesel", "comfortable", "fast", "new", "used"]
+
+# The Car class as it was before __slots__, to measure the old layout.
+class DictCar:
+    def __init__(self, brand, model, price, description, photo, car_id=None):
+        self.brand = brand
+        self.model = model
+        self.price = price
+        self.description = description
+        self.photo = photo
+        self.car_id = car_id
+
+# Yields (brand, model, price, description, photo, car_id) for n made-up cars. Same seed, same cars.
+def synthetic_cars(n, seed=1):
+    rng = random.Random(seed)
+    for car_id in range(1, n + 1):
+        description = f"{' '.join(rng.sample(words, 3))} #{car_id}"
+        yield (rng.choice(brands), rng.choice(models), float(rng.randrange(2000, 300000, 500)), description,
+               rng.choice(photos), car_id)
+
+# Bytes still allocated after build() ran, i.e. the memory the built catalogue keeps.
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    catalogue = build()
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del catalogue
+    return used
+
+layouts = {
+    "dict objects (old)": lambda n: [DictCar(*row) for row in synthetic_cars(n)],
+    "__slots__ objects": lambda n: [Car(*row) for row in synthetic_cars(n)],
+    "columnar": lambda n: CarColumns(Car(*row) for row in synthetic_cars(n)),
+}
+
+def memory_benchmark(sizes):
+    results = []
+    for n in sizes:
+        for name, build in layouts.items():
+            used = measure(lambda: build(n))
+            results.append({"benchmark": "memory", "layout": name, "cars": n, "bytes": used,
+                            "bytes_per_car": round(used / n, 1)})
+            print(f"{n:>9} cars  {name:<20} {used / 2 ** 20:9.1f} MB  {used / n:7.1f} bytes/car")
+    return results
+
+# Queries timed by the search benchmark.
+search_queries = {
+    "brand": {"brand": "BMW"},
+    "brand, by price": {"brand": "BMW", "sort": "price"},
+    "brand, price range": {"brand": "BMW", "min_price": 50_000, "max_price": 90_000},
+    "word, by price": {"text": "luxury", "sort": "price"},
+    "word, price range": {"text": "luxury", "min_price": 50_000, "max_price": 90_000},
+    "2 words, by price": {"text": "luxury sedan", "sort": "-price"},
+    "brand and word, by price": {"brand": "BMW", "text": "luxury", "sort": "price"},
+    "price range, by price": {"min_price": 50_000, "max_price": 90_000, "sort": "price"},
+}
+
+def search_benchmark(sizes, runs):
+    results = []
+    for n in sizes:
+        cars = CarColumns(Car(*row) for row in synthetic_cars(n))
+        index = CarIndex(cars)
+        for name, query in search_queries.items():
+            total = index.search(**query, limit=30)[0]
+            mean = duration(lambda: [index.search(**query, limit=30) for _ in range(runs)]) / runs
+            results.append({"benchmark": "search", "cars": n, "query": name, "matches": total,
+                            "ms": round(mean * 1000, 4)})
+            print(f"{n:>9} cars  {name:<26} {total:>8} matches {mean * 1000:9.3f} ms")
+    return results
+
+# "snapshot" is the pickle backend reading car_database.snap (see snapshot.py).
+def open_backend(storage):
+    return SqliteBackend() if storage == "sqlite" else PickleBackend()
+
+# Runs fn in a new temporary directory that is removed afterwards.
+def in_temp_dir(prefix, fn, *args):
+    data_dir = tempfile.mkdtemp(prefix=prefix)
+    cwd = os.getcwd()
+    os.chdir(data_dir)
+    try:
+        return fn(*args)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(data_dir)
+
+# Writes n synthetic cars and `users` users (all with the same password hash) to the current directory in the
+# given storage format.
+def write_catalogue(storage, n, users, password_hash):
+    cars = CarColumns(Car(*row) for row in synthetic_cars(n))
+    dump_atomic({"seq": 0, "next_id": n + 1, "cars": cars}, 'car_database.pickle')
+    dump_atomic({f"user{i}": User(f"user{i}", password_hash, 1_000_000.0, 1) for i in range(users)},
+                'user_database.pickle')
+    if storage == "snapshot":
+        write_snapshot('car_database.snap', cars, 0, n + 1)
+        os.remove('car_database.pickle')
+    elif storage == "sqlite":
+        SqliteBackend().close()  # a new carapp.db imports the .pickle files
+
+# Seconds fn() takes.
+def duration(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+def store_benchmark(storages, sizes, users, ops, logins, iterations):
+    password_hash = hash_password("secret", iterations=iterations)
+    results = []
+    for storage in storages:
+        for n in sizes:
+            result = in_temp_dir("carapp-stores-", time_stores, storage, n, users, min(ops, n), logins, password_hash)
+            results.append(result)
+            print(f"{storage:<8} {n:>9} cars: load {result['load_cars_s'] * 1000:8.1f} ms, "
+                  f"add {result['add_ms']:6.3f} ms, update {result['update_ms']:6.3f} ms, "
+                  f"delete {result['delete_ms']:6.3f} ms, save {result['save_s'] * 1000:8.1f} ms, "
+                  f"cart total {result['cart_total_us']:6.1f} us | {users} users: "
+                  f"load {result['load_users_s'] * 1000:7.1f} ms, authenticate {result['authenticate_ms']:6.1f} ms")
+    return results
+
+# Times the stores on one catalogue. Car changes go through CarDatabase as the app makes them (write-behind, with the
+# journal compacted every PickleBackend.compact_every changes), so the per-change times include that share.
+def time_stores(storage, n, users, ops, logins, password_hash):
+    write_catalogue(storage, n, users, password_hash)
+    gc.collect()
+    start = time.perf_counter()
+    car_db = CarDatabase(open_backend(storage))
+    load_cars = time.perf_counter() - start
+    start = time.perf_counter()
+    user_db = UserDatabase(car_db.backend)
+    load_users = time.perf_counter() - start
+
+    rng = random.Random(n)
+    new_cars = [Car(*row[:5]) for row in synthetic_cars(ops, seed=2)]
+    changed = rng.sample(range(1, n + 1), ops)
+    with contextlib.redirect_stdout(io.StringIO()):
+        add = duration(lambda: [car_db.add(car) for car in new_cars])
+        update = duration(lambda: [car_db.update(car_id, Car("Audi", "A8", 50_000.0, "updated", "audi.png"))
+                                   for car_id in changed])
+        delete = duration(lambda: [car_db.delete(car_id) for car_id in changed])
+        if storage != "sqlite":
+            car_db.backend.close()  # writes the changes still waiting, so save is timed on its own
+        save = duration(car_db.save_car_database)
+
+        authenticate = duration(lambda: [user_db.authenticate(f"user{i % users}", "secret") for i in range(logins)])
+        cart = Cart(car_db, "user1")
+        for car_id in rng.sample(list(car_db.cars)[:10_000], min(50, len(car_db.cars))):
+            cart.add(car_id)
+        cart_total = duration(lambda: [cart.get_total_cost() for _ in range(1000)])
+    car_db.backend.close()
+    return {"benchmark": "stores", "storage": storage, "cars": n, "users": users, "ops": ops,
+            "load_cars_s": round(load_cars, 4), "load_users_s": round(load_users, 4),
+            "add_ms": round(add / ops * 1000, 4), "update_ms": round(update / ops * 1000, 4),
+            "delete_ms": round(delete / ops * 1000, 4), "save_s": round(save, 4),
+            "authenticate_ms": round(authenticate / logins * 1000, 3), "cart_lines": len(cart.lines),
+            "cart_total_us": round(cart_total / 1000 * 1e6, 2)}
+
+# Starts a virtual X server if there is no display. Returns its process (None if a display was already there).
+def start_display():
+    if os.environ.get("DISPLAY"):
+        return None
+    if not shutil.which("Xvfb"):
+        raise RuntimeError("there is no display and Xvfb is not installed")
+    xvfb = subprocess.Popen(["Xvfb", ":99", "-screen", "0", "1280x1024x24"], stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL)
+    os.environ["DISPLAY"] = ":99"
+    time.sleep(1)  # give it time to accept connections
+    return xvfb
+
+# The App class of the GUI, which lives in a script whose name is not importable.
+def load_app_class():
+    spec = importlib.util.spec_from_file_location("main_project", os.path.join(repo_dir, "Main project.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.App
+
+def panel_benchmark(storage, sizes):
+    try:
+        xvfb = start_display()
+    except RuntimeError as e:
+        print(f"Skipped: {e}.")
+        return [{"benchmark": "panels", "skipped": str(e)}]
+    try:
+        App = load_app_class()
+        results = []
+        for n in sizes:
+            result = in_temp_dir("carapp-panels-", time_panels, App, storage, n)
+            results.append(result)
+            print(f"{storage:<8} {n:>9} cars: user panel {result['user_panel_s']:7.3f} s "
+                  f"(shown again {result['user_panel_again_s']:7.3f} s), "
+                  f"car management panel {result['car_management_panel_s']:7.3f} s")
+        return results
+    finally:
+        if xvfb:
+            xvfb.terminate()
+
+# Build time of each panel: from calling it until Tk has processed everything it queued (layout, first drawing).
+def time_panels(App, storage, n):
+    from tkinter import Tk
+
+    for path in glob.glob(os.path.join(repo_dir, "*.png")):
+        shutil.copy(path, ".")
+    write_catalogue(storage, n, 10, hash_password("secret", iterations=1000))
+    root = Tk()
+    app = App(root, open_backend(storage))
+    root.update()
+    app.current_user = app.service.get_user("user1")
+    app.cart = app.service.cart("user1")
+
+    def build(show):
+        start = time.perf_counter()
+        show()
+        root.update()
+        seconds = time.perf_counter() - start
+        app.start_panel()  # leave it, so the next panel is built from scratch too
+        root.update()
+        return seconds
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        user_panel = build(app.show_user_panel)
+        user_panel_again = build(app.show_user_panel)  # a kept panel, only refreshed
+        car_management_panel = build(app.car_management_panel)
+    root.destroy()
+    app.image_loader.close()
+    app.service.close()
+    return {"benchmark": "panels", "storage": storage, "cars": n, "user_panel_s": round(user_panel, 4),
+            "user_panel_again_s": round(user_panel_again, 4), "car_management_panel_s": round(car_management_panel, 4)}
+
+# Saves results with what is needed to compare them across machines and releases.
+def save_json(path, command, arguments, results):
+    try:
+        revision = subprocess.run(["git", "rev-parse", "HEAD"], cwd=repo_dir, capture_output=True, text=True,
+                                  check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    report = {"command": command, "arguments": arguments,
+              "environment": {"time": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+                              "python": platform.python_version(), "platform": platform.platform(),
+                              "machine": platform.machine(), "cpus": os.cpu_count(), "revision": revision},
+              "results": results if isinstance(results, list) else [results]}
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {path}")
+
+# One stress test process: random cart changes, purchases and top-ups on the shared accounts.
+# Reports (money charged, money deposited, version conflicts) through the queue.
+def purchase_worker(data_dir, storage, usernames, rounds, seed, results):
+    os.chdir(data_dir)
+    rng = random.Random(seed)
+    service = ShopService(open_backend(storage))
+    car_ids = list(service.car_db.cars)
+    charged = deposited = conflicts = 0
+    with contextlib.redirect_stdout(io.StringIO()):  # the cart prints every change
+        for _ in range(rounds):
+            username = rng.choice(usernames)
+            action = rng.random()
+            if action < 0.5:
+                service.add_to_cart(username, rng.choice(car_ids), rng.randint(1, 2))
+            elif action < 0.8:
+                result = service.backend.purchase(username)
+                if result:
+                    charged += result[1]
+            else:
+                while True:  # optimistic update: re-read and retry when another save got there first
+                    user = service.backend.load_users()[username]
+                    try:
+                        service.backend.save_user(username, User(username, user.password, user.balance + 1000,
+                                                                 user.version))
+                        break
+                    except ConflictError:
+                        conflicts += 1
+                deposited += 1000
+    service.close()
+    results.put((charged, deposited, conflicts))
+
+def purchase_stress(storage, processes, rounds, users=4, balance=500_000):
+    data_dir = tempfile.mkdtemp(prefix="carapp-stress-")
+    cwd = os.getcwd()
+    os.chdir(data_dir)
+    try:
+        return run_purchase_stress(data_dir, storage, processes, rounds, users, balance)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(data_dir)
+
+def run_purchase_stress(data_dir, storage, processes, rounds, users, balance):
+    service = ShopService(open_backend(storage))
+    service.car_db.save_car_database()
+    usernames = [f"user{n}" for n in range(users)]
+    for username in usernames:
+        service.user_db.add(User(username, "secret", balance))
+    service.close()
+
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=purchase_worker,
+                                       args=(data_dir, storage, usernames, rounds, seed, results))
+               for seed in range(processes)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    totals = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    seconds = time.perf_counter() - start
+
+    charged, deposited, conflicts = (sum(column) for column in zip(*totals))
+    balances = sum(user.balance for user in open_backend(storage).load_users().values())
+    expected = users * balance + deposited - charged
+    ok = abs(balances - expected) < 1e-6 and all(worker.exitcode == 0 for worker in workers)
+    print(f"{storage}: {processes} processes x {rounds} rounds in {seconds:.2f} s, charged {charged:,.0f}, "
+          f"deposited {deposited:,.0f}, {conflicts} version conflicts retried")
+    print(f"balances {balances:,.2f}, expected {expected:,.2f}: {'OK' if ok else 'MONEY CREATED OR LOST'}")
+    return {"benchmark": "purchases", "storage": storage, "processes": processes, "rounds": rounds,
+            "seconds": round(seconds, 3), "charged": charged, "deposited": deposited, "conflicts": conflicts,
+            "balances": balances, "expected": expected, "ok": ok}
+
+# Saves as fast as it can until it is killed: car adds (journal, with a snapshot now and then), user saves where the
+# balance always equals the version, and carts holding one line per user.
+def crash_writer(data_dir, seed):
+    os.chdir(data_dir)
+    rng = random.Random(seed)
+    backend = PickleBackend()
+    backend.load_cars()
+    users = backend.load_users()
+    with contextlib.redirect_stdout(io.StringIO()):
+        while True:
+            action = rng.random()
+            if action < 0.4:
+                backend.add_car(Car(rng.choice(brands), rng.choice(models), 1000.0, "crash test", "audi.png"))
+                if rng.random() < 0.05:
+                    backend.save_cars()
+            elif action < 0.8:
+                username = f"user{rng.randrange(20)}"
+                user = users.get(username) or User(username, "secret")
+                backend.save_user(username, User(username, "secret", float(user.version + 1), user.version))
+            else:
+                username = f"user{rng.randrange(20)}"
+                backend.save_cart(username, {1: rng.randint(1, 5)})
+
+# Loads the files the way the app does and checks what crash_writer promises. Returns a problem or None.
+def check_files():
+    backend = PickleBackend()
+    try:
+        cars = backend.load_cars()
+        users = backend.load_users()
+        carts = backend.load_carts()
+    except Exception as e:
+        return f"files don't load: {e!r}"
+    if any(car.car_id > len(default_cars()) and car.description != "crash test" for car in cars.values()):
+        return "a car was changed"
+    if len(set(cars)) != len(cars) or backend.next_id <= max(cars, default=0):
+        return "car IDs are inconsistent"
+    for username, user in users.items():
+        if user.balance != user.version:
+            return f"user {username} is torn (balance {user.balance}, version {user.version})"
+    if any(set(lines) != {1} for lines in carts.values()):
+        return "a cart is torn"
+    return None
+
+def crash_test(kills, seed=1):
+    data_dir = tempfile.mkdtemp(prefix="carapp-crash-")
+    cwd = os.getcwd()
+    os.chdir(data_dir)
+    rng = random.Random(seed)
+    problems = []
+    try:
+        for kill in range(kills):
+            writer = multiprocessing.Process(target=crash_writer, args=(data_dir, seed + kill))
+            writer.start()
+            time.sleep(rng.uniform(0.01, 0.1))
+            writer.kill()
+            writer.join()
+            problem = check_files()
+            if problem:
+                problems.append(problem)
+                print(f"kill {kill + 1}: {problem}")
+        backend = PickleBackend()
+        print(f"{kills} kills, {len(backend.load_cars())} cars and {len(backend.load_users())} users on disk: "
+              f"{'OK' if not problems else f'{len(problems)} CORRUPTED'}")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(data_dir)
+    return {"benchmark": "crash", "kills": kills, "problems": problems, "ok": not problems}
+
+# Starts `logins` logins at once (as the server does when they arrive together) and finishes them as they complete,
+# with 1 in 8 using a wrong password. Returns logins per second for each pool size.
+def login_benchmark(logins, workers_list, iterations, users=16):
+    data_dir = tempfile.mkdtemp(prefix="carapp-logins-")
+    cwd = os.getcwd()
+    os.chdir(data_dir)
+    results = []
+    try:
+        backend = PickleBackend(flush_latency=0)
+        backend.load_cars()
+        for n in range(users):
+            backend.save_user(f"user{n}", User(f"user{n}", hash_password(f"secret{n}", iterations=iterations)))
+        for workers in workers_list:
+            hasher = PasswordHasher(iterations=iterations, workers=workers)
+            service = ShopService(backend, hasher)
+            service.limiter.max_failures = logins  # measure hashing, not the lockout
+            start = time.perf_counter()
+            pending = []
+            for i in range(logins):
+                username = f"user{i % users}"
+                password = f"secret{i % users}" if i % 8 else "wrong"
+                pending.append((username, service.begin_login(username, password)))
+            concurrent.futures.wait([future for _, future in pending])
+            succeeded = 0
+            for username, future in pending:
+                try:
+                    service.finish_login(username, future)
+                    succeeded += 1
+                except Exception:
+                    pass
+            seconds = time.perf_counter() - start
+            hasher.close()
+            results.append({"benchmark": "logins", "workers": workers, "logins": logins, "iterations": iterations,
+                            "seconds": round(seconds, 3), "logins_per_second": round(logins / seconds, 1),
+                            "succeeded": succeeded})
+            print(f"{workers:>3} hashing threads: {logins} logins in {seconds:.2f} s = {logins / seconds:7.1f}/s "
+                  f"({succeeded} accepted)")
+        print(f"({os.cpu_count()} CPUs; PBKDF2 with {iterations} iterations)")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(data_dir)
+    return results
+
+# Writes n synthetic orders, evenly spread over the last `years` years, straight into the ledger's monthly segments.
+# Returns the revenue they add up to.
+def write_orders(ledger, n, years, users=10_000, seed=1):
+    rng = random.Random(seed)
+    end = time.time()
+    start = end - years * 365 * 86400
+    os.makedirs(ledger.directory, exist_ok=True)
+    revenue = 0.0
+    month, chunk = None, []
+    for i in range(n):
+        items = [OrderItem(rng.randrange(1, 100_000), rng.choice(brands), rng.choice(models),
+                           float(rng.randrange(5_000, 200_000)), rng.randint(1, 2)) for _ in range(rng.randint(1, 3))]
+        order = Order(f"user{rng.randrange(users)}", start + (end - start) * i / n, items)
+        revenue += order_total(order)
+        if month_of(order.time) != month and chunk:
+            with open(ledger.segment_path(month), 'ab') as f:
+                f.write(b"".join(chunk))
+            chunk = []
+        month = month_of(order.time)
+        chunk.append(encode_order(order))
+    if chunk:
+        with open(ledger.segment_path(month), 'ab') as f:
+            f.write(b"".join(chunk))
+    return revenue
+
+def order_benchmark(n, years):
+    return in_temp_dir("carapp-orders-", time_orders, n, years)
+
+def time_orders(n, years):
+    ledger = OrderLedger()
+    revenue = write_orders(ledger, n, years)
+    size = sum(os.path.getsize(path) for _, path in ledger.segments())
+    first = duration(ledger.report)
+    again = duration(ledger.report)
+    month_start = datetime.date.today().replace(day=1) - datetime.timedelta(days=1)
+    one_month = duration(lambda: ledger.report(month_start.replace(day=1), month_start))
+    summary = ledger.report()
+    for path in glob.glob(os.path.join(ledger.directory, "*.summary")):
+        os.remove(path)
+    tracemalloc.start()
+    ledger.report()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    records = 200
+    record_ms = duration(lambda: [ledger.record("user0", [(1, "BMW", "X5", 70000.0, 1)]) for _ in range(records)])
+    ok = summary.orders == n and abs(summary.revenue - revenue) <= 1e-6 * revenue
+    print(f"{n} orders over {years} years ({size / 2 ** 20:.1f} MB in {len(ledger.segments())} segments): "
+          f"first report {first:.2f} s, again {again * 1000:.1f} ms, one month {one_month * 1000:.1f} ms, "
+          f"record {record_ms / records * 1000:.2f} ms/order, report peak memory {peak / 2 ** 20:.1f} MB"
+          f"{'' if ok else ' -- REPORT DOES NOT ADD UP'}")
+    return {"benchmark": "orders", "orders": n, "years": years, "ledger_bytes": size,
+            "first_report_s": round(first, 3), "report_ms": round(again * 1000, 3),
+            "one_month_report_ms": round(one_month * 1000, 3), "record_ms": round(record_ms / records * 1000, 3),
+            "report_peak_bytes": peak, "ok": ok}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks for the car shop")
+    parser.add_argument("--json", metavar="PATH", help="also save the results as JSON")
+    commands = parser.add_subparsers(dest="command", required=True)
+    stores = commands.add_parser("stores", help="store operations on synthetic catalogues")
+    stores.add_argument("--storage", choices=["pickle", "snapshot", "sqlite"], nargs="+",
+                        default=["pickle", "snapshot", "sqlite"])
+    stores.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    stores.add_argument("--users", type=int, default=100_000)
+    stores.add_argument("--ops", type=int, default=200, help="cars added, updated and deleted per catalogue")
+    stores.add_argument("--logins", type=int, default=5, help="authentications timed per catalogue")
+    stores.add_argument("--iterations", type=int, default=600_000, help="PBKDF2 rounds of the users' passwords")
+    panels = commands.add_parser("panels", help="panel build times (needs a display or Xvfb)")
+    panels.add_argument("--storage", choices=["pickle", "snapshot", "sqlite"], default="pickle")
+    panels.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000])
+    memory = commands.add_parser("memory", help="memory used by the catalogue in each layout")
+    memory.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    search = commands.add_parser("search", help="catalogue search times for typical queries")
+    search.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    search.add_argument("--runs", type=int, default=50, help="times each query is run")
+    purchases = commands.add_parser("purchases", help="concurrent purchases must neither create nor lose money")
+    purchases.add_argument("--storage", choices=["pickle", "sqlite"], default="pickle")
+    purchases.add_argument("--processes", type=int, default=8)
+    purchases.add_argument("--rounds", type=int, default=200)
+    crash = commands.add_parser("crash", help="pickle files must survive the writer being killed at any moment")
+    crash.add_argument("--kills", type=int, default=200)
+    logins = commands.add_parser("logins", help="login throughput for each size of the password hashing pool")
+    logins.add_argument("--logins", type=int, default=64)
+    logins.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    logins.add_argument("--iterations", type=int, default=600_000, help="PBKDF2 rounds per password")
+    orders = commands.add_parser("orders", help="sales reports over a long order history")
+    orders.add_argument("--orders", type=int, default=1_000_000)
+    orders.add_argument("--years", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.command == "stores":
+        results = store_benchmark(args.storage, args.sizes, args.users, args.ops, args.logins, args.iterations)
+    elif args.command == "panels":
+        results = panel_benchmark(args.storage, args.sizes)
+    elif args.command == "memory":
+        results = memory_benchmark(args.sizes)
+    elif args.command == "search":
+        results = search_benchmark(args.sizes, args.runs)
+    elif args.command == "purchases":
+        results = purchase_stress(args.storage, args.processes, args.rounds)
+    elif args.command == "logins":
+        results = login_benchmark(args.logins, args.workers, args.iterations)
+    elif args.command == "crash":
+        results = crash_test(args.kills)
+    elif args.command == "orders":
+        results = order_benchmark(args.orders, args.years)
+    if args.json:
+        arguments = {name: value for name, value in vars(args).items() if name not in ("json", "command")}
+        save_json(args.json, args.command, arguments, results)
+    if isinstance(results, dict) and not results["ok"]:
+        sys.exit(1)
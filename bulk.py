@@ -0,0 +1,124 @@
+"""
+Bulk import and export of the car catalogue as CSV or JSON Lines (picked by the file extension: .csv or .jsonl).
+
+    python bulk.py import cars.jsonl [--storage sqlite] [--chunk-size 10000] [--errors errors.jsonl]
+    python bulk.py export cars.csv [--storage sqlite]
+
+Rows are streamed one at a time, so the pipeline's memory use doesn't depend on the size of the file. Every row is
+checked with the rules of the admin car form (brand, model, price and description filled in, finite numeric price); a bad
+row is reported with its line number and skipped, and the good ones are committed chunk by chunk, so an interrupted
+import keeps every chunk committed before it. Imported cars get new IDs; an "id" column is ignored.
+"""
+
+import argparse
+import csv
+import json
+import sys
+import time
+
+from database import CarDatabase
+from service import ShopError, car_from_fields
+from storage import PickleBackend, SqliteBackend
+
+fields = ["brand", "model", "price", "description", "photo"]
+
+# A field value as the car form would have it: text, empty if missing.
+def text(value):
+    return value if isinstance(value, str) else "" if value is None else str(value)
+
+# Yields (line number, row) for each row of a .csv (with a header line) or .jsonl file. A row is a dict of field
+# values, or a string saying why the line couldn't be read.
+def read_rows(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.lower().endswith(".csv"):
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+            return
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_number, f"Not valid JSON: {e}"
+                continue
+            yield line_number, row if isinstance(row, dict) else "Each line must be a JSON object"
+
+# Adds the valid rows to the car database, chunk_size cars per commit, and calls on_error(line number, message, row)
+# for each row that is skipped. Returns (cars imported, rows skipped).
+def import_cars(car_db, rows, chunk_size=10_000, on_error=None):
+    imported = skipped = 0
+    chunk = []
+    with car_db.bulk_load():
+        for line_number, row in rows:
+            try:
+                if isinstance(row, str):
+                    raise ShopError(row)
+                get = row.get
+                chunk.append(car_from_fields(text(get("brand")), text(get("model")), text(get("price")),
+                                             text(get("description")), text(get("photo"))))
+            except ShopError as e:
+                skipped += 1
+                if on_error:
+                    on_error(line_number, str(e), row)
+                continue
+            if len(chunk) >= chunk_size:
+                car_db.add_many(chunk)
+                imported += len(chunk)
+                chunk = []
+        if chunk:
+            car_db.add_many(chunk)
+            imported += len(chunk)
+    car_db.save_car_database()  # one snapshot instead of compacting the journal along the way
+    return imported, skipped
+
+# Writes every car (with its ID) to a .csv or .jsonl file, one at a time. Returns the number of cars written.
+def export_cars(car_db, path):
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        if path.lower().endswith(".csv"):
+            writer = csv.writer(f)
+            writer.writerow(["id"] + fields)
+            for car in car_db.cars.values():
+                writer.writerow([car.car_id, car.brand, car.model, car.price, car.description, car.photo])
+                count += 1
+        else:
+            for car in car_db.cars.values():
+                f.write(json.dumps({"id": car.car_id, **{name: getattr(car, name) for name in fields}}) + "\n")
+                count += 1
+    return count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import/export of the car catalogue (CSV or JSON Lines)")
+    parser.add_argument("--storage", choices=["pickle", "sqlite"], default="pickle",
+                        help="the .pickle files (default) or carapp.db")
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_command = commands.add_parser("import", help="add the cars in a .csv or .jsonl file")
+    import_command.add_argument("path")
+    import_command.add_argument("--chunk-size", type=int, default=10_000, help="cars per commit")
+    import_command.add_argument("--errors", help="write skipped rows to this .jsonl file instead of the screen")
+    export_command = commands.add_parser("export", help="write the catalogue to a .csv or .jsonl file")
+    export_command.add_argument("path")
+    args = parser.parse_args()
+
+    backend = SqliteBackend() if args.storage == "sqlite" else PickleBackend()
+    car_db = CarDatabase(backend)
+    start = time.perf_counter()
+    if args.command == "import":
+        error_file = open(args.errors, 'w', encoding='utf-8') if args.errors else None
+
+        def report(line_number, message, row):
+            if error_file:
+                error_file.write(json.dumps({"line": line_number, "error": message, "row": row}) + "\n")
+            else:
+                print(f"line {line_number}: {message}", file=sys.stderr)
+
+        imported, skipped = import_cars(car_db, read_rows(args.path), args.chunk_size, report)
+        if error_file:
+            error_file.close()
+        print(f"Imported {imported} cars, skipped {skipped} rows in {time.perf_counter() - start:.1f} s.")
+    else:
+        count = export_cars(car_db, args.path)
+        print(f"Exported {count} cars to {args.path} in {time.perf_counter() - start:.1f} s.")
+    backend.close()
@@ -0,0 +1,659 @@
+"""
+The stores the GUI works with: each user's shopping cart, the car database and the user database.
+Each store keeps its familiar interface and hands loading and saving to a storage backend (see storage.py).
+CarDatabase.search answers catalogue queries from secondary indexes that are kept up to date on every change.
+The statistics of the admin Stats panel (CarStats, UserStats) are kept up to date the same way.
+"""
+
+import contextlib
+import heapq
+import math
+import operator
+from bisect import bisect_left, bisect_right, insort
+from functools import reduce
+from itertools import islice
+from operator import itemgetter
+
+from passwords import verify_password
+from profiling import metrics
+
+from storage import PickleBackend, tokenize
+
+#Handles one user's shopping cart, including adding, removing, clearing, and saving items.
+#The cart stores (car ID, quantity) lines; prices and details are looked up in the car database when needed,
+#so a price change reaches carts that already hold the car.
+#The total cost and the number of cars are kept up to date on every add and remove; they are only counted again
+#from scratch when the catalogue has changed (CarDatabase.changes) or the saved cart differs from this one.
+class Cart:
+    def __init__(self, car_db, username, backend=None):
+        self.car_db = car_db
+        self.username = username
+        self.backend = backend or car_db.backend
+        self.lines = {}  # car ID -> quantity
+        self.prices = {}  # car ID -> price the total was counted with (lines whose car is in the catalogue)
+        self.total = 0.0  # cost of the lines in self.prices
+        self.count = 0    # number of cars in those lines
+        self.counted = None  # car_db.changes when the total was last counted from scratch
+        self.load_cart()  # Loads saved cart data
+
+    def add(self, car_id, quantity=1):
+        if quantity < 1:
+            raise ValueError(f"can't add {quantity} cars to a cart")
+        self.lines[car_id] = self.lines.get(car_id, 0) + quantity
+        car = self.car_db.cars.get(car_id)
+        if car is not None:
+            price = self.prices.setdefault(car_id, car.price)
+            self.total += price * quantity
+            self.count += quantity
+        print(f"Car {car_id} added to the cart!")
+
+    # Takes one (or `quantity`) of a car out of the cart.
+    def remove(self, car_id, quantity=1):
+        if quantity < 1:
+            raise ValueError(f"can't take {quantity} cars out of a cart")
+        if car_id in self.lines:
+            quantity = min(quantity, self.lines[car_id])
+            self.lines[car_id] -= quantity
+            if car_id in self.prices:
+                self.total -= self.prices[car_id] * quantity
+                self.count -= quantity
+            if self.lines[car_id] <= 0:
+                del self.lines[car_id]
+                self.prices.pop(car_id, None)
+            if not self.prices:
+                self.total = 0.0  # no rounding error left behind
+            print(f"Car {car_id} removed from the cart!")
+
+    def clear(self):
+        self.lines = {}
+        self.prices = {}
+        self.total = 0.0
+        self.count = 0
+        print("Cart cleared!")
+
+    # Counts the total cost and the number of cars again at the current catalogue prices.
+    def recount(self):
+        self.prices = {car.car_id: car.price for car, quantity in self.items()}
+        self.total = sum(self.prices[car_id] * self.lines[car_id] for car_id in self.prices)
+        self.count = sum(self.lines[car_id] for car_id in self.prices)
+        self.counted = self.car_db.changes
+
+    # Returns (car, quantity) for each line whose car is still in the catalogue.
+    def items(self):
+        cars = self.car_db.cars
+        return [(cars[car_id], quantity) for car_id, quantity in self.lines.items() if car_id in cars]
+
+    #Returns the total cost of all items in the cart at the current catalogue prices.
+    def get_total_cost(self):
+        if self.counted != self.car_db.changes:
+            self.recount()
+        return self.total
+
+    # Number of cars in the cart (quantities included), like get_total_cost only counting cars still for sale.
+    def get_count(self):
+        if self.counted != self.car_db.changes:
+            self.recount()
+        return self.count
+
+    # Saves this user's cart lines through the backend.
+    @metrics.timed("store.cart.save")
+    def save_cart(self):
+        self.backend.save_cart(self.username, self.lines)
+
+    # Loads this user's cart lines, or initializes as empty if nothing was saved yet.
+    @metrics.timed("store.cart.load")
+    def load_cart(self):
+        lines = self.backend.load_cart(self.username)
+        if lines != self.lines:
+            self.lines = lines
+            self.recount()
+
+# Sort orders of car searches besides catalogue order (None), in CarIndex.search and the SQLite backend alike.
+car_sorts = ("price", "-price", "brand", "-brand", "model", "-model")
+
+# Secondary indexes over the car catalogue: a sorted price index (also kept for each brand), brand and model
+# inverted indexes and a token index over the words of each car, all keyed by car ID. They are updated car by car,
+# so a change never rebuilds them. Car IDs only ever grow, so sorting by ID gives catalogue order.
+# Brands, models and words with many cars (see dense) also get a bitmap of their car IDs, so the number of cars
+# two of them share is counted without building the intersection, and such words get a price index of their own.
+class CarIndex:
+    dense_min = 1024  # fewest cars a brand, model or word needs before it gets a bitmap
+
+    def __init__(self, cars):
+        self.cars = cars         # the catalogue (car ID -> car), read to turn results into cars
+        self.prices = []         # sorted (price, car ID) pairs
+        self.brand_prices = {}   # lowercase brand -> sorted (price, car ID) pairs of its cars (the same tuples)
+        self.word_prices = {}    # word with a bitmap -> sorted (price, car ID) pairs of its cars (the same tuples)
+        self.bits = {}           # ("brand" | "model" | "word", name) -> bitmap of its car IDs, for the dense ones
+        self.brands = {}         # lowercase brand -> car IDs
+        self.brand_names = {}    # lowercase brand -> brand as written
+        self.models = {}         # lowercase model -> car IDs
+        self.tokens = {}         # word of the brand, model or description -> car IDs
+        for car in cars.values():
+            self.add_to_lookups(car)
+            entry = (car.price, car.car_id)
+            self.prices.append(entry)
+            self.brand_prices.setdefault(car.brand.lower(), []).append(entry)
+        self.prices.sort()
+        for entries in self.brand_prices.values():
+            entries.sort()
+        rank = {key: position for position, (_, key) in enumerate(self.prices)}
+        for kind, index in (("brand", self.brands), ("model", self.models), ("word", self.tokens)):
+            for name, keys in index.items():
+                if len(keys) >= self.dense():
+                    self.promote(kind, index, name, rank)
+
+    def add(self, car):
+        self.add_to_lookups(car)
+        entry = (car.price, car.car_id)
+        insort(self.prices, entry)
+        insort(self.brand_prices.setdefault(car.brand.lower(), []), entry)
+        for kind, index, name in self.postings(car):
+            if (kind, name) in self.bits:
+                self.bits[kind, name] |= 1 << car.car_id
+                if kind == "word":
+                    insort(self.word_prices[name], entry)
+            elif len(index[name]) >= self.dense():
+                self.promote(kind, index, name)
+
+    # Adds a car to the brand, model and token indexes.
+    def add_to_lookups(self, car):
+        self.brand_names.setdefault(car.brand.lower(), car.brand)
+        for _, index, name in self.postings(car):
+            index.setdefault(name, set()).add(car.car_id)
+
+    # Takes a car out of every index.
+    def remove(self, car):
+        key = car.car_id
+        entry = (car.price, key)
+        del self.prices[bisect_left(self.prices, entry)]
+        entries = self.brand_prices[car.brand.lower()]
+        del entries[bisect_left(entries, entry)]
+        for kind, index, name in self.postings(car):
+            self.discard(index, name, key)
+            if (kind, name) not in self.bits:
+                continue
+            if len(index.get(name, ())) < self.dense() // 2:
+                self.demote(kind, name)
+            else:
+                self.bits[kind, name] &= ~(1 << key)
+                if kind == "word":
+                    entries = self.word_prices[name]
+                    del entries[bisect_left(entries, entry)]
+        if car.brand.lower() not in self.brands:
+            del self.brand_names[car.brand.lower()], self.brand_prices[car.brand.lower()]
+
+    def replace(self, old_car, new_car):
+        self.remove(old_car)
+        self.add(new_car)
+
+    # The (kind, inverted index, name) of every brand, model and word entry a car is listed under.
+    def postings(self, car):
+        yield "brand", self.brands, car.brand.lower()
+        yield "model", self.models, car.model.lower()
+        for word in set(tokenize(f"{car.brand} {car.model} {car.description}")):
+            yield "word", self.tokens, word
+
+    # Number of cars from which a brand, model or word gets a bitmap; it loses it again below half of that.
+    def dense(self):
+        return max(self.dense_min, len(self.prices) // 64)
+
+    # Gives an entry of an inverted index its bitmap (and a word its price index). rank maps car IDs to their
+    # position in the price index when many entries are promoted at once.
+    def promote(self, kind, index, name, rank=None):
+        keys = index[name]
+        bitmap = bytearray(max(keys) // 8 + 1)
+        for key in keys:
+            bitmap[key >> 3] |= 1 << (key & 7)
+        self.bits[kind, name] = int.from_bytes(bitmap, "little")
+        if kind == "word" and rank is None:
+            self.word_prices[name] = [entry for entry in self.prices if entry[1] in keys]
+        elif kind == "word":
+            self.word_prices[name] = [self.prices[position] for position in sorted(map(rank.__getitem__, keys))]
+
+    def demote(self, kind, name):
+        del self.bits[kind, name]
+        if kind == "word":
+            del self.word_prices[name]
+
+    @staticmethod
+    def discard(index, value, key):
+        keys = index[value]
+        keys.discard(key)
+        if not keys:
+            del index[value]
+
+    def brand_list(self):
+        return sorted(self.brand_names.values(), key=str.lower)
+
+    # Returns (number of matches, cars on the requested page). Every filter is optional; text must match every word.
+    # sort is None (catalogue order), "price" (cheapest first), "brand" or "model" (A to Z, then catalogue order),
+    # or one of those with a "-" in front for the opposite order.
+    # The candidates come in price order from the smallest price range among the whole price index and those of
+    # the brand and words, and every other filter is checked against them:
+    # - without a price range, when all filters have bitmaps, the matches are counted by ANDing the bitmaps, and a
+    #   price-sorted page is read off the candidates, stopping once the page is full;
+    # - otherwise the candidates are filtered set by set when there are few of them, or the filters are
+    #   intersected smallest first and then cut to the price range.
+    # Brand, model and catalogue order still need the matching IDs as a set.
+    def search(self, brand=None, model=None, min_price=None, max_price=None, text=None, sort=None,
+               offset=0, limit=None):
+        limit = len(self.prices) if limit is None else limit
+        filters = [(self.tokens.get(word, set()), self.word_prices.get(word), self.bits.get(("word", word)))
+                   for word in tokenize(text or "")]  # (car IDs, price index or None, bitmap or None)
+        if model:
+            filters.append((self.models.get(model.lower(), set()), None, self.bits.get(("model", model.lower()))))
+        if brand:
+            filters.append((self.brands.get(brand.lower(), set()), self.brand_prices.get(brand.lower(), []),
+                            self.bits.get(("brand", brand.lower()))))
+        if not all(keys for keys, _, _ in filters):
+            return 0, []
+
+        driver, ordered = None, self.prices
+        lo, hi = self.price_range(ordered, min_price, max_price)
+        for candidate in filters:
+            if candidate[1] is not None:
+                low, high = self.price_range(candidate[1], min_price, max_price)
+                if high - low < hi - lo:
+                    driver, ordered, lo, hi = candidate, candidate[1], low, high
+        others = sorted((candidate[0] for candidate in filters if candidate is not driver), key=len)
+        whole = lo == 0 and hi == len(ordered)
+        matches = found = None  # the matching car IDs as a set (None: every car) or in price order
+
+        if not others:
+            total = hi - lo  # the candidates are the matches
+            if sort == "price":
+                return total, [self.cars[key] for _, key in ordered[lo + offset:min(hi, lo + offset + limit)]]
+            if sort == "-price":
+                page = ordered[max(lo, hi - offset - limit):max(lo, hi - offset)]
+                return total, [self.cars[key] for _, key in reversed(page)]
+            if whole:
+                matches = driver[0] if driver else None
+            else:
+                matches = set(map(itemgetter(1), ordered[lo:hi]))
+        elif whole and all(bitmap is not None for _, _, bitmap in filters):
+            bitmap = reduce(operator.and_, (bitmap for _, _, bitmap in filters))
+            total = bitmap.bit_count()
+            wanted = min(offset + limit, total)
+            if sort in ("price", "-price") and wanted * (hi - lo) <= total * total:
+                # the matches are dense enough among the candidates that the page is only a short walk away
+                entries = ordered if sort == "price" else reversed(ordered)
+                return total, [self.cars[key] for key in self.first_matches(entries, others, wanted)[offset:]]
+            if sort is None and limit * 64 <= len(others[0]):
+                # a few bits read off the bitmap cost less than intersecting the sets
+                return total, [self.cars[key] for key in self.lowest_bits(bitmap, offset, limit)]
+            sets = sorted(others + [driver[0]], key=len) if driver else others
+            matches = sets[0].intersection(*sets[1:])
+        elif hi - lo <= 8 * len(others[0]):
+            found = list(map(itemgetter(1), ordered[lo:hi]))
+            for keys in others:
+                found = [key for key in found if key in keys]
+            total = len(found)
+        else:
+            sets = sorted(others + [driver[0]], key=len) if driver else others
+            matches = sets[0].intersection(*sets[1:]) if len(sets) > 1 else sets[0]  # not changed below
+            if not whole:
+                low = -math.inf if min_price is None else min_price
+                high = math.inf if max_price is None else max_price
+                matches = {key for key in matches if low <= self.cars[key].price <= high}
+            total = len(matches)
+
+        if found is not None and sort in ("price", "-price"):
+            page = found[offset:offset + limit] if sort == "price" else found[::-1][offset:offset + limit]
+            return total, [self.cars[key] for key in page]
+        if found is not None:
+            matches = set(found)
+        if sort in ("brand", "-brand", "model", "-model"):
+            return self.page_by_name(self.brands if sort.endswith("brand") else self.models, matches,
+                                     sort.startswith("-"), offset, limit)
+        if sort in ("price", "-price"):
+            pick = heapq.nlargest if sort == "-price" else heapq.nsmallest
+            page = pick(offset + limit, matches, key=lambda key: (self.cars[key].price, key))[offset:]
+        else:
+            page = heapq.nsmallest(offset + limit, self.cars if matches is None else matches)[offset:]
+        return total, [self.cars[key] for key in page]
+
+    # Positions [lo, hi) of the (price, car ID) entries in the price range; either bound may be None.
+    @staticmethod
+    def price_range(ordered, min_price, max_price):
+        lo = 0 if min_price is None else bisect_left(ordered, (min_price,))
+        hi = len(ordered) if max_price is None else max(lo, bisect_right(ordered, (max_price, math.inf)))
+        return lo, hi
+
+    # The car IDs of a bitmap in increasing order, skipping the first `offset` of them, at most `count` of them.
+    # The skipped IDs are found by halving the bit positions, counting the bits below the middle each time; the
+    # page is then read 1024 bits at a time, so the whole bitmap is not copied for every ID.
+    @staticmethod
+    def lowest_bits(bitmap, offset, count):
+        lo, hi = 0, bitmap.bit_length() if offset else 0
+        while lo < hi:
+            middle = (lo + hi) // 2
+            if (bitmap & ((1 << middle) - 1)).bit_count() < offset:
+                lo = middle + 1
+            else:
+                hi = middle
+        page = []
+        for start in range(lo, bitmap.bit_length(), 1024):
+            if len(page) >= count:
+                break
+            chunk = (bitmap >> start) & ((1 << 1024) - 1)
+            while chunk and len(page) < count:
+                lowest = chunk & -chunk
+                page.append(start + lowest.bit_length() - 1)
+                chunk ^= lowest
+        return page
+
+    # The first `count` car IDs of (price, car ID) entries that are in all of the sets `others`.
+    @staticmethod
+    def first_matches(entries, others, count):
+        page = []
+        if count <= 0:
+            return page
+        for _, key in entries:
+            for keys in others:
+                if key not in keys:
+                    break
+            else:
+                page.append(key)
+                if len(page) == count:
+                    break
+        return page
+
+    # A page of the matching cars (all cars if matches is None) in order of the brand or model index's names.
+    # Whole names are skipped by their number of cars, so only the names on the page have their cars sorted.
+    def page_by_name(self, index, matches, descending, offset, limit):
+        total = len(self.prices) if matches is None else len(matches)
+        page = []
+        for name in sorted(index, reverse=descending):
+            keys = index[name] if matches is None else index[name] & matches
+            if offset >= len(keys):
+                offset -= len(keys)
+                continue
+            page += sorted(keys, reverse=descending)[offset:offset + limit - len(page)]
+            offset = 0
+            if len(page) >= limit:
+                break
+        return total, [self.cars[key] for key in page]
+
+# Value at fraction q (0 to 1) of a sorted list, interpolating between the two nearest values.
+def quantile(values, q):
+    position = (len(values) - 1) * q
+    low = int(position)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+# Price statistics of the catalogue for the admin Stats panel: the sorted prices and their sum for every brand.
+# CarDatabase updates them car by car, so opening the panel never scans the catalogue.
+class CarStats:
+    def __init__(self, cars):
+        self.count = 0
+        self.prices = {}  # brand -> sorted prices of its cars
+        self.totals = {}  # brand -> sum of those prices
+        for car in cars.values():
+            self.prices.setdefault(car.brand, []).append(car.price)
+            self.totals[car.brand] = self.totals.get(car.brand, 0) + car.price
+            self.count += 1
+        for prices in self.prices.values():
+            prices.sort()
+
+    def add(self, car):
+        insort(self.prices.setdefault(car.brand, []), car.price)
+        self.totals[car.brand] = self.totals.get(car.brand, 0) + car.price
+        self.count += 1
+
+    def remove(self, car):
+        prices = self.prices[car.brand]
+        del prices[bisect_left(prices, car.price)]
+        if prices:
+            self.totals[car.brand] -= car.price
+        else:
+            del self.prices[car.brand], self.totals[car.brand]
+        self.count -= 1
+
+    def replace(self, old_car, new_car):
+        self.remove(old_car)
+        self.add(new_car)
+
+    # (brand, cars, lowest, lower quartile, median, upper quartile, highest and average price) for every brand, A to Z.
+    def brand_prices(self):
+        rows = []
+        for brand in sorted(self.prices, key=str.lower):
+            prices = self.prices[brand]
+            rows.append((brand, len(prices), prices[0], quantile(prices, 0.25), quantile(prices, 0.5),
+                         quantile(prices, 0.75), prices[-1], self.totals[brand] / len(prices)))
+        return rows
+
+# Balance statistics of the users for the admin Stats panel: the total and the users ranked by balance.
+# UserDatabase updates them user by user.
+class UserStats:
+    def __init__(self, users):
+        self.balances = {user.username: user.balance for user in users.values()}
+        self.ranked = sorted((-balance, username) for username, balance in self.balances.items())  # richest first
+        self.total = math.fsum(self.balances.values())
+
+    def set(self, username, balance):
+        self.remove(username)
+        self.balances[username] = balance
+        insort(self.ranked, (-balance, username))
+        self.total += balance
+
+    def remove(self, username):
+        balance = self.balances.pop(username, None)
+        if balance is not None:
+            del self.ranked[bisect_left(self.ranked, (-balance, username))]
+            self.total -= balance
+
+    # (username, balance) of the n users with the highest balances.
+    def top(self, n=10):
+        return [(username, -balance) for balance, username in self.ranked[:n]]
+
+#Manages the database of cars, including adding, updating, deleting, and saving cars.
+#Cars are kept in a mapping keyed by their stable ID, so looking one up, updating or deleting it does not depend on
+#the size of the catalogue and an ID keeps pointing at the same car while others are added or removed.
+class CarDatabase:
+    def __init__(self, backend=None):
+        self.backend = backend or PickleBackend()
+        self.cars = {}
+        self.car_index = None  # built on the first search, then kept up to date
+        self.car_stats = None  # built when the Stats panel is first opened, then kept up to date
+        self.changes = 0  # counts updates, deletions and reloads, so carts know when to count their totals again
+        self.load_car_database()  # Loads saved car data
+        self.backend.on_car_change = self.car_changed  # changes made by other processes
+        self.backend.on_cars_reload = self.cars_reloaded
+
+    # Stores a new car and gives it an ID (car.car_id).
+    @metrics.timed("store.cars.change")
+    def add(self, car):
+        self.backend.add_car(car)  # Saves changes to the database
+        if self.car_index:
+            self.car_index.add(car)
+        if self.car_stats:
+            self.car_stats.add(car)
+
+    # Stores many new cars at once (bulk import); the backend commits them together.
+    def add_many(self, cars):
+        self.backend.add_cars(cars)
+        for car in cars:
+            if self.car_index:
+                self.car_index.add(car)
+            if self.car_stats:
+                self.car_stats.add(car)
+
+    # Context for a bulk load; backends that maintain indexes on disk (SQLite) rebuild them once at the end.
+    def bulk_load(self):
+        if hasattr(self.backend, "bulk_load"):
+            return self.backend.bulk_load()
+        return contextlib.nullcontext()
+
+    # Replaces a car. Returns the car it replaced, or None if there is no such car (another process may have
+    # deleted it).
+    @metrics.timed("store.cars.change")
+    def update(self, car_id, updated_car):
+        old_car = self.backend.update_car(car_id, updated_car)
+        if old_car:
+            self.changes += 1
+            if self.car_index:
+                self.car_index.replace(old_car, updated_car)
+            if self.car_stats:
+                self.car_stats.replace(old_car, updated_car)
+        return old_car
+
+    @metrics.timed("store.cars.change")
+    def delete(self, car_id):
+        old_car = self.backend.delete_car(car_id)
+        if old_car:
+            self.changes += 1
+            if self.car_index:
+                self.car_index.remove(old_car)
+            if self.car_stats:
+                self.car_stats.remove(old_car)
+
+    # Keeps the indexes up to date with a car another process added (old_car None), updated or deleted (new_car None).
+    def car_changed(self, old_car, new_car):
+        self.changes += 1
+        for index in (self.car_index, self.car_stats):
+            if index is None:
+                continue
+            if old_car is None:
+                index.add(new_car)
+            elif new_car is None:
+                index.remove(old_car)
+            else:
+                index.replace(old_car, new_car)
+
+    # Takes the cars the backend had to read again after another process rewrote them; the indexes are rebuilt
+    # when next needed.
+    def cars_reloaded(self, cars):
+        self.cars = cars
+        self.car_index = None
+        self.car_stats = None
+        self.changes += 1
+
+    # Finds cars by brand, model, price range and free text, sorted and paginated (see CarIndex.search).
+    # Backends that can query their own storage (SQLite) answer directly; otherwise the in-memory indexes are used.
+    @metrics.timed("store.cars.search")
+    def search(self, brand=None, model=None, min_price=None, max_price=None, text=None, sort=None,
+               offset=0, limit=None):
+        query = dict(brand=brand, model=model, min_price=min_price, max_price=max_price, text=text, sort=sort,
+                     offset=offset, limit=limit)
+        if hasattr(self.backend, "search"):
+            return self.backend.search(**query)
+        if not (brand or model or text or sort) and min_price is None and max_price is None:
+            return len(self.cars), self.cars.page(offset, len(self.cars) if limit is None else limit)
+        return self.index().search(**query)
+
+    # Brands in the catalogue, for the search bar.
+    def brands(self):
+        if hasattr(self.backend, "brands"):
+            return self.backend.brands()
+        return self.index().brand_list()
+
+    def index(self):
+        if self.car_index is None:
+            with metrics.timer("store.cars.index"):
+                self.car_index = CarIndex(self.cars)
+        return self.car_index
+
+    def stats(self):
+        if self.car_stats is None:
+            with metrics.timer("store.cars.stats"):
+                self.car_stats = CarStats(self.cars)
+        return self.car_stats
+
+    #Saves the whole car database.
+    @metrics.timed("store.cars.save")
+    def save_car_database(self):
+        self.backend.save_cars()
+
+    # Loads the car database (default cars if nothing was saved yet).
+    @metrics.timed("store.cars.load")
+    def load_car_database(self):
+        self.cars = self.backend.load_cars()
+        self.car_index = None
+        self.car_stats = None
+        self.changes += 1
+
+# Manages the database of users, including adding, updating, deleting, and authenticating users.
+class UserDatabase:
+    def __init__(self, backend=None):
+        self.backend = backend or PickleBackend()
+        self.users = {}
+        self.user_stats = None  # built when the Stats panel is first opened, then kept up to date
+        self.load_user_database()  #loads saved user data
+        self.backend.on_user_change = self.user_changed  # changes made by other processes
+        self.backend.on_users_reload = self.users_reloaded
+
+    @metrics.timed("store.users.save")
+    def add(self, user):
+        self.backend.save_user(user.username, user)
+        self.balance_changed(user)
+
+    @metrics.timed("store.users.save")
+    def update(self, username, updated_user):
+        self.backend.save_user(username, updated_user)
+        self.balance_changed(updated_user)
+
+    @metrics.timed("store.users.save")
+    def delete(self, username):
+        self.backend.delete_user(username)
+        if self.user_stats:
+            self.user_stats.remove(username)
+
+    # Keeps the statistics up to date with a user's new balance; also called after a purchase, which the backend
+    # saves itself.
+    def balance_changed(self, user):
+        if self.user_stats:
+            self.user_stats.set(user.username, user.balance)
+
+    # Keeps the statistics up to date with a user another process saved (user) or deleted (None).
+    def user_changed(self, username, user):
+        if self.user_stats:
+            if user is None:
+                self.user_stats.remove(username)
+            else:
+                self.user_stats.set(username, user.balance)
+
+    def users_reloaded(self):
+        self.user_stats = None
+
+    def stats(self):
+        if self.user_stats is None:
+            with metrics.timer("store.users.stats"):
+                self.user_stats = UserStats(self.users)
+        return self.user_stats
+
+    # Returns (number of matches, users on the requested page). text matches part of the username (any case);
+    # sort is None (order of creation), "username" or "balance", with a "-" in front for the opposite order.
+    # Backends that can query their own storage (SQLite) answer directly.
+    @metrics.timed("store.users.search")
+    def search(self, text=None, sort=None, offset=0, limit=None):
+        if hasattr(self.backend, "search_users"):
+            return self.backend.search_users(text, sort, offset, limit)
+        users = self.users.values()
+        if text:
+            users = [user for user in users if text.lower() in user.username.lower()]
+        if sort:
+            field = sort.lstrip("-")
+            key = (lambda user: user.username.lower()) if field == "username" else (lambda user: user.balance)
+            users = sorted(users, key=key, reverse=sort.startswith("-"))
+        end = None if limit is None else offset + limit
+        return len(users), list(islice(users, offset, end))
+
+    # Checks the password against the user's stored hash. This is slow on purpose; the app and the server log in
+    # through ShopService.begin_login, which does it on a thread pool.
+    def authenticate(self, username, password):
+        user = self.users.get(username)
+        if user and verify_password(user.password, password)[0]:
+            return user
+        return None
+
+    #saves the user database.
+    @metrics.timed("store.users.save")
+    def save_user_database(self):
+        self.backend.save_users()
+
+    # loads the user database, or initializes as empty if nothing was saved yet.
+    @metrics.timed("store.users.load")
+    def load_user_database(self):
+        self.users = self.backend.load_users()
+        self.user_stats = None
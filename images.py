@@ -0,0 +1,179 @@
+"""
+Process-wide cache for car photos. Images are keyed by file path and target size, kept within a memory budget
+with least-recently-used eviction, and reloaded when the file on disk changes.
+Scaled-down thumbnails are written to .thumbnails/ once and reused on later runs.
+
+ImageLoader does the file reading (and, when Pillow is installed, the decoding and scaling) on a thread pool and
+hands finished images back to the Tk thread, so panels can show placeholders right away.
+"""
+
+import base64
+import io
+import math
+import os
+import queue
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import PhotoImage, TclError
+
+from profiling import metrics
+
+try:
+    from PIL import Image  # optional: lets the worker threads decode and scale pictures as well
+except ImportError:
+    Image = None
+
+thumbnail_size = (300, 150)  # size of the car pictures in the "Available Cars" grid
+detail_size = (600, 400)     # size of the picture in the car info panel
+
+# Image file contents read off the Tk thread. `ready` is False when the picture still has to be scaled down.
+RawImage = namedtuple("RawImage", "mtime data ready")
+
+def thumbnail_path(thumbnail_dir, path, size):
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(thumbnail_dir, f"{name}_{size[0]}x{size[1]}.png")
+
+# Reads a picture (or its stored thumbnail) as base64 PNG data. Does not touch Tk, so it is safe in worker threads.
+@metrics.timed("image.read")
+def read_image(path, size, thumbnail_dir):
+    mtime = os.path.getmtime(path)
+    if size is not None:
+        thumb_path = thumbnail_path(thumbnail_dir, path, size)
+        if os.path.exists(thumb_path) and os.path.getmtime(thumb_path) >= mtime:
+            with open(thumb_path, 'rb') as f:
+                return RawImage(mtime, base64.b64encode(f.read()), True)
+        if Image is not None:
+            with Image.open(path) as picture:
+                picture.thumbnail(size)
+                buffer = io.BytesIO()
+                picture.save(buffer, format="PNG")
+            try:
+                os.makedirs(thumbnail_dir, exist_ok=True)
+                with open(thumb_path, 'wb') as f:
+                    f.write(buffer.getvalue())
+            except OSError:
+                pass  # the thumbnail is only an optimisation, the image is still shown
+            return RawImage(mtime, base64.b64encode(buffer.getvalue()), True)
+    with open(path, 'rb') as f:
+        return RawImage(mtime, base64.b64encode(f.read()), size is None)
+
+# LRU cache of PhotoImages. Each entry remembers the file's mtime so an edited picture is picked up again.
+class ImageCache:
+    def __init__(self, budget=64 * 1024 * 1024, thumbnail_dir='.thumbnails'):
+        self.budget = budget  # bytes of decoded pixels kept in memory
+        self.thumbnail_dir = thumbnail_dir
+        self.entries = OrderedDict()  # (path, size) -> (mtime, image, bytes)
+        self.used = 0
+
+    # Returns the picture at `path` scaled down to fit `size` (or at full size), decoding it only if needed.
+    def get(self, path, size=None):
+        image = self.lookup(path, size)
+        if image is None:
+            image = self.add(path, size, read_image(path, size, self.thumbnail_dir))
+        return image
+
+    # Returns the cached picture if the file has not changed since it was decoded, otherwise None.
+    def lookup(self, path, size):
+        key = (path, size)
+        entry = self.entries.get(key)
+        if entry is None:
+            metrics.count("image.cache_miss")
+            return None
+        if entry[0] != os.path.getmtime(path):
+            self.discard(key)
+            metrics.count("image.cache_miss")
+            return None
+        self.entries.move_to_end(key)
+        metrics.count("image.cache_hit")
+        return entry[1]
+
+    # Decodes data from read_image into a PhotoImage (scaling it down if needed) and caches it.
+    @metrics.timed("image.decode")
+    def add(self, path, size, raw):
+        image = PhotoImage(data=raw.data)
+        if not raw.ready:
+            factor = max(math.ceil(image.width() / size[0]), math.ceil(image.height() / size[1]), 1)
+            if factor > 1:
+                image = image.subsample(factor)
+            try:
+                os.makedirs(self.thumbnail_dir, exist_ok=True)
+                image.write(thumbnail_path(self.thumbnail_dir, path, size), format="png")
+            except (OSError, TclError):
+                pass  # the thumbnail is only an optimisation, the image is still shown
+
+        key = (path, size)
+        if key in self.entries:
+            self.discard(key)
+        cost = image.width() * image.height() * 4
+        self.entries[key] = (raw.mtime, image, cost)
+        self.used += cost
+        while self.used > self.budget and len(self.entries) > 1:
+            self.discard(next(iter(self.entries)))  # least recently used
+        metrics.gauge("image.cache_bytes", self.used)
+        return image
+
+    def discard(self, key):
+        self.used -= self.entries.pop(key)[2]
+
+    def clear(self):
+        self.entries.clear()
+        self.used = 0
+
+image_cache = ImageCache()
+
+# Loads pictures on a thread pool. Results are collected on the Tk thread with after(), a few milliseconds of
+# decoding per tick, so the window keeps responding while a whole grid of pictures comes in.
+class ImageLoader:
+    def __init__(self, root, cache=image_cache, workers=4, poll_ms=10, tick_budget=0.008):
+        self.root = root
+        self.cache = cache
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image-loader")
+        self.poll_ms = poll_ms
+        self.tick_budget = tick_budget  # seconds of decoding allowed per tick
+        self.finished = queue.SimpleQueue()
+        self.waiting = {}  # (path, size) -> callbacks for a picture that is being read
+        self.polling = False
+
+    # Calls callback(image) on the Tk thread once the picture is available, or callback(None) if it can't be read.
+    # Cached pictures are handed over straight away.
+    def request(self, path, size, callback):
+        key = (path, size)
+        try:
+            image = self.cache.lookup(path, size)
+        except OSError:
+            callback(None)
+            return
+        if image is not None:
+            callback(image)
+            return
+        if key in self.waiting:
+            self.waiting[key].append(callback)
+            return
+        self.waiting[key] = [callback]
+        future = self.pool.submit(read_image, path, size, self.cache.thumbnail_dir)
+        future.add_done_callback(lambda f: self.finished.put((key, f)))
+        if not self.polling:
+            self.polling = True
+            self.root.after(self.poll_ms, self.poll)
+
+    def poll(self):
+        deadline = time.perf_counter() + self.tick_budget
+        while time.perf_counter() < deadline:
+            try:
+                key, future = self.finished.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                image = self.cache.add(key[0], key[1], future.result())
+            except Exception:
+                image = None
+            for callback in self.waiting.pop(key, []):
+                callback(image)
+        if self.waiting:
+            self.root.after(self.poll_ms, self.poll)
+        else:
+            self.polling = False
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
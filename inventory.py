@@ -0,0 +1,120 @@
+"""
+Stock levels and cart reservations for the car shop.
+
+A car may have a stock count, kept by the storage backend (cars without one are not counted and never run out).
+Adding a car to a cart reserves it for `hold` seconds, so nobody else can put the last one in their cart meanwhile;
+a background thread releases reservations as they expire, taking them off a heap ordered by expiry time.
+Buying takes the cars out of stock in the same transaction that charges the user (see the backends' purchase()),
+so stock can never go below zero, even with several processes selling from the same files.
+
+Reservations are kept in memory by the process serving the shop (the GUI or server.py). Checking what is available
+is a dict lookup; reserving and releasing cost O(log n) in the number of reservations.
+"""
+
+import heapq
+import threading
+import time
+
+class Inventory:
+    def __init__(self, backend, hold=15 * 60):
+        self.backend = backend
+        self.hold = hold  # seconds a car added to a cart stays reserved
+        self.reserved = {}  # car ID -> cars reserved in all carts
+        self.holds = {}  # (username, car ID) -> (cars reserved, expiry time)
+        self.user_holds = {}  # username -> car IDs the user has reserved
+        self.heap = []  # (expiry time, username, car ID); entries of renewed or released holds are skipped
+        self.condition = threading.Condition()
+        self.thread = None
+        self.closed = False
+
+    # Cars of this model in stock, or None if the car's stock is not counted.
+    def stock(self, car_id):
+        return self.backend.load_stock().get(car_id)
+
+    # Cars that can still be put in a cart (None: no limit). With a username, that user's own reservation counts
+    # as available to them.
+    def available(self, car_id, username=None):
+        stock = self.stock(car_id)
+        if stock is None:
+            return None
+        with self.condition:
+            reserved = self.reserved.get(car_id, 0)
+            if username is not None:
+                reserved -= self.holds.get((username, car_id), (0, 0))[0]
+        return max(0, stock - reserved)
+
+    # Reserves `quantity` more of a car for the user and restarts the user's hold on it.
+    # Returns False (and reserves nothing) if not enough are available.
+    def reserve(self, username, car_id, quantity=1):
+        if quantity < 1:
+            raise ValueError(f"can't reserve {quantity} cars")
+        stock = self.stock(car_id)
+        if stock is None:
+            return True
+        with self.condition:
+            if self.reserved.get(car_id, 0) + quantity > stock:
+                return False
+            held = self.holds.get((username, car_id), (0, 0))[0]
+            expiry = time.monotonic() + self.hold
+            self.holds[(username, car_id)] = (held + quantity, expiry)
+            self.user_holds.setdefault(username, set()).add(car_id)
+            self.reserved[car_id] = self.reserved.get(car_id, 0) + quantity
+            heapq.heappush(self.heap, (expiry, username, car_id))
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="reservations", daemon=True)
+                self.thread.start()
+            elif self.heap[0][0] == expiry:
+                self.condition.notify()  # the sweeper is waiting for a later expiry
+        return True
+
+    # Gives back `quantity` (default: all) of the user's reservation of a car.
+    def release(self, username, car_id, quantity=None):
+        if quantity is not None and quantity < 1:
+            raise ValueError(f"can't release {quantity} cars")
+        with self.condition:
+            held = self.holds.get((username, car_id))
+            if held is None:
+                return
+            quantity = held[0] if quantity is None else min(quantity, held[0])
+            self.reserved[car_id] -= quantity
+            if not self.reserved[car_id]:
+                del self.reserved[car_id]
+            if quantity < held[0]:
+                self.holds[(username, car_id)] = (held[0] - quantity, held[1])
+                return
+            del self.holds[(username, car_id)]  # its heap entry is skipped when it comes up
+            self.user_holds[username].discard(car_id)
+            if not self.user_holds[username]:
+                del self.user_holds[username]
+
+    # Drops all of the user's reservations, e.g. once the cars are bought.
+    def release_all(self, username):
+        with self.condition:
+            for car_id in list(self.user_holds.get(username, ())):
+                self.release(username, car_id)
+
+    # Checks a cart's lines ({car ID: quantity}) against the stock left over by other users' reservations.
+    # Returns (car ID, available) for the first line asking for more than that, or None if the cart can be bought.
+    def check_cart(self, username, lines):
+        for car_id, quantity in lines.items():
+            available = self.available(car_id, username)
+            if available is not None and quantity > available:
+                return car_id, available
+        return None
+
+    # Releases expired holds, waiting until the earliest one is due.
+    def run(self):
+        with self.condition:
+            while not self.closed:
+                now = time.monotonic()
+                while self.heap and self.heap[0][0] <= now:
+                    expiry, username, car_id = heapq.heappop(self.heap)
+                    held = self.holds.get((username, car_id))
+                    if held is not None and held[1] == expiry:
+                        self.release(username, car_id)
+                self.condition.wait(self.heap[0][0] - now if self.heap else None)
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
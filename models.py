@@ -0,0 +1,168 @@
+"""
+Plain data records used by the car shop: cars, users and the admin account.
+They live in their own module so the storage backends and the GUI can share them.
+Car and User use __slots__ so each record is a few fixed fields instead of a per-instance dict, and CarColumns
+stores a whole catalogue column by column for the pickle backend.
+"""
+
+from array import array
+from collections.abc import MutableMapping
+from itertools import islice
+
+from passwords import verify_password
+
+# Restores a __slots__ record from a pickle. Older pickles hold the instance __dict__, newer ones
+# a (None, slot values) pair; both are plain field -> value mappings in the end.
+def set_slots(record, state, defaults):
+    if isinstance(state, tuple):
+        state = state[1]
+    for name, value in {**defaults, **state}.items():
+        setattr(record, name, value)
+
+#Shows a car with basic attributes: brand, model, price, description, and image.
+#car_id is the car's stable ID in the car database; it is assigned when the car is added.
+class Car:
+    __slots__ = ("brand", "model", "price", "description", "photo", "car_id")
+
+    def __init__(self, brand, model, price, description, photo, car_id=None):
+        self.brand = brand
+        self.model = model
+        self.price = price
+        self.description = description
+        self.photo = photo
+        self.car_id = car_id
+
+    # The car's fields as a dict, e.g. for journal records (Car(**car.as_dict()) makes a copy).
+    def as_dict(self):
+        return {name: getattr(self, name) for name in Car.__slots__}
+
+    def __setstate__(self, state):
+        set_slots(self, state, {"car_id": None})  # cars pickled before IDs existed have none
+
+# Represents a user with a username, password (a salted hash, see passwords.py), and an account balance.
+# version counts the saves of the record (0 = never saved); a save based on an older version is refused.
+class User:
+    __slots__ = ("username", "password", "balance", "version")
+
+    def __init__(self, username, password, balance=0.0, version=0):
+        self.username = username
+        self.password = password
+        self.balance = balance
+        self.version = version
+
+    def __setstate__(self, state):
+        set_slots(self, state, {"version": 1})  # users pickled before versions existed were saved once
+
+# Shows an admin user, extending the User class with authentication logic.
+class Admin(User):
+    # Stores admin credentials as password hashes (make one with `python passwords.py hash`); the default is admin123
+    admin_credentials = {
+        "admin": "pbkdf2_sha256$600000$53TaE1UbC0g0FOxqkgPcSw==$V4dlmDHmjWFS7nuWhhCh+E9tc8KNyPHUKOAtS4upD3k=",
+    }
+
+    #Validates if the given username and password match the admin credentials
+    def authenticate(self, username, password):
+        stored = Admin.admin_credentials.get(username)
+        return stored is not None and verify_password(stored, password)[0]
+
+# A catalogue of cars stored column by column: brands, models and photo names are interned into one string table
+# and kept as small integer codes, prices live in a float array. It behaves like a dict of car ID -> Car; the Car
+# objects are built when they are read, so only the cars actually looked at exist as objects.
+class CarColumns(MutableMapping):
+    def __init__(self, cars=()):
+        self.strings = []            # interned brand, model and photo names
+        self.codes = {}              # string -> position in self.strings
+        self.ids = array('q')        # car ID in each slot, 0 for a deleted car
+        self.brands = array('I')     # string codes
+        self.models = array('I')
+        self.photos = array('I')
+        self.prices = array('d')
+        self.descriptions = []
+        self.slot_of = array('q')    # car ID -> slot, -1 if there is no car with that ID
+        self.deleted = 0
+        for car in cars:
+            self[car.car_id] = car
+
+    def code(self, string):
+        code = self.codes.get(string)
+        if code is None:
+            code = self.codes[string] = len(self.strings)
+            self.strings.append(string)
+        return code
+
+    def slot(self, car_id):
+        if 0 < car_id < len(self.slot_of):
+            return self.slot_of[car_id]
+        return -1
+
+    def __getitem__(self, car_id):
+        slot = self.slot(car_id)
+        if slot < 0:
+            raise KeyError(car_id)
+        strings = self.strings
+        return Car(strings[self.brands[slot]], strings[self.models[slot]], self.prices[slot],
+                   self.descriptions[slot], strings[self.photos[slot]], car_id)
+
+    # Overwrites an existing car in place, otherwise appends it (so iteration stays in insertion order).
+    def __setitem__(self, car_id, car):
+        slot = self.slot(car_id)
+        if slot < 0:
+            if car_id >= len(self.slot_of):
+                self.slot_of.extend([-1] * (car_id + 1 - len(self.slot_of)))
+            self.slot_of[car_id] = len(self.ids)
+            self.ids.append(car_id)
+            self.brands.append(self.code(car.brand))
+            self.models.append(self.code(car.model))
+            self.photos.append(self.code(car.photo))
+            self.prices.append(car.price)
+            self.descriptions.append(car.description)
+            return
+        self.brands[slot] = self.code(car.brand)
+        self.models[slot] = self.code(car.model)
+        self.photos[slot] = self.code(car.photo)
+        self.prices[slot] = car.price
+        self.descriptions[slot] = car.description
+
+    # Leaves a hole in the columns; holes are squeezed out once they make up half of the slots.
+    def __delitem__(self, car_id):
+        slot = self.slot(car_id)
+        if slot < 0:
+            raise KeyError(car_id)
+        self.slot_of[car_id] = -1
+        self.ids[slot] = 0
+        self.descriptions[slot] = None
+        self.deleted += 1
+        if self.deleted > 1000 and self.deleted * 2 > len(self.ids):
+            self.compact()
+
+    def __iter__(self):
+        for car_id in self.ids:
+            if car_id:
+                yield car_id
+
+    def __len__(self):
+        return len(self.ids) - self.deleted
+
+    def __contains__(self, car_id):
+        return self.slot(car_id) >= 0
+
+    # The cars at positions offset to offset + count - 1 in catalogue (car ID) order. The positions are read off the
+    # ID column, so no Car is built for the cars before the page.
+    def page(self, offset, count):
+        if self.deleted:
+            ids = islice(filter(None, self.ids), offset, offset + count)
+        else:
+            ids = self.ids[offset:offset + count]
+        return [self[car_id] for car_id in ids]
+
+    def compact(self):
+        keep = [slot for slot, car_id in enumerate(self.ids) if car_id]
+        self.ids = array('q', (self.ids[slot] for slot in keep))
+        self.brands = array('I', (self.brands[slot] for slot in keep))
+        self.models = array('I', (self.models[slot] for slot in keep))
+        self.photos = array('I', (self.photos[slot] for slot in keep))
+        self.prices = array('d', (self.prices[slot] for slot in keep))
+        self.descriptions = [self.descriptions[slot] for slot in keep]
+        for slot, car_id in enumerate(self.ids):
+            self.slot_of[car_id] = slot
+        self.deleted = 0
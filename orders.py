@@ -0,0 +1,259 @@
+"""
+Order history for the car shop: every purchase is appended to a ledger that is never rewritten.
+
+The ledger is split by month into segment files (orders/2026-10.orders), framed like the car journal (length and
+crc32 per record), so a torn last record is recognised and cut off. Next to each segment a summary file
+(orders/2026-10.summary) keeps the month's totals by brand, model, day and user and the offset of the last order
+it includes; it is brought up to date from the orders appended since, whenever a report reads it.
+
+Reports add up the summaries of the months they cover and read orders only for the months cut by their date range,
+one order at a time, so years of sales are never loaded into memory at once.
+
+    python orders.py report [--since 2026-01-01] [--until 2026-12-31] [--top 10] [--days]
+"""
+
+import argparse
+import datetime
+import glob
+import heapq
+import os
+import pickle
+import time
+import zlib
+from collections import namedtuple
+
+from storage import FileLock, Journal, dump_atomic, load_pickle, sync_directory
+
+# One purchase; time is in seconds since the epoch. Items are the cars bought, at the price charged.
+Order = namedtuple("Order", "username time items")
+OrderItem = namedtuple("OrderItem", "car_id brand model price quantity")
+
+def order_total(order):
+    return sum(item.price * item.quantity for item in order.items)
+
+def order_date(order):
+    return datetime.date.fromtimestamp(order.time)
+
+# An order as it is stored in a segment.
+def encode_order(order):
+    data = pickle.dumps((order.username, order.time, [tuple(item) for item in order.items]))
+    return Journal.header.pack(len(data), zlib.crc32(data)) + data
+
+def month_of(when):
+    return time.strftime("%Y-%m", time.localtime(when))
+
+# Yields (offset after the order, order) for the complete orders of a segment from byte `start` on.
+# Stops at a torn or half-written record (one being appended by another process is picked up next time).
+def read_segment(path, start=0):
+    header = Journal.header
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return
+    with f:
+        f.seek(start)
+        offset = start
+        while True:
+            head = f.read(header.size)
+            if len(head) < header.size:
+                return
+            length, crc = header.unpack(head)
+            payload = f.read(length)
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                return
+            offset += header.size + length
+            username, when, items = pickle.loads(payload)
+            yield offset, Order(username, when, [OrderItem(*item) for item in items])
+
+# Totals of a set of orders. Summaries of different months are added up with merge().
+class Summary:
+    def __init__(self):
+        self.orders = 0
+        self.cars = 0  # cars sold
+        self.revenue = 0.0
+        self.brands = {}  # brand -> [cars sold, revenue]
+        self.models = {}  # (brand, model) -> [cars sold, revenue]
+        self.days = {}  # "YYYY-MM-DD" -> [orders, revenue]
+        self.users = {}  # username -> [orders, money spent]
+
+    def add(self, order):
+        total = order_total(order)
+        self.orders += 1
+        self.revenue += total
+        for item in order.items:
+            amount = item.price * item.quantity
+            self.cars += item.quantity
+            add_to(self.brands, item.brand, item.quantity, amount)
+            add_to(self.models, (item.brand, item.model), item.quantity, amount)
+        add_to(self.days, order_date(order).isoformat(), 1, total)
+        add_to(self.users, order.username, 1, total)
+
+    def merge(self, other):
+        self.orders += other.orders
+        self.cars += other.cars
+        self.revenue += other.revenue
+        for name in ("brands", "models", "days", "users"):
+            totals = getattr(self, name)
+            for key, (count, amount) in getattr(other, name).items():
+                add_to(totals, key, count, amount)
+
+    # (brand, [cars sold, revenue]) by revenue, highest first.
+    def revenue_by_brand(self):
+        return sorted(self.brands.items(), key=lambda entry: -entry[1][1])
+
+    # (day, [orders, revenue]) in date order.
+    def revenue_by_day(self):
+        return sorted(self.days.items())
+
+    # ((brand, model), [cars sold, revenue]) for the n models sold most.
+    def top_models(self, n=10):
+        return heapq.nlargest(n, self.models.items(), key=lambda entry: (entry[1][0], entry[1][1]))
+
+    # (username, [orders, money spent]) for the n users who spent most.
+    def top_users(self, n=10):
+        return heapq.nlargest(n, self.users.items(), key=lambda entry: entry[1][1])
+
+    def spend(self, username):
+        return self.users.get(username, [0, 0.0])[1]
+
+def add_to(totals, key, count, amount):
+    entry = totals.get(key)
+    if entry is None:
+        totals[key] = [count, amount]
+    else:
+        entry[0] += count
+        entry[1] += amount
+
+# The ledger in `directory`. Several processes can record orders at once: appends are made under a lock file.
+class OrderLedger:
+    def __init__(self, directory='orders'):
+        self.directory = directory
+        self.lock = FileLock(os.path.join(directory, 'orders.lock'))
+        self.ends = {}  # segment path -> end of its last complete order when this process last appended to it
+
+    def segment_path(self, month):
+        return os.path.join(self.directory, f"{month}.orders")
+
+    # Months with orders, as ("YYYY-MM", segment path), oldest first.
+    def segments(self):
+        paths = sorted(glob.glob(os.path.join(glob.escape(self.directory), "*.orders")))
+        return [(os.path.basename(path)[:-len(".orders")], path) for path in paths]
+
+    # Appends an order for the cars just bought (items: (car ID, brand, model, price, quantity) tuples, as
+    # returned by the backends' purchase()) and fsyncs it. Returns the Order.
+    def record(self, username, items, when=None):
+        order = Order(username, time.time() if when is None else when, [OrderItem(*item) for item in items])
+        data = encode_order(order)
+        path = self.segment_path(month_of(order.time))
+        os.makedirs(self.directory, exist_ok=True)
+        with self.lock:
+            with open(path, 'ab') as f:
+                end = f.tell()
+                if end != self.ends.get(path):  # first append here, or others appended since: check the tail
+                    complete = self.complete_end(path)
+                    if complete < end:
+                        f.truncate(complete)  # a record torn by a crash
+                        end = complete
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            if end == 0:
+                sync_directory(self.directory)
+            self.ends[path] = end + len(data)
+        return order
+
+    # Offset of the end of the segment's last complete order, reading on from what is already known to be complete.
+    def complete_end(self, path):
+        start = self.ends.get(path)
+        if start is None or start > os.path.getsize(path):
+            start = self.load_summary(path)[0]
+        end = start
+        for end, _ in read_segment(path, start):
+            pass
+        return end
+
+    def summary_path(self, path):
+        return path[:-len(".orders")] + ".summary"
+
+    # (offset of the last order included, Summary) as last saved; nothing saved yet is (0, empty Summary).
+    def load_summary(self, path):
+        summary = Summary()
+        try:
+            end, totals = load_pickle(self.summary_path(path))
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return 0, summary
+        vars(summary).update(totals)
+        return end, summary
+
+    # Summary of a whole segment. Orders appended since its summary was saved are added and the summary saved again.
+    def summary(self, path):
+        end, summary = self.load_summary(path)
+        start = end
+        for end, order in read_segment(path, start):
+            summary.add(order)
+        if end != start:
+            with self.lock:  # another report may be saving it too
+                dump_atomic((end, vars(summary)), self.summary_path(path))  # plain dicts, so any module can read it
+        return summary
+
+    # Orders from day `since` to day `until` (datetime.date, both included, None: no limit), oldest first.
+    def orders(self, since=None, until=None, username=None):
+        for month, path in self.segments():
+            first, last = month_days(month)
+            if (since and last < since) or (until and first > until):
+                continue
+            for _, order in read_segment(path):
+                if username is not None and order.username != username:
+                    continue
+                if (since and order_date(order) < since) or (until and order_date(order) > until):
+                    continue
+                yield order
+
+    # Summary of the orders from `since` to `until`. Whole months come from their summaries; only the months the
+    # range starts or ends in are read order by order.
+    def report(self, since=None, until=None):
+        total = Summary()
+        for month, path in self.segments():
+            first, last = month_days(month)
+            if (since and last < since) or (until and first > until):
+                continue
+            if (since is None or since <= first) and (until is None or last <= until):
+                total.merge(self.summary(path))
+            else:
+                for _, order in read_segment(path):
+                    if (since is None or since <= order_date(order)) and (until is None or order_date(order) <= until):
+                        total.add(order)
+        return total
+
+# First and last day of a "YYYY-MM" month.
+def month_days(month):
+    first = datetime.date.fromisoformat(month + "-01")
+    following = (first + datetime.timedelta(days=31)).replace(day=1)
+    return first, following - datetime.timedelta(days=1)
+
+def print_report(summary, top, days):
+    print(f"{summary.orders} orders, {summary.cars} cars sold, revenue ${summary.revenue:,.2f}")
+    print("\nRevenue by brand:")
+    for brand, (cars, revenue) in summary.revenue_by_brand():
+        print(f"  {brand:<20} {cars:>8} cars  ${revenue:>16,.2f}")
+    print(f"\nTop {top} models:")
+    for (brand, model), (cars, revenue) in summary.top_models(top):
+        print(f"  {brand + ' ' + model:<30} {cars:>8} cars  ${revenue:>16,.2f}")
+    print(f"\nTop {top} customers:")
+    for username, (orders, spent) in summary.top_users(top):
+        print(f"  {username:<20} {orders:>8} orders  ${spent:>16,.2f}")
+    if days:
+        print("\nRevenue by day:")
+        for day, (orders, revenue) in summary.revenue_by_day():
+            print(f"  {day}  {orders:>8} orders  ${revenue:>16,.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sales reports from the order history")
+    commands = parser.add_subparsers(dest="command", required=True)
+    report = commands.add_parser("report", help="revenue by brand, top models and customers")
+    report.add_argument("--since", type=datetime.date.fromisoformat, help="first day (YYYY-MM-DD)")
+    report.add_argument("--until", type=datetime.date.fromisoformat, help="last day (YYYY-MM-DD)")
+    report.add_argument("--top", type=int, default=10, help="models and customers to list")
+    report.add_argument("--days", action="store_true", help="also list the revenue of every day")
+    args = parser.parse_args()
+    print_report(OrderLedger().report(args.since, args.until), args.top, args.days)
@@ -0,0 +1,132 @@
+"""
+Password hashing for the car shop. Passwords are stored as salted, deliberately slow hashes:
+
+    pbkdf2_sha256$<iterations>$<salt>$<hash>    (default)
+    scrypt$<n>$<r>$<p>$<salt>$<hash>
+
+with salt and hash in base64. The cost is stored with each hash, so it can be raised later: a login with an older,
+cheaper hash (or a plaintext password from before hashing) succeeds and returns a new hash to store.
+Checking a password takes a noticeable fraction of a second on purpose, so PasswordHasher runs it on a thread pool
+(hashlib releases the GIL while hashing) and the GUI or the server keeps responding.
+
+Run `python passwords.py hash` to make a hash for a new password, e.g. for Admin.admin_credentials in models.py.
+"""
+
+import base64
+import getpass
+import hashlib
+import hmac
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+pbkdf2_iterations = 600_000  # PBKDF2-HMAC-SHA256 rounds for new hashes
+scrypt_cost = (2 ** 14, 8, 1)  # scrypt n, r, p for new hashes
+
+def b64(data):
+    return base64.b64encode(data).decode("ascii")
+
+# Hashes a password with a new random salt.
+def hash_password(password, algorithm="pbkdf2_sha256", iterations=None, cost=None):
+    salt = os.urandom(16)
+    if algorithm == "scrypt":
+        n, r, p = cost or scrypt_cost
+        digest = hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=2 * 128 * r * n)
+        return f"scrypt${n}${r}${p}${b64(salt)}${b64(digest)}"
+    iterations = iterations or pbkdf2_iterations
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations)
+    return f"pbkdf2_sha256${iterations}${b64(salt)}${b64(digest)}"
+
+def is_hashed(stored):
+    return stored.startswith(("pbkdf2_sha256$", "scrypt$"))
+
+# Checks a password against a stored hash (or a plaintext password saved before hashing existed).
+# Returns (matches, needs_rehash); needs_rehash means the record should be saved again with a current hash.
+def verify_password(stored, password, algorithm="pbkdf2_sha256", iterations=None, cost=None):
+    if not is_hashed(stored):
+        return hmac.compare_digest(stored.encode(), password.encode()), True
+    scheme, *fields = stored.split("$")
+    if scheme == "scrypt":
+        n, r, p = map(int, fields[:3])
+        salt, digest = base64.b64decode(fields[3]), base64.b64decode(fields[4])
+        computed = hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=2 * 128 * r * n)
+        outdated = algorithm != "scrypt" or (n, r, p) != tuple(cost or scrypt_cost)
+    else:
+        rounds = int(fields[0])
+        salt, digest = base64.b64decode(fields[1]), base64.b64decode(fields[2])
+        computed = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, rounds)
+        outdated = algorithm != "pbkdf2_sha256" or rounds < (iterations or pbkdf2_iterations)
+    return hmac.compare_digest(computed, digest), outdated
+
+# Hashes and checks passwords on a pool of worker threads with the configured algorithm and cost.
+class PasswordHasher:
+    def __init__(self, algorithm="pbkdf2_sha256", iterations=None, cost=None, workers=None):
+        self.algorithm = algorithm
+        self.iterations = iterations  # PBKDF2 rounds (None: pbkdf2_iterations)
+        self.cost = cost  # scrypt (n, r, p) (None: scrypt_cost)
+        self.pool = ThreadPoolExecutor(max_workers=workers or min(4, os.cpu_count() or 1),
+                                       thread_name_prefix="password")
+        self.dummy = None  # hash checked for unknown usernames, so they take as long as real ones
+
+    def hash(self, password):
+        return hash_password(password, self.algorithm, self.iterations, self.cost)
+
+    # Future of (matches, new hash or None). The new hash is computed right away when the password matches but its
+    # record is outdated (plaintext or an older cost), so the caller only has to store it.
+    def check(self, stored, password):
+        if stored is None:
+            return self.pool.submit(self.check_unknown, password)
+        return self.pool.submit(self.check_now, stored, password)
+
+    # Check for a username that doesn't exist. The dummy hash is made here, on the pool, the first time it is needed.
+    def check_unknown(self, password):
+        if self.dummy is None:
+            self.dummy = self.hash("")
+        self.check_now(self.dummy, password + "\0")  # can never match the dummy
+        return False, None
+
+    def check_now(self, stored, password):
+        matches, outdated = verify_password(stored, password, self.algorithm, self.iterations, self.cost)
+        return matches, self.hash(password) if matches and outdated else None
+
+    def close(self):
+        self.pool.shutdown(wait=False)
+
+# Counts failed logins per username: after max_failures within `window` seconds, further attempts are refused
+# until the oldest of those failures is `window` seconds old. A successful login clears the count.
+class LoginLimiter:
+    def __init__(self, max_failures=5, window=60.0):
+        self.max_failures = max_failures
+        self.window = window
+        self.failures = {}  # username -> deque of failure times
+
+    # Seconds until the username may try again, 0 if it may try now.
+    def wait_time(self, username, now=None):
+        now = time.monotonic() if now is None else now
+        failures = self.failures.get(username)
+        if not failures:
+            return 0
+        while failures and failures[0] <= now - self.window:
+            failures.popleft()
+        if not failures:
+            del self.failures[username]
+            return 0
+        if len(failures) < self.max_failures:
+            return 0
+        return failures[0] + self.window - now
+
+    def failed(self, username):
+        if len(self.failures) > 10_000:  # forget usernames whose failures have all expired
+            for name in list(self.failures):
+                self.wait_time(name)
+        self.failures.setdefault(username, deque()).append(time.monotonic())
+
+    def succeeded(self, username):
+        self.failures.pop(username, None)
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["hash"]:
+        sys.exit("usage: python passwords.py hash")
+    print(hash_password(getpass.getpass("Password: ")))
@@ -0,0 +1,136 @@
+"""
+Timers and counters for finding where the car shop spends its time: store loads and saves, image reads and
+decodes, and how long each panel takes to build. Recording is off until metrics.enable() is called (the GUI does
+that for --profile), so the instrumented code only pays for one attribute check.
+
+Overlay draws the latest numbers in a corner of the window; metrics.dump() writes everything as JSON.
+"""
+
+import contextlib
+import functools
+import json
+import threading
+import time
+
+# Named timers (count, total, max and last duration in seconds), counters and gauges (last value). Safe to use from
+# worker threads.
+class Metrics:
+    def __init__(self):
+        self.enabled = False
+        self.started = time.perf_counter()
+        self.timers = {}    # name -> [count, total, max, last]
+        self.counters = {}  # name -> count
+        self.gauges = {}    # name -> last value
+        self.lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+        self.started = time.perf_counter()
+
+    def record(self, name, seconds):
+        if not self.enabled:
+            return
+        with self.lock:
+            timer = self.timers.get(name)
+            if timer is None:
+                self.timers[name] = [1, seconds, seconds, seconds]
+            else:
+                timer[0] += 1
+                timer[1] += seconds
+                timer[2] = max(timer[2], seconds)
+                timer[3] = seconds
+
+    @contextlib.contextmanager
+    def timer(self, name):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    # Decorator form of timer().
+    def timed(self, name):
+        def decorate(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.record(name, time.perf_counter() - start)
+            return wrapper
+        return decorate
+
+    def count(self, name, n=1):
+        if self.enabled:
+            with self.lock:
+                self.counters[name] = self.counters.get(name, 0) + n
+
+    def gauge(self, name, value):
+        if self.enabled:
+            with self.lock:
+                self.gauges[name] = value
+
+    # Everything recorded so far, durations in milliseconds.
+    def snapshot(self):
+        with self.lock:
+            return {
+                "uptime_s": round(time.perf_counter() - self.started, 3),
+                "timers": {name: {"count": count, "total_ms": round(total * 1000, 3),
+                                  "mean_ms": round(total / count * 1000, 3), "max_ms": round(longest * 1000, 3),
+                                  "last_ms": round(last * 1000, 3)}
+                           for name, (count, total, longest, last) in sorted(self.timers.items())},
+                "counters": dict(sorted(self.counters.items())),
+                "gauges": dict(sorted(self.gauges.items())),
+            }
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+metrics = Metrics()
+
+# Number of widgets under (and including) a widget.
+def widget_count(widget):
+    return 1 + sum(widget_count(child) for child in widget.winfo_children())
+
+# A small text box in the bottom right corner of the window with the latest panel build time, the number of
+# widgets and the store and image timers, refreshed every `interval_ms`. F12 shows or hides it.
+class Overlay:
+    def __init__(self, root, metrics=metrics, interval_ms=500):
+        from tkinter import Label
+
+        self.root = root
+        self.metrics = metrics
+        self.interval_ms = interval_ms
+        self.label = Label(root, font=("Courier", 10), bg="black", fg="lime", justify="left", anchor="nw")
+        self.shown = True
+        root.bind("<F12>", self.toggle)
+        self.update()
+
+    def toggle(self, event=None):
+        self.shown = not self.shown
+        if not self.shown:
+            self.label.place_forget()
+
+    def text(self):
+        data = self.metrics.snapshot()
+        panel = data["gauges"].get("panel")
+        lines = [f"panel    {panel or '-'}",
+                 f"widgets  {widget_count(self.root) - 2}"]  # not counting the window and this label
+        for name, timer in data["timers"].items():
+            if name.startswith(("panel.", "store.", "image.", "startup")):
+                lines.append(f"{name:<24}{timer['last_ms']:>9.1f} ms  (x{timer['count']}, max {timer['max_ms']:.1f})")
+        return "\n".join(lines)
+
+    def update(self):
+        if self.shown:
+            self.label.configure(text=self.text())
+            self.label.place(relx=1, rely=1, anchor="se")
+            self.label.lift()
+        self.root.after(self.interval_ms, self.update)
@@ -0,0 +1,263 @@
+"""
+HTTP/JSON front end for the car shop, so many clients can use one ShopService at the same time.
+It is a small HTTP/1.1 server on asyncio (standard library only) with keep-alive connections. Service calls run on
+the event loop thread one at a time, so the stores never see concurrent changes. Changes made by other processes
+sharing the data files (the GUI at a kiosk, another server) are picked up every poll_interval seconds.
+
+    python server.py --port 8080 [--storage sqlite]
+
+Endpoints (JSON in and out; user endpoints need "Authorization: Bearer <token>" from POST /login):
+    GET    /cars?q=&brand=&model=&min_price=&max_price=&sort=&offset=&limit=
+    GET    /cars/<id>
+    GET    /brands
+    POST   /accounts   {"username", "password"}
+    POST   /login      {"username", "password"}  -> {"token", "balance"}
+    GET    /cart
+    POST   /cart       {"car_id", "quantity"}
+    DELETE /cart/<id>
+    POST   /purchase
+"""
+
+import argparse
+import asyncio
+import json
+import secrets
+import traceback
+from http import HTTPStatus
+from urllib.parse import parse_qsl, urlsplit
+
+from database import car_sorts
+from passwords import PasswordHasher
+from service import ShopError, ShopService, TooManyAttempts
+from storage import PickleBackend, SqliteBackend
+
+max_body = 1 << 20  # largest request body accepted, in bytes
+max_page = 200  # largest page of cars returned by GET /cars
+
+# An error answered to the client as {"error": message} with the given status.
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def car_json(car):
+    return {"id": car.car_id, "brand": car.brand, "model": car.model, "price": car.price,
+            "description": car.description, "photo": car.photo}
+
+# Reads an int (or float) query/body parameter, answering 400 when it isn't a number.
+def number(params, name, kind=int, default=None):
+    value = params.get(name)
+    if value in (None, ""):
+        return default
+    try:
+        return kind(value)
+    except (TypeError, ValueError):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"{name} must be a number!")
+
+# Reads a string body parameter, answering 400 when it is something else (a list, a number...).
+def text(params, name):
+    value = params.get(name, "")
+    if not isinstance(value, str):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"{name} must be a string!")
+    return value
+
+# Serves a ShopService over HTTP. Sessions are random tokens kept in memory (token -> username).
+class ShopServer:
+    poll_interval = 1.0  # seconds between looks at what other processes changed
+
+    def __init__(self, service):
+        self.service = service
+        self.sessions = {}
+        self.routes = {
+            ("GET", "cars"): self.list_cars,
+            ("GET", "car"): self.get_car,
+            ("GET", "brands"): self.list_brands,
+            ("POST", "accounts"): self.create_account,
+            ("POST", "login"): self.login,
+            ("GET", "cart"): self.get_cart,
+            ("POST", "cart"): self.add_to_cart,
+            ("DELETE", "cart_item"): self.remove_from_cart,
+            ("POST", "purchase"): self.purchase,
+        }
+
+    async def serve(self, host="127.0.0.1", port=8080):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        poller = asyncio.create_task(self.poll_changes())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            poller.cancel()
+
+    # Picks up what other processes have changed in the shared stores. A failed poll is reported and the next one
+    # tried as usual, so one unreadable file doesn't stop the server from ever seeing changes again.
+    async def poll_changes(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                self.service.poll()
+            except Exception:
+                traceback.print_exc()
+
+    # Answers requests on one connection until the client closes it or asks to.
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                if length > max_body:
+                    status, body = HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": "Request body too large"}
+                    keep_alive = False
+                else:
+                    data = await reader.readexactly(length) if length else b""
+                    status, body = await self.dispatch(method, target, headers, data)
+                    keep_alive = (headers.get("connection", "").lower() != "close"
+                                  and version == "HTTP/1.1")
+                payload = json.dumps(body).encode()
+                writer.write(f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                             f"Content-Type: application/json\r\n"
+                             f"Content-Length: {len(payload)}\r\n"
+                             f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ValueError, ConnectionError, asyncio.IncompleteReadError):
+            pass  # malformed request or the client went away
+        finally:
+            writer.close()
+
+    # Runs the handler for one request and returns (status, JSON body). Handlers that hash passwords are
+    # coroutines that wait for the hashing pool, so other connections are served meanwhile.
+    async def dispatch(self, method, target, headers, data):
+        url = urlsplit(target)
+        parts = [part for part in url.path.split("/") if part]
+        route, item = (parts[0], None) if len(parts) == 1 else (None, None)
+        if len(parts) == 2 and parts[0] in ("cars", "cart"):
+            route, item = {"cars": "car", "cart": "cart_item"}[parts[0]], parts[1]
+        handler = self.routes.get((method, route))
+        try:
+            if handler is None:
+                raise HTTPError(HTTPStatus.NOT_FOUND, "Not found")
+            try:
+                params = json.loads(data) if data else {}
+            except ValueError:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "Body must be JSON")
+            if not isinstance(params, dict):
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "Body must be a JSON object")
+            params.update(parse_qsl(url.query))
+            if item is not None:
+                params["id"] = item
+            result = handler(params, headers)
+            if asyncio.iscoroutine(result):
+                result = await result
+            return HTTPStatus.OK, result
+        except HTTPError as e:
+            return e.status, {"error": str(e)}
+        except ShopError as e:
+            return HTTPStatus.BAD_REQUEST, {"error": str(e)}
+        except Exception:
+            traceback.print_exc()
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Internal server error"}
+
+    # Returns the username of the session in the Authorization header.
+    def user(self, headers):
+        scheme, _, token = headers.get("authorization", "").partition(" ")
+        username = self.sessions.get(token) if scheme.lower() == "bearer" else None
+        if username is None:
+            raise HTTPError(HTTPStatus.UNAUTHORIZED, "Login required")
+        return username
+
+    def list_cars(self, params, headers):
+        if params.get("sort") not in (None, "", *car_sorts):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"sort must be one of {', '.join(car_sorts)}")
+        total, cars = self.service.search_cars(
+            text=params.get("q", ""), brand=params.get("brand") or None, model=params.get("model") or None,
+            min_price=number(params, "min_price", float), max_price=number(params, "max_price", float),
+            sort=params.get("sort") or None, offset=max(number(params, "offset", default=0), 0),
+            limit=min(max(number(params, "limit", default=30), 0), max_page))
+        return {"total": total, "cars": [car_json(car) for car in cars]}
+
+    def get_car(self, params, headers):
+        try:
+            car = self.service.get_car(number(params, "id"))
+        except ShopError as e:
+            raise HTTPError(HTTPStatus.NOT_FOUND, str(e))
+        return {**car_json(car), "available": self.service.available(car.car_id)}  # null: not counted
+
+    def list_brands(self, params, headers):
+        return self.service.brands()
+
+    async def create_account(self, params, headers):
+        username, password = text(params, "username"), text(params, "password")
+        self.service.check_new_account(username, password)  # before spending time on the hash
+        password_hash = await asyncio.wrap_future(self.service.begin_hash(password))
+        self.service.create_account(username, password, password_hash)
+        return {"username": username}
+
+    async def login(self, params, headers):
+        username, password = text(params, "username"), text(params, "password")
+        try:
+            future = self.service.begin_login(username, password)
+            await asyncio.wrap_future(future)
+            user = self.service.finish_login(username, future)
+        except TooManyAttempts as e:
+            raise HTTPError(HTTPStatus.TOO_MANY_REQUESTS, str(e))
+        except ShopError as e:
+            raise HTTPError(HTTPStatus.UNAUTHORIZED, str(e))
+        token = secrets.token_urlsafe(24)
+        self.sessions[token] = user.username
+        return {"token": token, "balance": user.balance}
+
+    def get_cart(self, params, headers):
+        cart = self.service.cart(self.user(headers))
+        return {"items": [{"car": car_json(car), "quantity": quantity} for car, quantity in cart.items()],
+                "total": cart.get_total_cost()}
+
+    def add_to_cart(self, params, headers):
+        quantity = number(params, "quantity", default=1)
+        if quantity < 1:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "quantity must be at least 1")
+        car_id = number(params, "car_id")
+        if car_id is None:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "car_id is required")
+        self.service.add_to_cart(self.user(headers), car_id, quantity)
+        return self.get_cart(params, headers)
+
+    def remove_from_cart(self, params, headers):
+        quantity = number(params, "quantity", default=1)
+        if quantity < 1:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "quantity must be at least 1")
+        self.service.remove_from_cart(self.user(headers), number(params, "id"), quantity)
+        return self.get_cart(params, headers)
+
+    def purchase(self, params, headers):
+        user = self.service.purchase(self.user(headers))
+        return {"balance": user.balance}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Car shop HTTP/JSON server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--storage", choices=["pickle", "sqlite"], default="pickle",
+                        help="keep data in the .pickle files (default) or in carapp.db")
+    parser.add_argument("--hash-workers", type=int, help="threads checking passwords (default: up to 4)")
+    parser.add_argument("--hash-iterations", type=int, help="PBKDF2 rounds for new password hashes")
+    args = parser.parse_args()
+    service = ShopService(SqliteBackend() if args.storage == "sqlite" else PickleBackend(),
+                          PasswordHasher(iterations=args.hash_iterations, workers=args.hash_workers))
+    try:
+        asyncio.run(ShopServer(service).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
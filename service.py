@@ -0,0 +1,339 @@
+"""
+The car shop without a GUI: accounts, the catalogue, carts and purchases for any number of users.
+The Tkinter App and the HTTP server (server.py) are both clients of ShopService, so the rules (validation,
+balance checks, error messages) live in one place.
+Logins are split in two (begin_login / finish_login) so the slow password check runs on the hashing pool while the
+caller's thread (the Tk main loop, the server's event loop) carries on.
+Cars with a stock count are reserved while they sit in a cart and taken out of stock when bought (see inventory.py).
+Every purchase is recorded in the order history (see orders.py).
+"""
+
+import math
+import time
+import traceback
+
+from database import Cart, CarDatabase, UserDatabase
+from inventory import Inventory
+from orders import OrderLedger
+from models import Admin, Car, User
+from passwords import LoginLimiter, PasswordHasher
+from storage import CarGone, ConflictError, OutOfStock, PickleBackend
+
+# Raised when a request can't be carried out. The message is meant for the user; title is what the GUI shows
+# on the error box.
+class ShopError(Exception):
+    def __init__(self, message, title="Error"):
+        super().__init__(message)
+        self.title = title
+
+# Raised instead of checking the password while a username is locked out after too many failed logins.
+class TooManyAttempts(ShopError):
+    pass
+
+# Builds a Car from form or file input (text fields, price as text or number) with the rules of the car form:
+# everything but the photo is required and the price must be a finite number ("nan" and "inf" would break the
+# sorted price indexes).
+def car_from_fields(brand, model, price, description, photo):
+    if not brand or not model or price in ("", None) or not description:
+        raise ShopError("All fields must be filled!")
+    try:
+        price = float(price)
+    except (TypeError, ValueError):
+        raise ShopError("Price must be a number!")
+    if not math.isfinite(price):
+        raise ShopError("Price must be a finite number (not nan or inf)!")
+    return Car(brand, model, price, description, photo)
+
+# Reads the stock field of the car form: empty means the car's stock is not counted.
+def stock_from_field(stock):
+    if stock in ("", None):
+        return None
+    try:
+        stock = int(stock)
+    except (TypeError, ValueError):
+        raise ShopError("Stock must be a whole number (or empty)!")
+    if stock < 0:
+        raise ShopError("Stock can't be negative!")
+    return stock
+
+# Business logic of the shop, independent of how it is presented.
+class ShopService:
+    def __init__(self, backend=None, passwords=None, limiter=None, inventory=None, ledger=None):
+        self.backend = backend or PickleBackend()  # where the stores load from and save to
+        self.car_db = CarDatabase(self.backend)
+        self.user_db = UserDatabase(self.backend)
+        self.carts = {}  # username -> Cart, loaded on first use
+        self.passwords = passwords or PasswordHasher()  # hashing algorithm, cost and worker pool
+        self.limiter = limiter or LoginLimiter()  # failed logins per username
+        self.inventory = inventory or Inventory(self.backend)  # stock and cart reservations
+        self.ledger = ledger or OrderLedger()  # order history
+        self.unrecorded = []  # (username, items, time) of orders the ledger failed to write, oldest first
+
+    # Writes whatever the backend still holds in memory. Call it when the app or server shuts down.
+    def close(self):
+        self.record_orders()
+        self.backend.close()
+        self.passwords.close()
+        self.inventory.close()
+
+    # Accounts
+
+    # Starts checking a login on the password pool and returns a future for finish_login, which must then be called
+    # on this thread. Raises TooManyAttempts without checking anything while the username is locked out.
+    def begin_login(self, username, password, admin=False):
+        wait = self.limiter.wait_time((admin, username))
+        if wait:
+            raise TooManyAttempts(f"Too many failed attempts. Try again in {math.ceil(wait)} seconds.",
+                                  title="Login Failed")
+        if admin:
+            stored = Admin.admin_credentials.get(username)
+        else:
+            user = self.user_db.users.get(username)
+            stored = user.password if user else None
+        return self.passwords.check(stored, password)
+
+    # Completes a login once its future is done. Returns the user (None for the admin) or raises ShopError.
+    # A plaintext password or a hash with an outdated cost is replaced with a current hash.
+    def finish_login(self, username, future, admin=False):
+        matches, new_hash = future.result()
+        if not matches:
+            self.limiter.failed((admin, username))
+            raise ShopError("Invalid username or password", title="Login Failed")
+        self.limiter.succeeded((admin, username))
+        if admin:
+            return None
+        user = self.get_user(username)
+        if new_hash:
+            try:
+                self.user_db.update(username, User(username, new_hash, user.balance, user.version))
+                user = self.get_user(username)
+            except ConflictError:
+                pass  # changed meanwhile; the password is rehashed at the next login
+        return user
+
+    # Logs in on the calling thread, waiting for the password check.
+    def login(self, username, password):
+        return self.finish_login(username, self.begin_login(username, password))
+
+    def admin_login(self, username, password):
+        self.finish_login(username, self.begin_login(username, password, admin=True), admin=True)
+
+    # Raises ShopError unless an account can be created with this username and password.
+    def check_new_account(self, username, password):
+        if username in self.user_db.users:
+            raise ShopError("User already exists!")
+        if not username or not password:
+            raise ShopError("Username and Password must not be empty!")
+
+    # Starts hashing a password on the password pool. Pass the future's result to create_account or save_user as
+    # password_hash, so the calling thread (the Tk main loop, the server's event loop) never waits for the hash.
+    def begin_hash(self, password):
+        return self.passwords.pool.submit(self.passwords.hash, password)
+
+    # Stores the password as a salted hash; password_hash may be given if it was already hashed (on the pool).
+    def create_account(self, username, password, password_hash=None):
+        self.check_new_account(username, password)
+        user = User(username, password_hash or self.passwords.hash(password))
+        try:
+            self.user_db.add(user)
+        except ConflictError:  # taken by another process in the meantime
+            raise ShopError("User already exists!")
+        return user
+
+    def get_user(self, username):
+        user = self.user_db.users.get(username)
+        if user is None:
+            raise ShopError(f"There is no user called {username}.")
+        return user
+
+    def all_users(self):
+        return self.user_db.users.values()
+
+    def search_users(self, **query):
+        return self.user_db.search(**query)
+
+    # Raises ShopError unless the user form (see save_user) can be saved. Returns the balance as a number.
+    def check_user_form(self, action, username, password, balance):
+        if not username or not password or balance in ("", None):
+            raise ShopError("All fields must be filled!")
+        try:
+            balance = float(balance)
+        except ValueError:
+            raise ShopError("Balance must be a valid number!")
+        if not math.isfinite(balance):
+            raise ShopError("Balance must be a finite number (not nan or inf)!")
+        if action == "Add" and username in self.user_db.users:
+            raise ShopError("User already exists!")
+        return balance
+
+    # Whether saving the user form has to hash the password: the form shows the stored hash until it is changed.
+    # username is the user the form was opened for (None when adding one), even if the form renames them.
+    def password_changed(self, username, password):
+        stored = self.user_db.users.get(username)
+        return not (stored and password == stored.password)
+
+    # Adds (action "Add") or replaces (action "Update") a user from form input; balance may be text.
+    # version is the version of the user shown in the form, so changes made since then are not overwritten.
+    # password_hash may be given if a changed password was already hashed (see begin_hash).
+    # original is the user the form was opened for when the form changes their username; their stored password
+    # hash is kept as it is.
+    def save_user(self, action, username, password, balance, version=None, password_hash=None, original=None):
+        balance = self.check_user_form(action, username, password, balance)
+        stored = self.user_db.users.get(username)
+        if action == "Add":
+            version = 0
+        elif version is None:
+            version = stored.version if stored else 0
+        if password_hash:
+            password = password_hash
+        elif self.password_changed(username if original is None else original, password):
+            password = self.passwords.hash(password)
+        user = User(username, password, balance, version)
+        try:
+            if action == "Add":
+                self.user_db.add(user)
+            else:
+                self.user_db.update(username, user)
+        except ConflictError:
+            if action == "Add":
+                raise ShopError("User already exists!")
+            raise ShopError("This user was changed somewhere else in the meantime. Open it again to see the changes.")
+        return user
+
+    def delete_user(self, username):
+        self.user_db.delete(username)
+        self.carts.pop(username, None)
+
+    # Catalogue
+
+    # See CarIndex.search for the query parameters. Returns (number of matches, cars on the page).
+    def search_cars(self, **query):
+        return self.car_db.search(**query)
+
+    def brands(self):
+        return self.car_db.brands()
+
+    # Picks up what other processes (other kiosks, the server) have changed in the shared stores since the last poll.
+    # Returns the names of the stores that changed: "cars", "users", "carts" and/or "stock".
+    def poll(self):
+        return self.backend.poll()
+
+    # Catalogue and user statistics for the admin Stats panel, as (CarStats, UserStats).
+    def stats(self):
+        return self.car_db.stats(), self.user_db.stats()
+
+    def all_cars(self):
+        return self.car_db.cars.values()
+
+    def get_car(self, car_id):
+        car = self.car_db.cars.get(car_id)
+        if car is None:
+            raise ShopError("This car is no longer available.")
+        return car
+
+    # Adds a car from form input (or replaces car_id); every field is required and the price must be a number.
+    # stock is the stock field: empty stops counting the car's stock, None leaves it as it is.
+    def save_car(self, brand, model, price, description, photo, car_id=None, stock=None):
+        car = car_from_fields(brand, model, price, description, photo)
+        count = stock_from_field(stock)
+        if car_id is None:
+            self.car_db.add(car)
+        elif self.car_db.update(car_id, car) is None:  # deleted, perhaps by an admin at another kiosk
+            raise ShopError("This car is no longer available.")
+        car_id = car.car_id if car_id is None else car_id
+        if stock is not None and count != self.inventory.stock(car_id):
+            self.backend.set_stock(car_id, count)
+        return car
+
+    def delete_car(self, car_id):
+        self.car_db.delete(car_id)
+        if self.inventory.stock(car_id) is not None:
+            self.backend.set_stock(car_id, None)
+
+    # Cars in stock (None if not counted) and how many of those the user could still add to their cart.
+    def stock(self, car_id):
+        return self.inventory.stock(car_id)
+
+    def available(self, car_id, username=None):
+        return self.inventory.available(car_id, username)
+
+    def out_of_stock(self, car_id, available):
+        car = self.car_db.cars.get(car_id)
+        name = f"the {car.brand} {car.model}" if car else f"car {car_id}"
+        if not available:
+            return ShopError(f"Sorry, {name} is sold out.", title="Out of Stock")
+        return ShopError(f"Sorry, only {available} of {name} left.", title="Out of Stock")
+
+    # Carts
+
+    def cart(self, username):
+        if username not in self.carts:
+            self.carts[username] = Cart(self.car_db, username)
+        return self.carts[username]
+
+    # Adds cars to the user's cart, reserving them if their stock is counted.
+    def add_to_cart(self, username, car_id, quantity=1):
+        car = self.get_car(car_id)
+        if not self.inventory.reserve(username, car_id, quantity):
+            available = self.inventory.available(car_id)
+            raise self.out_of_stock(car_id, available)
+        cart = self.cart(username)
+        try:
+            cart.load_cart()  # the cart may have been changed (or bought) from another process
+            cart.add(car_id, quantity)
+            cart.save_cart()
+        except BaseException:
+            self.inventory.release(username, car_id, quantity)
+            raise
+        return car
+
+    def remove_from_cart(self, username, car_id, quantity=1):
+        cart = self.cart(username)
+        cart.load_cart()
+        cart.remove(car_id, quantity)
+        cart.save_cart()
+        self.inventory.release(username, car_id, quantity)
+
+    # Pays for everything in the user's cart and empties it. Returns the user with the new balance.
+    # The backend checks the balance, debits it and clears the stored cart in one transaction, so concurrent
+    # purchases (from other threads or processes) can neither spend the same money twice nor lose a debit.
+    # The same transaction takes the cars out of stock; cars reserved by other users can't be bought.
+    def purchase(self, username):
+        cart = self.cart(username)
+        cart.load_cart()
+        short = self.inventory.check_cart(username, cart.lines)
+        if short:
+            raise self.out_of_stock(*short)
+        try:
+            result = self.backend.purchase(username)
+        except KeyError:
+            raise ShopError(f"There is no user called {username}.")
+        except OutOfStock as e:
+            raise self.out_of_stock(e.car_id, e.left)
+        except CarGone as e:
+            if cart.lines.get(e.car_id):
+                self.remove_from_cart(username, e.car_id, cart.lines[e.car_id])
+            raise ShopError(f"Car {e.car_id} is no longer for sale and was taken out of your cart. "
+                            "Please check your cart and buy again.", title="Cart Changed")
+        if result is None:
+            raise ShopError("You do not have enough balance to complete the purchase.", title="Insufficient Funds")
+        self.inventory.release_all(username)
+        self.user_db.balance_changed(result[0])
+        if result[2]:
+            self.unrecorded.append((username, result[2], time.time()))
+            self.record_orders()
+        cart.load_cart()
+        return result[0]
+
+    # Writes the orders waiting for the ledger. The money has already been taken when an order gets here, so a
+    # failure to write it doesn't fail the purchase: it is reported and the order is tried again with the next
+    # purchase (or on close), keeping its time.
+    def record_orders(self):
+        while self.unrecorded:
+            username, items, when = self.unrecorded[0]
+            try:
+                self.ledger.record(username, items, when)
+            except Exception:
+                traceback.print_exc()
+                return
+            del self.unrecorded[0]
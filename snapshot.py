@@ -0,0 +1,269 @@
+"""
+Binary snapshot of the car catalogue, read through mmap: opening it only reads a fixed-size header, whatever the
+size of the catalogue, and a car is decoded from the mapped file when it is looked at.
+
+Layout (little-endian), see `header` and `record` below:
+
+    header        magic b"CARSNAP1", seq, next_id, number of cars and the offsets of the sections
+    heap          UTF-8 descriptions, back to back
+    records       one fixed-width record per car, in ID order: ID, price, brand/model/photo name numbers,
+                  length and heap offset of the description
+    name offsets  (names + 1) offsets into the name bytes
+    name bytes    UTF-8 brand, model and photo names, each stored once
+
+Unlike a pickle, reading a snapshot never runs code from the file.
+Run `python snapshot.py convert` to turn car_database.pickle (and its journal) into car_database.snap; the pickle
+backend uses the snapshot from then on and writes new ones when it compacts its journal.
+"""
+
+import mmap
+import os
+import struct
+import sys
+from collections.abc import Mapping, MutableMapping
+
+from models import Car
+
+magic = b"CARSNAP1"
+# magic, seq, next_id, cars, heap offset, records offset, names, name offsets offset, unused heap bytes
+header = struct.Struct("<8sQQQQQQQQ")
+record = struct.Struct("<qdIIIIQ")  # car ID, price, brand, model, photo, description length, description offset
+car_id_field = struct.Struct("<q")
+name_bounds = struct.Struct("<QQ")
+
+# A snapshot file as a read-only mapping of car ID -> Car. Cars are found by binary search over the ID-ordered
+# records; names are decoded once and cached, descriptions every time (they are seldom read twice).
+class MappedCars(Mapping):
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        (tag, self.seq, self.next_id, self.count, self.heap_offset, self.records_offset, self.name_count,
+         self.names_offset, self.garbage) = header.unpack_from(self.map, 0)
+        if tag != magic:
+            self.close()
+            raise ValueError(f"{path} is not a car snapshot")
+        self.name_bytes_offset = self.names_offset + 8 * (self.name_count + 1)
+        self.names = {}  # name number -> name, decoded on first use
+
+    def name(self, number):
+        name = self.names.get(number)
+        if name is None:
+            start, end = name_bounds.unpack_from(self.map, self.names_offset + 8 * number)
+            name = self.names[number] = self.map[self.name_bytes_offset + start:self.name_bytes_offset + end].decode()
+        return name
+
+    def all_names(self):
+        return [self.name(number) for number in range(self.name_count)]
+
+    def id_at(self, index):
+        return car_id_field.unpack_from(self.map, self.records_offset + index * record.size)[0]
+
+    # Position of the car's record, or -1. Without deletions car N is record N - 1, which is tried first.
+    def index_of(self, car_id):
+        if 0 < car_id <= self.count and self.id_at(car_id - 1) == car_id:
+            return car_id - 1
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.id_at(middle) < car_id:
+                low = middle + 1
+            else:
+                high = middle
+        return low if low < self.count and self.id_at(low) == car_id else -1
+
+    def car_at(self, index):
+        car_id, price, brand, model, photo, length, offset = record.unpack_from(
+            self.map, self.records_offset + index * record.size)
+        start = self.heap_offset + offset
+        return Car(self.name(brand), self.name(model), price, self.map[start:start + length].decode(),
+                   self.name(photo), car_id)
+
+    def __getitem__(self, car_id):
+        index = self.index_of(car_id)
+        if index < 0:
+            raise KeyError(car_id)
+        return self.car_at(index)
+
+    def __contains__(self, car_id):
+        return self.index_of(car_id) >= 0
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield self.id_at(index)
+
+    def __len__(self):
+        return self.count
+
+    def values(self):
+        for index in range(self.count):
+            yield self.car_at(index)
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+# The cars of a snapshot with the changes made since it was written laid over them; this is what the pickle
+# backend edits (and replays its journal into). IDs only grow, so cars added since have IDs >= base.next_id.
+class SnapshotCars(MutableMapping):
+    def __init__(self, base):
+        self.reset(base)
+
+    # Switches to a new snapshot that includes every change so far.
+    def reset(self, base):
+        self.base = base
+        self.changed = {}  # car ID -> Car added or updated since the snapshot
+        self.deleted = set()  # IDs of snapshot cars deleted since
+
+    def in_base(self, car_id):
+        return car_id < self.base.next_id and car_id not in self.deleted and self.base.index_of(car_id) >= 0
+
+    def __getitem__(self, car_id):
+        car = self.changed.get(car_id)
+        if car is not None:
+            return car
+        if car_id in self.deleted or car_id >= self.base.next_id:
+            raise KeyError(car_id)
+        return self.base[car_id]
+
+    def __contains__(self, car_id):
+        return car_id in self.changed or self.in_base(car_id)
+
+    def __setitem__(self, car_id, car):
+        self.changed[car_id] = Car(**car.as_dict())  # a copy, like CarColumns keeps
+
+    def __delitem__(self, car_id):
+        in_base = self.in_base(car_id)
+        if self.changed.pop(car_id, None) is None and not in_base:
+            raise KeyError(car_id)
+        if in_base:
+            self.deleted.add(car_id)
+
+    def __iter__(self):
+        for car_id in self.base:
+            if car_id not in self.deleted:
+                yield car_id
+        for car_id in self.changed:
+            if car_id >= self.base.next_id:
+                yield car_id
+
+    def __len__(self):
+        return self.base.count - len(self.deleted) + sum(car_id >= self.base.next_id for car_id in self.changed)
+
+    def values(self):
+        for index in range(self.base.count):
+            car_id = self.base.id_at(index)
+            if car_id not in self.deleted:
+                yield self.changed.get(car_id) or self.base.car_at(index)
+        for car_id, car in self.changed.items():
+            if car_id >= self.base.next_id:
+                yield car
+
+    # The cars at positions offset to offset + count - 1 in catalogue (car ID) order, like CarColumns.page. The first
+    # record of the page is found by stepping over the records of deleted cars before it, not by reading the records.
+    def page(self, offset, count):
+        index = offset
+        for deleted in sorted(map(self.base.index_of, self.deleted)):
+            if deleted > index:
+                break
+            index += 1
+        cars = []
+        while index < self.base.count and len(cars) < count:
+            car_id = self.base.id_at(index)
+            if car_id not in self.deleted:
+                cars.append(self.changed.get(car_id) or self.base.car_at(index))
+            index += 1
+        if len(cars) < count:
+            added = [car for car_id, car in self.changed.items() if car_id >= self.base.next_id]
+            start = max(0, offset - (self.base.count - len(self.deleted)))
+            cars += added[start:start + count - len(cars)]
+        return cars
+
+# Writes a snapshot of `cars` (any car ID -> Car mapping) to path and fsyncs it. For a SnapshotCars the unchanged
+# part of its snapshot (descriptions and records) is copied byte for byte instead of being decoded and encoded again,
+# until the space held by deleted or replaced descriptions reaches half of the heap.
+def write_snapshot(path, cars, seq, next_id):
+    incremental = isinstance(cars, SnapshotCars)
+    base = cars.base if incremental else None
+    if incremental and base.garbage * 2 > base.records_offset - base.heap_offset:
+        incremental = False
+    names = base.all_names() if incremental else []
+    numbers = {name: number for number, name in enumerate(names)}
+
+    def number(name):
+        found = numbers.get(name)
+        if found is None:
+            found = numbers[name] = len(names)
+            names.append(name)
+        return found
+
+    records = bytearray()
+    garbage = 0
+    with open(path, 'wb') as f:
+        f.write(bytes(header.size))  # filled in at the end
+        heap_size = 0
+
+        def add(car):
+            nonlocal heap_size
+            description = car.description.encode()
+            f.write(description)
+            records.extend(record.pack(car.car_id, car.price, number(car.brand), number(car.model),
+                                       number(car.photo), len(description), heap_size))
+            heap_size += len(description)
+
+        if incremental:
+            f.write(base.map[base.heap_offset:base.records_offset])
+            heap_size = base.records_offset - base.heap_offset
+            garbage = base.garbage
+            touched = sorted(base.index_of(car_id) for car_id in {*cars.deleted, *cars.changed}
+                             if car_id < base.next_id)
+            start = 0
+            for index in touched + [base.count]:
+                records.extend(base.map[base.records_offset + start * record.size:
+                                        base.records_offset + index * record.size])
+                if index == base.count:
+                    break
+                garbage += record.unpack_from(base.map, base.records_offset + index * record.size)[5]
+                car = cars.changed.get(base.id_at(index))
+                if car is not None:
+                    add(car)
+                start = index + 1
+            for car_id, car in cars.changed.items():
+                if car_id >= base.next_id:
+                    add(car)
+        else:
+            for car_id in sorted(cars):
+                add(cars[car_id])
+
+        records_offset = header.size + heap_size
+        f.write(records)
+        names_offset = records_offset + len(records)
+        encoded = [name.encode() for name in names]
+        offsets = [0]
+        for name in encoded:
+            offsets.append(offsets[-1] + len(name))
+        f.write(struct.pack(f"<{len(offsets)}Q", *offsets))
+        f.write(b"".join(encoded))
+        f.seek(0)
+        f.write(header.pack(magic, seq, next_id, len(records) // record.size, header.size, records_offset,
+                            len(names), names_offset, garbage))
+        f.flush()
+        os.fsync(f.fileno())
+
+if __name__ == "__main__":
+    from storage import PickleBackend, sync_directory
+
+    if sys.argv[1:] != ["convert"]:
+        sys.exit("usage: python snapshot.py convert")
+    backend = PickleBackend()
+    if os.path.exists(backend.snapshot_path):
+        sys.exit(f"{backend.snapshot_path} already exists.")
+    with backend.lock:  # running copies of the app wait, then read the snapshot (its new generation tells them to)
+        cars = backend.load_cars()  # car_database.pickle (any format) plus the journal
+        write_snapshot(backend.snapshot_path + '.tmp', cars, backend.seq, backend.next_id)
+        os.replace(backend.snapshot_path + '.tmp', backend.snapshot_path)
+        if os.path.exists('car_database.pickle'):
+            os.replace('car_database.pickle', 'car_database.pickle.bak')  # no longer read; kept just in case
+        sync_directory(os.getcwd())
+        backend.journal.clear()  # everything in it is in the snapshot now
+        backend.generations.bump("snapshot")
+    print(f"Wrote {len(cars)} cars to {backend.snapshot_path} (the old file is car_database.pickle.bak).")
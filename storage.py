@@ -0,0 +1,1186 @@
+"""
+Storage backends for the car shop. The stores in database.py keep the same interface and hand every load
+and change to a backend:
+
+- PickleBackend (the default) keeps everything in memory and persists it to the .pickle files, with car
+  changes appended to a journal so a single edit does not rewrite the whole car database.
+- SqliteBackend keeps cars, users and carts in one SQLite file and only reads the rows that are asked for,
+  so memory use and startup time do not grow with the size of the catalogue.
+
+The pickle backend saves carts and car changes write-behind: a change marks the store dirty and a background thread
+writes it shortly after (see WriteBehind), so a click never waits for the disk. Call close() before exiting.
+
+The pickle backend never overwrites a file in place: every save goes to a temp file that is fsynced and then
+renamed over the old one, so a crash leaves either the old or the new file, never a partial one.
+
+Both backends buy a user's cart as one transaction (balance check, debit and emptying the cart), so several
+processes can share the same files: the pickle backend takes a lock file and the SQLite backend a write transaction.
+
+Run `python storage.py migrate [carapp.db]` to import the existing .pickle files into a new SQLite database.
+Once car_database.pickle has been converted to car_database.snap (see snapshot.py) the pickle backend maps that
+instead, so startup no longer grows with the size of the catalogue.
+"""
+
+import contextlib
+import os
+import pickle
+import re
+import sqlite3
+import struct
+import sys
+import threading
+import time
+import traceback
+import zlib
+from collections.abc import Mapping
+
+from models import Car, CarColumns, User
+from profiling import metrics
+from snapshot import MappedCars, SnapshotCars, write_snapshot
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+#default car data if no database exists.
+def default_cars():
+    return [
+        Car("Mercedes-Benz", "S500", 60000, "Luxury Sedan", "mers_s500.png"),
+        Car("Mercedes-Benz", "G 63 AMG", 63000, "Brutal", "mers_gwagon.png"),
+        Car("Volkswagen", "ID.6", 3500, "Compact Car", "vw.png"),
+        Car("Porsche", "Panamera 4S", 22000, "Luxury Sports Car", "pors.png")
+    ]
+
+# Lowercase words of a text, as used by the search indexes.
+def tokenize(text):
+    return re.findall(r"\w+", text.lower())
+
+# Reads pickles written while Car and User still lived in "Main project.py" (saved as module __main__).
+class LegacyUnpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        if module == "__main__":
+            module = "models"
+        return super().find_class(module, name)
+
+def load_pickle(path):
+    with open(path, 'rb') as f:
+        return LegacyUnpickler(f).load()
+
+# Saves obj to path so that the file is always either the complete old or the complete new pickle: the data is
+# written to path.tmp and fsynced, then renamed over path (os.replace is atomic), then the rename is fsynced.
+@metrics.timed("store.write_file")
+def dump_atomic(obj, path):
+    tmp_path = path + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+    sync_directory(os.path.dirname(os.path.abspath(path)))
+
+# Makes renames in the directory durable. Only possible (and needed) where directories can be opened (POSIX).
+def sync_directory(directory):
+    if hasattr(os, 'O_DIRECTORY'):
+        fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+# Saves pickles with dump_atomic. Inside `with writer.group():` saves are held back and each file is written once,
+# with the latest object, when the outermost group ends (group commit): a run of changes costs one fsync per file.
+class AtomicWriter:
+    def __init__(self):
+        self.depth = 0
+        self.pending = {}  # path -> object to save at the end of the group
+
+    # Saves now, or at the end of the current group. now=True saves immediately even inside a group.
+    def dump(self, obj, path, now=False):
+        if self.depth and not now:
+            self.pending[path] = obj
+        else:
+            self.pending.pop(path, None)
+            dump_atomic(obj, path)
+
+    @contextlib.contextmanager
+    def group(self):
+        self.depth += 1
+        try:
+            yield
+        finally:
+            self.depth -= 1
+            if self.depth == 0:
+                pending, self.pending = self.pending, {}
+                for path, obj in pending.items():
+                    dump_atomic(obj, path)
+
+# Write-behind persistence: stores mark themselves dirty with the function that saves them, and a background thread
+# calls it `latency` seconds after the first change. Changes made in the meantime go out with the same write, so a
+# burst of clicks costs one save, and the thread making the change never waits for the disk.
+# flush() saves everything that is waiting (call it on shutdown); latency=0 saves every change right away.
+class WriteBehind:
+    def __init__(self, latency=0.25):
+        self.latency = latency
+        self.dirty = {}  # save functions waiting to run, in the order they were first marked
+        self.deadline = None  # when the waiting saves are due
+        self.condition = threading.Condition()
+        self.flushing = threading.Lock()  # one flush at a time
+        self.thread = None
+
+    def mark_dirty(self, save):
+        if self.latency <= 0:
+            with self.flushing:
+                save()
+        else:
+            self.schedule(save)
+
+    def schedule(self, save):
+        with self.condition:
+            self.dirty[save] = None
+            if self.deadline is None:
+                self.deadline = time.monotonic() + self.latency
+                self.condition.notify()
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="write-behind", daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.deadline is None or (remaining := self.deadline - time.monotonic()) > 0:
+                    self.condition.wait(None if self.deadline is None else remaining)
+            self.flush()
+
+    def flush(self):
+        with self.flushing:
+            with self.condition:
+                saves, self.dirty, self.deadline = list(self.dirty), {}, None
+            if not saves:
+                return
+            with metrics.timer("store.write_behind"):
+                for save in saves:
+                    try:
+                        save()
+                    except Exception:
+                        traceback.print_exc()
+                        self.schedule(save)  # try again after the next interval
+
+# Raised when a user record is saved from a version that another save has replaced in the meantime
+# (or a new user is added under a name that is taken).
+class ConflictError(Exception):
+    pass
+
+# Raised by purchase() when a cart holds more of a car than are left in stock; nothing is bought.
+class OutOfStock(Exception):
+    def __init__(self, car_id, left):
+        super().__init__(f"only {left} of car {car_id} left")
+        self.car_id = car_id
+        self.left = left
+
+# Raised by purchase() when a cart holds a car that has been deleted from the catalogue; nothing is bought.
+class CarGone(Exception):
+    def __init__(self, car_id):
+        super().__init__(f"car {car_id} is no longer for sale")
+        self.car_id = car_id
+
+# Refuses to save `user` unless it is based on the stored record (a user that was never saved: no stored record).
+def check_version(stored, user):
+    if (stored.version if stored else 0) != user.version:
+        raise ConflictError(user.username)
+
+# Exclusive lock shared by every process using the same data files (fcntl on POSIX, msvcrt on Windows).
+# The thread holding it can take it again, so locked methods can call each other.
+class FileLock:
+    def __init__(self, path):
+        self.path = path
+        self.mutex = threading.RLock()
+        self.depth = 0
+        self.file = None
+
+    def __enter__(self):
+        self.mutex.acquire()
+        if self.depth == 0:
+            self.file = open(self.path, 'a+b')
+            if fcntl:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+            else:
+                self.file.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(self.file.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        pass  # LK_LOCK gives up after 10 seconds; keep waiting
+        self.depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self.depth -= 1
+        if self.depth == 0:
+            if fcntl:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+            else:
+                self.file.seek(0)
+                msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+            self.file.close()
+            self.file = None
+        self.mutex.release()
+
+# Append-only log of changes, so a single edit writes a small record instead of the whole database file.
+# Several processes may append to the same journal (under carapp.lock). Each remembers how far it has read, so
+# read_new() only returns what the others have appended since.
+class Journal:
+    header = struct.Struct("<II")  # length and crc32 of each record
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0  # records appended since the last compaction
+        self.offset = 0  # end of the records this process has read or written
+        self.grouped = 0  # > 0 inside group(): appends are fsynced together at the end
+        self.unsynced = False
+
+    # Appends a record and fsyncs it, so it survives a crash once append returns. With sync=False (or inside
+    # group()) the fsync is left to sync(); the record is still visible to other processes straight away.
+    def append(self, record, sync=True):
+        data = pickle.dumps(record)
+        with open(self.path, 'ab') as f:
+            f.write(self.header.pack(len(data), zlib.crc32(data)) + data)
+            if self.grouped or not sync:
+                self.unsynced = True
+            else:
+                f.flush()
+                os.fsync(f.fileno())
+            self.offset = f.tell()
+        self.count += 1
+
+    # Fsyncs the records appended without an fsync of their own.
+    def sync(self):
+        if self.unsynced:
+            self.unsynced = False
+            with open(self.path, 'ab') as f:
+                os.fsync(f.fileno())
+
+    # Group commit: the records appended inside the block share one fsync at the end.
+    @contextlib.contextmanager
+    def group(self):
+        self.grouped += 1
+        try:
+            yield
+        finally:
+            self.grouped -= 1
+            if not self.grouped:
+                self.sync()
+
+    # Reads back every complete record. A torn record at the end (crash in the middle of an append) is cut off.
+    def replay(self):
+        records = self.read_from(0)
+        self.count = len(records)
+        return records
+
+    # The records appended by other processes since this one last read or wrote the journal.
+    def read_new(self):
+        records = self.read_from(self.offset)
+        self.count += len(records)
+        return records
+
+    # Reads the complete records from byte `start` on and cuts off a torn one at the end. When processes share the
+    # journal this is called with their lock held, so a record that is still being appended can't be mistaken for
+    # a torn one.
+    def read_from(self, start):
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            self.offset = 0
+            return []
+        with f:
+            if start > os.fstat(f.fileno()).st_size:
+                start = 0  # emptied and written again since; callers skip the records they have already applied
+            f.seek(start)
+            data = f.read()
+        records = []
+        offset = 0
+        while offset + self.header.size <= len(data):
+            length, crc = self.header.unpack_from(data, offset)
+            begin = offset + self.header.size
+            payload = data[begin:begin + length]
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                break
+            records.append(pickle.loads(payload))
+            offset = begin + length
+        if offset < len(data):
+            with open(self.path, 'r+b') as f:
+                f.truncate(start + offset)
+        self.offset = start + offset
+        return records
+
+    def clear(self):
+        with open(self.path, 'wb') as f:
+            os.fsync(f.fileno())
+        self.count = 0
+        self.offset = 0
+        self.unsynced = False
+
+# Change counters shared by the processes using the same files, one per store, kept in carapp.generation.
+# A process bumps a store's counter (under carapp.lock) whenever it changes the store; "snapshot" counts the times
+# the car journal was compacted into a new car file. The other processes poll the file and reload only the stores
+# whose counter moved. A poll is a single stat() while the file's mtime stays the same.
+class Generations:
+    stores = ("cars", "snapshot", "users", "carts", "stock")
+    layout = struct.Struct("<5Q")
+
+    def __init__(self, path):
+        self.path = path
+        self.seen = self.read()  # counters as this process last knew them
+        self.stamp = None  # (mtime, size, inode) of the file when it was last read by changed()
+        self.mutex = threading.Lock()
+
+    def read(self):
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read(self.layout.size)
+        except FileNotFoundError:
+            data = b""
+        if len(data) < self.layout.size:
+            return dict.fromkeys(self.stores, 0)
+        return dict(zip(self.stores, self.layout.unpack(data)))
+
+    # Counts a change of each of the stores and returns the new counters. Called with the lock held.
+    def bump(self, *stores):
+        counters = self.read()
+        with self.mutex:
+            for store in stores:
+                if self.seen[store] == counters[store]:
+                    self.seen[store] += 1  # this process had seen every earlier change, so there is nothing to report
+                counters[store] += 1
+        with open(self.path, 'r+b' if os.path.exists(self.path) else 'wb') as f:
+            f.write(self.layout.pack(*(counters[store] for store in self.stores)))
+        return counters
+
+    # Names of the stores other processes have changed since the last call.
+    def changed(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return set()
+        stamp = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        # the mtime may not move between two writes in quick succession, so a recent one is always read again
+        if stamp == self.stamp and time.time_ns() - stat.st_mtime_ns > 2_000_000_000:
+            return set()
+        self.stamp = stamp
+        counters = self.read()
+        with self.mutex:
+            changed = {store for store in self.stores if counters[store] != self.seen[store]}
+            self.seen = counters
+        return changed
+
+# Keeps every store in memory and saves it to the .pickle files next to the script.
+# Car changes go to a journal and the full car database is only rewritten when the journal gets long.
+# Every change is made under carapp.lock after catching up with what other processes changed (cars from the journal
+# records they appended, users and carts by re-reading the files), so no process overwrites another's changes, and
+# counted in carapp.generation, which poll() checks to pick up other processes' changes without waiting for one.
+# Every file is saved with dump_atomic; batch() turns a run of changes into one group commit.
+# Carts are written behind and car changes fsynced behind (users and purchases are saved right away, as they are
+# checked against what is on disk): a WriteBehind thread does it flush_latency seconds later.
+class PickleBackend:
+    compact_every = 500  # number of journal records before they are folded into car_database.pickle
+    pending_path = 'purchase.pending'  # a purchase that is being written to the user and cart files
+    snapshot_path = 'car_database.snap'  # used instead of car_database.pickle once it exists
+    flush_latency = 0.25  # seconds a change may wait before it is written; 0 writes every change at once
+
+    def __init__(self, flush_latency=None):
+        self.cars = CarColumns()
+        self.users = {}
+        self.carts = None  # username -> {car ID: quantity}, loaded on first use
+        self.stock = None  # car ID -> cars in stock, for the cars whose stock is counted; loaded on first use
+        self.seq = 0  # sequence number of the last car change applied
+        self.next_id = 1  # ID given to the next car added
+        self.journal = Journal('car_database.journal')
+        self.lock = FileLock('carapp.lock')
+        self.generations = Generations('carapp.generation')
+        self.car_generation = 0  # "snapshot" generation of the car file the cars were read from
+        self.writer = AtomicWriter()
+        self.batching = 0  # > 0 inside batch()
+        self.flusher = WriteBehind(PickleBackend.flush_latency if flush_latency is None else flush_latency)
+        self.dirty_carts = {}  # username -> cart lines not written to cart.pickle yet
+        self.dirty_lock = threading.Lock()
+        self.on_car_change = None  # called as (old car, new car) for each car another process changed (None: no car)
+        self.on_cars_reload = None  # called with the new cars after they all had to be read again
+        self.on_user_change = None  # called as (username, user or None) for each user another process changed
+
+    # Loads the car database from a file, or initializes with default cars if the file doesn't exist.
+    # Journal records newer than the snapshot are replayed on top of it. Cars are kept column by column
+    # (see models.CarColumns) and keyed by their ID. A car_database.snap is mapped instead and only decoded on use.
+    def load_cars(self):
+        with self.lock:  # another process may be appending to the journal or replacing the car file
+            self.car_generation = self.generations.read()["snapshot"]
+            return self.read_cars()
+
+    def read_cars(self):
+        if os.path.exists(self.snapshot_path):
+            base = MappedCars(self.snapshot_path)
+            self.cars = SnapshotCars(base)
+            self.seq, self.next_id = base.seq, base.next_id
+            for seq, op, *args in self.journal.replay():
+                if seq > self.seq:
+                    self.apply_change(op, *args)
+                    self.seq = seq
+            return self.cars
+        next_id = None
+        try:
+            car_data = load_pickle('car_database.pickle')
+            if isinstance(car_data, dict):
+                self.seq = car_data["seq"]
+                next_id = car_data.get("next_id")
+                car_data = car_data["cars"]
+            if isinstance(car_data, CarColumns):
+                cars = car_data
+            else:
+                cars = [Car(**car) if isinstance(car, dict) else car for car in car_data]
+        except FileNotFoundError:
+            cars = default_cars()
+        records = [record for record in self.journal.replay() if record[0] > self.seq]
+
+        if next_id is None:
+            # saved before cars had IDs: the journal addresses cars by list position.
+            # Replay it that way, number the cars and save them in the new format.
+            for seq, op, *args in records:
+                if op == "add":
+                    cars.append(Car(**args[0]))
+                elif op == "update":
+                    cars[args[0]] = Car(**args[1])
+                elif op == "delete":
+                    del cars[args[0]]
+                self.seq = seq
+            for car_id, car in enumerate(cars, 1):
+                car.car_id = car_id
+            self.cars = CarColumns(cars)
+            self.next_id = len(cars) + 1
+            self.save_cars()
+        else:
+            self.cars = cars if isinstance(cars, CarColumns) else CarColumns(cars)
+            self.next_id = next_id
+            for seq, op, *args in records:
+                self.apply_change(op, *args)
+                self.seq = seq
+        return self.cars
+
+    # Gives the car the next free ID and stores it.
+    def add_car(self, car):
+        with self.lock:
+            self.sync_cars()  # the next free ID may have been taken by another process
+            car.car_id = self.next_id
+            self.next_id += 1
+            self.cars[car.car_id] = car
+            self.log_change("add", car.as_dict())
+
+    # Adds many cars as a single journal record that is written and fsynced before returning (one commit).
+    # The journal is not compacted here; call save_cars() once the bulk load is done.
+    def add_cars(self, cars):
+        with self.lock:
+            self.sync_cars()
+            for car in cars:
+                car.car_id = self.next_id
+                self.next_id += 1
+                self.cars[car.car_id] = car
+            self.seq += 1
+            self.journal.append((self.seq, "add") + tuple(car.as_dict() for car in cars))
+            self.generations.bump("cars")
+
+    # Replaces a car. Returns the car it replaced, or None (and changes nothing) if there is no such car (any more).
+    def update_car(self, car_id, car):
+        with self.lock:
+            self.sync_cars()
+            old_car = self.cars.get(car_id)
+            if old_car is None:
+                return None
+            car.car_id = car_id
+            self.cars[car_id] = car
+            self.log_change("update", car.as_dict())
+            return old_car
+
+    # Deletes a car and returns it (None if there is no such car).
+    def delete_car(self, car_id):
+        with self.lock:
+            self.sync_cars()
+            old_car = self.cars.get(car_id)
+            if old_car is not None:
+                del self.cars[car_id]
+                self.log_change("delete", car_id)
+            return old_car
+
+    # Appends a change to the journal, where other processes see it at once, and leaves the fsync to the write-behind
+    # thread. Compacts the journal into a new car file once it has grown long enough. Called with the lock held.
+    def log_change(self, op, *args):
+        self.seq += 1
+        self.journal.append((self.seq, op) + args, sync=False)
+        self.generations.bump("cars")
+        if self.journal.count >= PickleBackend.compact_every:
+            self.save_cars()
+        elif not self.batching:  # a batch's journal group fsyncs at the end
+            self.flusher.mark_dirty(self.flush_journal)
+
+    # Fsyncs the car changes appended to the journal since the last fsync.
+    def flush_journal(self):
+        self.journal.sync()
+
+    # Catches up with the car changes other processes have made: the journal records they appended are applied one
+    # by one and passed on to on_car_change. Only when another process has compacted the journal into a new car file
+    # are all the cars read again (and handed to on_cars_reload). Called with the lock held.
+    def sync_cars(self):
+        if self.generations.read()["snapshot"] != self.car_generation:
+            old_cars = self.cars
+            self.load_cars()
+            if self.on_cars_reload:
+                self.on_cars_reload(self.cars)
+            if isinstance(old_cars, SnapshotCars):
+                old_cars.base.close()
+            return
+        for seq, op, *args in self.journal.read_new():
+            if seq <= self.seq:
+                continue  # already applied
+            car_ids = [args[0]] if op == "delete" else [fields["car_id"] for fields in args]
+            old_cars = [self.cars.get(car_id) for car_id in car_ids]
+            self.apply_change(op, *args)
+            self.seq = seq
+            if self.on_car_change:
+                for car_id, old_car in zip(car_ids, old_cars):
+                    new_car = self.cars.get(car_id)
+                    if old_car or new_car:
+                        self.on_car_change(old_car, new_car)
+
+    # Applies one journal record to the loaded cars. An "add" record may hold several cars (add_cars).
+    def apply_change(self, op, *args):
+        if op in ("add", "update"):
+            for fields in args:
+                car = Car(**fields)
+                self.cars[car.car_id] = car
+                self.next_id = max(self.next_id, car.car_id + 1)
+        elif op == "delete":
+            self.cars.pop(args[0], None)
+
+    #Saves the whole car database to a file and empties the journal. The new generation tells other processes to
+    # read the new file.
+    def save_cars(self):
+        with self.lock:
+            self.sync_cars()
+            if isinstance(self.cars, SnapshotCars):
+                self.save_snapshot()
+            else:
+                self.writer.dump({"seq": self.seq, "next_id": self.next_id, "cars": self.cars},
+                                 'car_database.pickle', now=True)
+            self.journal.clear()
+            self.car_generation = self.generations.bump("snapshot")["snapshot"]
+
+    # Writes a new car_database.snap (atomically, like dump_atomic) and maps it in place of the old one. The old
+    # map is closed before the rename, as Windows cannot replace a file that is mapped.
+    def save_snapshot(self):
+        tmp_path = self.snapshot_path + '.tmp'
+        try:
+            write_snapshot(tmp_path, self.cars, self.seq, self.next_id)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+            raise
+        self.cars.base.close()
+        os.replace(tmp_path, self.snapshot_path)
+        sync_directory(os.path.dirname(os.path.abspath(self.snapshot_path)))
+        self.cars.reset(MappedCars(self.snapshot_path))
+
+    # Writes everything that is waiting to be written. Call it before the program exits.
+    def close(self):
+        self.flusher.flush()
+
+    # Picks up the changes other processes have made since the last poll: car changes are applied right away (see
+    # sync_cars), users, carts and stock are read again when next used. Returns the names of the stores that changed
+    # ("cars", "users", "carts", "stock").
+    def poll(self):
+        changed = self.generations.changed()
+        if not changed:
+            return changed
+        with self.lock:
+            if changed & {"cars", "snapshot"}:
+                self.sync_cars()
+            if "users" in changed:
+                self.refresh()  # drops the carts and stock too
+            elif "carts" in changed:
+                self.reload_carts()
+            if "stock" in changed:
+                self.stock = None
+        if "snapshot" in changed:
+            changed = changed - {"snapshot"} | {"cars"}
+        return changed
+
+    # Group commit for bulk changes: the lock is held throughout, journal records share one fsync and the user
+    # and cart files are written once at the end. Nobody else can write meanwhile, so nothing is re-read.
+    @contextlib.contextmanager
+    def batch(self):
+        with self.lock:
+            if not self.batching:
+                self.refresh()
+            self.batching += 1
+            try:
+                with self.journal.group(), self.writer.group():
+                    yield
+            finally:
+                self.batching -= 1
+
+    # loads the user database from a file, or initializes as empty if the file doesn't exist.
+    # The same dict is refreshed in place later on, so the UserDatabase holding it sees other processes' changes.
+    def load_users(self):
+        with self.lock:
+            self.refresh()
+        return self.users
+
+    # Re-reads users and carts from disk and finishes a purchase that was cut off before both were written.
+    # Very old user files stored only the password string per username. Called with the lock held.
+    def refresh(self):
+        if self.batching:
+            return  # the lock has been held since the batch began, so the files haven't changed
+        try:
+            users = load_pickle('user_database.pickle')
+        except FileNotFoundError:
+            users = {}
+        old_users = dict(self.users) if self.on_user_change else None
+        self.users.clear()
+        for username, data in users.items():
+            self.users[username] = User(username, data, 0.0, 1) if isinstance(data, str) else data
+        if old_users is not None:  # tell on_user_change about the users saved by other processes since
+            for username in old_users.keys() | self.users.keys():
+                user = self.users.get(username)
+                if getattr(old_users.get(username), "version", None) != getattr(user, "version", None):
+                    self.on_user_change(username, user)
+        self.carts = None
+        self.stock = None
+        try:
+            paid = load_pickle(self.pending_path)
+        except FileNotFoundError:
+            return
+        self.apply_purchase(paid)
+
+    # Adds or replaces a user; refused (ConflictError) if the stored record changed since `user` was read.
+    def save_user(self, username, user):
+        with self.lock:
+            self.refresh()
+            check_version(self.users.get(username), user)
+            user.version += 1
+            self.users[username] = user
+            self.save_users()
+
+    def delete_user(self, username):
+        with self.lock:
+            self.refresh()
+            self.users.pop(username, None)
+            self.save_users()
+
+    # Charges the user for their cart at the current car prices, takes the cars out of stock and empties the cart,
+    # all or nothing. Returns (updated user, total, items bought as (car ID, brand, model, price, quantity)), or None
+    # (and changes nothing) if the balance doesn't cover the cart; raises OutOfStock if there are fewer of a car left
+    # than the cart holds and CarGone if a car in it has been deleted.
+    # Car changes other processes made are read in first, so the cart is charged at the prices just saved.
+    # The result is first written to purchase.pending, so a crash between the files is finished by refresh().
+    def purchase(self, username):
+        with self.lock:
+            self.refresh()
+            self.sync_cars()
+            user = self.users[username]
+            lines = self.load_carts().get(username, {})
+            items = []
+            for car_id, quantity in lines.items():
+                car = self.cars.get(car_id)
+                if car is None:
+                    raise CarGone(car_id)
+                items.append((car_id, car.brand, car.model, car.price, quantity))
+            stock = self.load_stock()
+            for car_id, quantity in lines.items():
+                if car_id in stock and quantity > stock[car_id]:
+                    raise OutOfStock(car_id, stock[car_id])
+            total = sum(price * quantity for _, _, _, price, quantity in items)
+            if total > user.balance:
+                return None
+            paid = User(username, user.password, user.balance - total, user.version + 1)
+            left = None  # stock after the purchase, if it changes
+            if any(car_id in stock for car_id in lines):
+                left = {car_id: count - lines.get(car_id, 0) for car_id, count in stock.items()}
+            dump_atomic((paid, left), self.pending_path)
+            self.apply_purchase((paid, left))
+            return paid, total, items
+
+    # Writes a purchase to the user, cart and stock files (right away, even in a batch) and then drops
+    # purchase.pending. Older pending files hold only the user.
+    def apply_purchase(self, pending):
+        paid, left = pending if isinstance(pending, tuple) else (pending, None)
+        self.users[paid.username] = paid
+        with self.dirty_lock:
+            self.dirty_carts.pop(paid.username, None)
+        self.load_carts().pop(paid.username, None)
+        self.writer.dump(self.users, 'user_database.pickle', now=True)
+        self.writer.dump(self.carts, 'cart.pickle', now=True)
+        if left is not None:
+            self.stock = left
+            self.writer.dump(left, 'stock.pickle', now=True)
+        os.remove(self.pending_path)
+        self.generations.bump("users", "carts", *(["stock"] if left is not None else []))
+
+    # Stock of the cars whose stock is counted, as {car ID: cars in stock}. Re-read after other processes' changes
+    # once the users are (refresh()).
+    def load_stock(self):
+        if self.stock is None:
+            with self.lock:
+                try:
+                    self.stock = load_pickle('stock.pickle')
+                except FileNotFoundError:
+                    self.stock = {}
+        return self.stock
+
+    # Sets how many of a car are in stock; None stops counting them.
+    def set_stock(self, car_id, quantity):
+        with self.lock:
+            self.refresh()
+            stock = dict(self.load_stock())
+            if quantity is None:
+                stock.pop(car_id, None)
+            else:
+                stock[car_id] = quantity
+            self.stock = stock
+            self.writer.dump(stock, 'stock.pickle', now=True)
+            self.generations.bump("stock")
+
+    #saves the user database to a file.
+    def save_users(self):
+        with self.lock:
+            self.writer.dump(self.users, 'user_database.pickle')
+            self.generations.bump("users")
+
+    # Loads one user's cart as {car ID: quantity}, or an empty cart if the user has none.
+    def load_cart(self, username):
+        with self.dirty_lock:
+            if username in self.dirty_carts:
+                return dict(self.dirty_carts[username])
+        with self.lock:
+            self.reload_carts()
+            return dict(self.load_carts().get(username, {}))
+
+    # Loads every user's cart from a file, or initializes as empty if the file doesn't exist.
+    # Carts changed here but not written yet are laid over the file.
+    def load_carts(self):
+        if self.carts is None:
+            try:
+                self.carts = load_pickle('cart.pickle')
+            except FileNotFoundError:
+                self.carts = {}
+            if not isinstance(self.carts, dict):
+                self.carts = {}  # the old single cart shared by everyone can't be given to any one user
+            with self.dirty_lock:
+                self.set_carts(self.dirty_carts)
+        return self.carts
+
+    # Makes the next load_carts() read the file again, like refresh() but without re-reading the users.
+    # Called with the lock held.
+    def reload_carts(self):
+        if os.path.exists(self.pending_path):
+            self.refresh()  # finish the interrupted purchase first
+        elif not self.batching:
+            self.carts = None
+
+    # Stores carts ({username: lines}) in the loaded carts; an empty cart is removed.
+    def set_carts(self, changed):
+        for username, lines in changed.items():
+            if lines:
+                self.carts[username] = dict(lines)
+            else:
+                self.carts.pop(username, None)
+
+    # Saves one user's cart lines to the file holding all carts (write-behind, see flush_carts).
+    def save_cart(self, username, lines):
+        with self.dirty_lock:
+            self.dirty_carts[username] = dict(lines)
+        if self.batching:
+            self.flush_carts()
+        else:
+            self.flusher.mark_dirty(self.flush_carts)
+
+    # Writes the changed carts over a fresh read of cart.pickle, so other processes' carts are kept.
+    def flush_carts(self):
+        with self.lock:
+            self.reload_carts()
+            with self.dirty_lock:
+                changed = dict(self.dirty_carts)
+            self.load_carts()  # the file with the changed carts laid over it
+            self.save_carts()
+            with self.dirty_lock:
+                for username, lines in changed.items():
+                    if self.dirty_carts.get(username) is lines:  # not changed again while writing
+                        del self.dirty_carts[username]
+
+    def save_carts(self):
+        self.writer.dump(self.carts, 'cart.pickle')
+        self.generations.bump("carts")
+
+# Read-only dict view over the cars table, keyed by car ID. Lookups only fetch the rows that are asked for.
+class SqliteCars(Mapping):
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __getitem__(self, car_id):
+        row = self.conn.execute(f"SELECT {SqliteBackend.car_columns} FROM cars WHERE id = ?", (car_id,)).fetchone()
+        if row is None:
+            raise KeyError(car_id)
+        return car_from_row(row)
+
+    def __iter__(self):
+        for (car_id,) in self.conn.execute("SELECT id FROM cars ORDER BY id"):
+            yield car_id
+
+    def __len__(self):
+        return self.conn.execute("SELECT count(*) FROM cars").fetchone()[0]
+
+    def values(self):
+        for row in self.conn.execute(f"SELECT {SqliteBackend.car_columns} FROM cars ORDER BY id"):
+            yield car_from_row(row)
+
+# Stock counts in the SQLite database as a read-only mapping of car ID -> cars in stock.
+class SqliteStock(Mapping):
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __getitem__(self, car_id):
+        row = self.conn.execute("SELECT quantity FROM stock WHERE car_id = ?", (car_id,)).fetchone()
+        if row is None:
+            raise KeyError(car_id)
+        return row[0]
+
+    def __iter__(self):
+        for (car_id,) in self.conn.execute("SELECT car_id FROM stock ORDER BY car_id").fetchall():
+            yield car_id
+
+    def __len__(self):
+        return self.conn.execute("SELECT count(*) FROM stock").fetchone()[0]
+
+# Read-only dict view over the users table, looked up by username through its primary key index.
+class SqliteUsers(Mapping):
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __getitem__(self, username):
+        row = self.conn.execute("SELECT username, password, balance, version FROM users WHERE username = ?",
+                                (username,)).fetchone()
+        if row is None:
+            raise KeyError(username)
+        return User(*row)
+
+    def __contains__(self, username):
+        return self.conn.execute("SELECT 1 FROM users WHERE username = ?", (username,)).fetchone() is not None
+
+    def __iter__(self):
+        for (username,) in self.conn.execute("SELECT username FROM users ORDER BY rowid"):
+            yield username
+
+    def __len__(self):
+        return self.conn.execute("SELECT count(*) FROM users").fetchone()[0]
+
+# Keeps cars, users and carts in one SQLite database. Every change is its own transaction; user rows carry a
+# version that is checked and bumped on every update.
+class SqliteBackend:
+    car_columns = "id, brand, model, price, description, photo"
+    schema = """
+        CREATE TABLE IF NOT EXISTS cars (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            brand TEXT NOT NULL,
+            model TEXT NOT NULL,
+            price REAL NOT NULL,
+            description TEXT NOT NULL,
+            photo TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS cars_brand_model ON cars (brand COLLATE NOCASE, model COLLATE NOCASE);
+        CREATE INDEX IF NOT EXISTS cars_price ON cars (price);
+        CREATE TABLE IF NOT EXISTS users (
+            username TEXT PRIMARY KEY,
+            password TEXT NOT NULL,
+            balance REAL NOT NULL DEFAULT 0,
+            version INTEGER NOT NULL DEFAULT 1
+        );
+        CREATE TABLE IF NOT EXISTS stock (
+            car_id INTEGER PRIMARY KEY,
+            quantity INTEGER NOT NULL CHECK (quantity >= 0)
+        );
+        CREATE TABLE IF NOT EXISTS cart_items (
+            username TEXT NOT NULL,
+            car_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            PRIMARY KEY (username, car_id)
+        );
+    """
+
+    # Opens (or creates) the database. A newly created database is filled from the .pickle files once.
+    def __init__(self, path='carapp.db'):
+        is_new = not os.path.exists(path)
+        self.conn = sqlite3.connect(path, timeout=30)  # waits for other processes' transactions
+        self.conn.create_function("has_words", 4, has_words, deterministic=True)
+        self.conn.executescript(self.schema)
+        if "version" not in [column[1] for column in self.conn.execute("PRAGMA table_info(users)")]:
+            self.conn.execute("ALTER TABLE users ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+        # With a write-ahead log a commit is one sequential append and fsyncs only happen at checkpoints,
+        # so the many small transactions (cart clicks, admin saves) stay cheap; readers don't block the writer.
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        if is_new:
+            migrate(PickleBackend(), self)
+        self.data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        self.on_cars_reload = None  # called with the cars when other processes may have changed them
+        self.on_users_reload = None  # called when other processes may have changed users
+
+    # Names of the stores other processes may have changed since the last poll. SQLite moves data_version on every
+    # commit made through another connection, but doesn't tell which tables changed, so all of them are reported.
+    # Queries always read the database, so only what is kept from it (the Stats panel's numbers) is dropped.
+    def poll(self):
+        version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if version == self.data_version:
+            return set()
+        self.data_version = version
+        if self.on_cars_reload:
+            self.on_cars_reload(self.load_cars())
+        if self.on_users_reload:
+            self.on_users_reload()
+        return {"cars", "users", "carts", "stock"}
+
+    def load_cars(self):
+        return SqliteCars(self.conn)
+
+    # Stores a new car; SQLite picks its ID (never reusing the ID of a deleted car).
+    def add_car(self, car):
+        with self.conn:
+            cursor = self.conn.execute(f"INSERT INTO cars ({self.car_columns}) VALUES (?, ?, ?, ?, ?, ?)",
+                                       car_row(car))
+        car.car_id = cursor.lastrowid
+
+    # Adds many cars in one transaction. The IDs are handed out up front (after the highest ID ever used, as
+    # AUTOINCREMENT would), so the rows can go in with a single executemany.
+    def add_cars(self, cars):
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            row = self.conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'cars'").fetchone()
+            next_id = (row[0] if row else 0) + 1
+            for car_id, car in enumerate(cars, next_id):
+                car.car_id = car_id
+            self.conn.executemany(f"INSERT INTO cars ({self.car_columns}) VALUES (?, ?, ?, ?, ?, ?)",
+                                  map(car_row, cars))
+
+    # For bulk loads: the secondary indexes are dropped while the block runs and rebuilt at the end, since building
+    # an index once is several times faster than updating it row by row. Queries still work meanwhile, unindexed.
+    @contextlib.contextmanager
+    def bulk_load(self):
+        with self.conn:
+            self.conn.execute("DROP INDEX IF EXISTS cars_brand_model")
+            self.conn.execute("DROP INDEX IF EXISTS cars_price")
+        try:
+            yield
+        finally:
+            self.conn.executescript(self.schema)
+
+    # Replaces a car. Returns the car it replaced, or None (and changes nothing) if there is no such car (any more).
+    def update_car(self, car_id, car):
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            row = self.conn.execute(f"SELECT {self.car_columns} FROM cars WHERE id = ?", (car_id,)).fetchone()
+            if row is None:
+                return None
+            car.car_id = car_id
+            self.conn.execute("UPDATE cars SET brand = ?, model = ?, price = ?, description = ?, photo = ? "
+                              "WHERE id = ?", car_row(car)[1:] + (car_id,))
+        return car_from_row(row)
+
+    # Deletes a car and returns it (None if there is no such car).
+    def delete_car(self, car_id):
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            row = self.conn.execute(f"SELECT {self.car_columns} FROM cars WHERE id = ?", (car_id,)).fetchone()
+            self.conn.execute("DELETE FROM cars WHERE id = ?", (car_id,))
+        return car_from_row(row) if row else None
+
+    def save_cars(self):
+        pass  # every change is committed as it happens
+
+    def close(self):
+        self.conn.close()
+
+    # Same query as database.CarIndex.search, answered by SQLite with the brand/model and price indexes.
+    # Free text matches cars whose brand, model or description contain every word as a whole word (see has_words).
+    def search(self, brand=None, model=None, min_price=None, max_price=None, text=None, sort=None,
+               offset=0, limit=None):
+        where, params = ["1"], []
+        if brand:
+            where.append("brand = ? COLLATE NOCASE")
+            params.append(brand)
+        if model:
+            where.append("model = ? COLLATE NOCASE")
+            params.append(model)
+        if min_price is not None:
+            where.append("price >= ?")
+            params.append(min_price)
+        if max_price is not None:
+            where.append("price <= ?")
+            params.append(max_price)
+        for word in tokenize(text or ""):
+            if word.isascii():  # a LIKE first, so has_words only looks at the rows that may match
+                where.append("(brand || ' ' || model || ' ' || description) LIKE ? ESCAPE '\\'")
+                params.append(like_pattern(word))
+        if tokenize(text or ""):
+            where.append("has_words(brand, model, description, ?)")
+            params.append(" ".join(tokenize(text)))
+        condition = " AND ".join(where)
+        order = {"price": "price, id", "-price": "price DESC, id DESC",
+                 "brand": "brand COLLATE NOCASE, id", "-brand": "brand COLLATE NOCASE DESC, id DESC",
+                 "model": "model COLLATE NOCASE, id", "-model": "model COLLATE NOCASE DESC, id DESC"}.get(sort, "id")
+        total = self.conn.execute(f"SELECT count(*) FROM cars WHERE {condition}", params).fetchone()[0]
+        rows = self.conn.execute(f"SELECT {self.car_columns} FROM cars WHERE {condition} ORDER BY {order} "
+                                 "LIMIT ? OFFSET ?", params + [-1 if limit is None else limit, offset])
+        return total, [car_from_row(row) for row in rows]
+
+    def brands(self):
+        rows = self.conn.execute("SELECT DISTINCT brand FROM cars ORDER BY brand COLLATE NOCASE")
+        return [brand for (brand,) in rows]
+
+    def load_users(self):
+        return SqliteUsers(self.conn)
+
+    # Same as UserDatabase.search.
+    def search_users(self, text=None, sort=None, offset=0, limit=None):
+        condition, params = ("username LIKE ?", [f"%{text}%"]) if text else ("1", [])
+        order = {"username": "username COLLATE NOCASE", "-username": "username COLLATE NOCASE DESC",
+                 "balance": "balance, rowid", "-balance": "balance DESC, rowid"}.get(sort, "rowid")
+        total = self.conn.execute(f"SELECT count(*) FROM users WHERE {condition}", params).fetchone()[0]
+        rows = self.conn.execute(f"SELECT username, password, balance, version FROM users WHERE {condition} "
+                                 f"ORDER BY {order} LIMIT ? OFFSET ?",
+                                 params + [-1 if limit is None else limit, offset])
+        return total, [User(*row) for row in rows]
+
+    # Adds or replaces a user; refused (ConflictError) if the stored row changed since `user` was read.
+    def save_user(self, username, user):
+        with self.conn:
+            if user.version == 0:
+                try:
+                    self.conn.execute("INSERT INTO users (username, password, balance, version) VALUES (?, ?, ?, 1)",
+                                      (username, user.password, user.balance))
+                except sqlite3.IntegrityError:
+                    raise ConflictError(username)
+            elif self.conn.execute("UPDATE users SET password = ?, balance = ?, version = version + 1 "
+                                   "WHERE username = ? AND version = ?",
+                                   (user.password, user.balance, username, user.version)).rowcount == 0:
+                raise ConflictError(username)
+        user.version += 1
+
+    def delete_user(self, username):
+        with self.conn:
+            self.conn.execute("DELETE FROM users WHERE username = ?", (username,))
+
+    def save_users(self):
+        pass  # every change is committed as it happens
+
+    # Charges the user for their cart at the current car prices, takes the cars out of stock and empties the cart in
+    # one write transaction. Returns (updated user, total, items bought as (car ID, brand, model, price, quantity)),
+    # or None (and changes nothing) if the balance doesn't cover the cart. Raises OutOfStock and CarGone like
+    # PickleBackend.purchase().
+    def purchase(self, username):
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")  # no other writer until the commit
+            row = self.conn.execute("SELECT password, balance, version FROM users WHERE username = ?",
+                                    (username,)).fetchone()
+            if row is None:
+                raise KeyError(username)
+            password, balance, version = row
+            gone = self.conn.execute("SELECT car_id FROM cart_items WHERE username = ? AND car_id NOT IN "
+                                     "(SELECT id FROM cars)", (username,)).fetchone()
+            if gone:
+                raise CarGone(gone[0])  # rolls the transaction back
+            items = self.conn.execute("SELECT cars.id, cars.brand, cars.model, cars.price, cart_items.quantity "
+                                      "FROM cart_items JOIN cars ON cars.id = cart_items.car_id "
+                                      "WHERE cart_items.username = ?", (username,)).fetchall()
+            total = sum(price * quantity for _, _, _, price, quantity in items)
+            if total > balance:
+                return None
+            short = self.conn.execute("SELECT stock.car_id, stock.quantity FROM cart_items JOIN stock "
+                                      "ON stock.car_id = cart_items.car_id WHERE cart_items.username = ? "
+                                      "AND cart_items.quantity > stock.quantity", (username,)).fetchone()
+            if short:
+                raise OutOfStock(*short)  # rolls the transaction back
+            self.conn.execute("UPDATE stock SET quantity = quantity - (SELECT quantity FROM cart_items "
+                              "WHERE username = ? AND car_id = stock.car_id) "
+                              "WHERE car_id IN (SELECT car_id FROM cart_items WHERE username = ?)",
+                              (username, username))
+            self.conn.execute("UPDATE users SET balance = ?, version = version + 1 WHERE username = ?",
+                              (balance - total, username))
+            self.conn.execute("DELETE FROM cart_items WHERE username = ?", (username,))
+        return User(username, password, balance - total, version + 1), total, items
+
+    def load_stock(self):
+        return SqliteStock(self.conn)
+
+    def set_stock(self, car_id, quantity):
+        with self.conn:
+            if quantity is None:
+                self.conn.execute("DELETE FROM stock WHERE car_id = ?", (car_id,))
+            else:
+                self.conn.execute("INSERT OR REPLACE INTO stock (car_id, quantity) VALUES (?, ?)", (car_id, quantity))
+
+    def load_cart(self, username):
+        rows = self.conn.execute("SELECT car_id, quantity FROM cart_items WHERE username = ? ORDER BY rowid",
+                                 (username,))
+        return dict(rows.fetchall())
+
+    def save_cart(self, username, lines):
+        with self.conn:
+            self.conn.execute("DELETE FROM cart_items WHERE username = ?", (username,))
+            self.conn.executemany("INSERT INTO cart_items (username, car_id, quantity) VALUES (?, ?, ?)",
+                                  [(username, car_id, quantity) for car_id, quantity in lines.items()])
+
+def car_row(car):
+    return car.car_id, car.brand, car.model, car.price, car.description, car.photo
+
+def car_from_row(row):
+    return Car(*row[1:], car_id=row[0])
+
+# SQL function of SqliteBackend.search: whether a car's words (tokenize) include all of the space-separated words,
+# so SQLite matches free text exactly like CarIndex's token index.
+def has_words(brand, model, description, words):
+    return set(words.split()) <= set(tokenize(f"{brand} {model} {description}"))
+
+# LIKE pattern matching every text whose words (tokenize) include an ASCII word, and some more. "_" is escaped;
+# "i" and "k" match any one character, since "İ" and the Kelvin sign "K" lowercase to them.
+def like_pattern(word):
+    return "%" + word.replace("_", "\\_").replace("i", "_").replace("k", "_") + "%"
+
+# Copies everything a pickle backend loads (legacy formats included) into an SQLite backend in one transaction.
+def migrate(source, target):
+    cars = source.load_cars()
+    users = source.load_users()
+    carts = source.load_carts()
+    stock = source.load_stock()
+    with target.conn:
+        target.conn.executemany(f"INSERT INTO cars ({target.car_columns}) VALUES (?, ?, ?, ?, ?, ?)",
+                                [car_row(car) for car in cars.values()])
+        target.conn.executemany("INSERT OR REPLACE INTO users (username, password, balance, version) "
+                                "VALUES (?, ?, ?, ?)", [(username, user.password, user.balance, max(user.version, 1))
+                                                        for username, user in users.items()])
+        target.conn.executemany("INSERT INTO cart_items (username, car_id, quantity) VALUES (?, ?, ?)",
+                                [(username, car_id, quantity) for username, lines in carts.items()
+                                 for car_id, quantity in lines.items()])
+        target.conn.executemany("INSERT INTO stock (car_id, quantity) VALUES (?, ?)", stock.items())
+    return len(cars), len(users), len(carts)
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "migrate":
+        sys.exit("usage: python storage.py migrate [carapp.db]")
+    db_path = sys.argv[2] if len(sys.argv) > 2 else 'carapp.db'
+    if os.path.exists(db_path):
+        sys.exit(f"{db_path} already exists, nothing to migrate.")
+    with open(db_path, 'x'):
+        pass  # an existing (empty) file stops SqliteBackend from importing a second time
+    num_cars, num_users, num_carts = migrate(PickleBackend(), SqliteBackend(db_path))
+    print(f"Imported {num_cars} cars, {num_users} users and {num_carts} carts into {db_path}.")
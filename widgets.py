@@ -0,0 +1,223 @@
+"""
+Reusable Tkinter widgets for the car shop GUI.
+Router keeps exactly one full-window panel alive on screen and destroys (or hides and reuses) the one it replaces.
+VirtualGrid shows a long list as a scrollable grid but only builds widgets for the rows that are on screen.
+PagedTable shows a long table one page at a time, sorted and filtered by whoever holds the data.
+"""
+
+import math
+import time
+from tkinter import *
+from tkinter import ttk
+
+from profiling import metrics, widget_count
+
+# Switches between the app's full-window panels. The panel being left is destroyed, so its widgets and images are
+# freed, unless it was opened with keep=True: those panels are hidden, and showing them again only refreshes them.
+class Router:
+    def __init__(self, root, bg="black"):
+        self.root = root
+        self.bg = bg
+        self.current = None  # name of the panel on screen
+        self.frames = {}     # name -> frame of the panel on screen and of every kept panel
+        self.kept = {}       # name -> refresh callback of kept panels
+
+    # Replaces the panel on screen with a new, empty frame and returns it.
+    def open(self, name, keep=False, refresh=None):
+        self.leave()
+        frame = Frame(self.root, bg=self.bg)
+        frame.place(relx=0, rely=0, relwidth=1, relheight=1)
+        self.frames[name] = frame
+        if keep:
+            self.kept[name] = refresh
+        self.current = name
+        self.time_build(name)
+        return frame
+
+    # Shows a kept panel again (running its refresh callback). Returns False if it has to be built first.
+    def reopen(self, name):
+        if name not in self.kept:
+            return False
+        self.time_build(name)
+        if self.current != name:
+            self.leave()
+            self.frames[name].place(relx=0, rely=0, relwidth=1, relheight=1)
+            self.current = name
+        if self.kept[name]:
+            self.kept[name]()
+        return True
+
+    # With profiling on, records how long the panel takes to build (or refresh): from here until Tk is idle again,
+    # i.e. until the caller has created its widgets. Also records the panel's widget count.
+    def time_build(self, name):
+        if metrics.enabled:
+            self.root.after_idle(self.built, name, time.perf_counter())
+
+    def built(self, name, start):
+        metrics.record(f"panel.{name}", time.perf_counter() - start)
+        metrics.gauge("panel", name)
+        if name in self.frames:
+            metrics.gauge(f"widgets.{name}", widget_count(self.frames[name]))
+
+    # Drops a kept panel so that it is built from scratch the next time.
+    def discard(self, name):
+        self.kept.pop(name, None)
+        if name != self.current and name in self.frames:
+            self.frames.pop(name).destroy()
+
+    def leave(self):
+        if self.current is None:
+            return
+        if self.current in self.kept:
+            self.frames[self.current].place_forget()
+        else:
+            self.frames.pop(self.current).destroy()
+        self.current = None
+
+# Scrollable grid of equally sized cells. Widgets exist only for the rows inside the viewport (plus a few rows of
+# overscan) and are recycled as the user scrolls, so the widget count does not depend on the number of items.
+class VirtualGrid(Frame):
+    def __init__(self, master, count, make_cell, fill_cell, columns=3, row_height=260, overscan=1, bg="black"):
+        super().__init__(master, bg=bg)
+        self.count = count
+        self.make_cell = make_cell  # make_cell(parent) creates one empty cell widget
+        self.fill_cell = fill_cell  # fill_cell(cell, index) shows item number `index` in a cell
+        self.columns = columns
+        self.row_height = row_height
+        self.overscan = overscan
+        self.visible = {}  # item index -> (cell, canvas window id)
+        self.spare = []    # hidden cells waiting to be reused
+
+        self.canvas = Canvas(self, bg=bg, highlightthickness=0)
+        self.canvas.place(relx=0, rely=0, relwidth=0.97, relheight=1)
+        self.scrollbar = Scrollbar(self, orient="vertical", command=self.canvas.yview)
+        self.scrollbar.place(relx=0.97, rely=0, relwidth=0.03, relheight=1)
+        self.canvas.configure(yscrollcommand=self.on_scroll)
+        self.canvas.bind("<Configure>", lambda e: self.refresh(relayout=True))
+
+    # Changes the number of items and redraws the visible rows, e.g. after the underlying list has changed.
+    def set_count(self, count, to_top=False):
+        self.count = count
+        if to_top:
+            self.canvas.yview_moveto(0)
+        self.refresh(relayout=True)
+
+    def on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        self.refresh()
+
+    # Horizontal position and width of a column, same proportions as the old fixed layout.
+    def column_box(self, col):
+        width = self.canvas.winfo_width()
+        return int(0.05 * width + col * (0.3 * width)), int(0.25 * width)
+
+    # Works out which items are in view and gives each of them a cell, reusing cells that scrolled out of view.
+    def refresh(self, relayout=False):
+        num_rows = math.ceil(self.count / self.columns)
+        if relayout:
+            self.canvas.configure(scrollregion=(0, 0, self.canvas.winfo_width(), num_rows * self.row_height))
+        top = self.canvas.canvasy(0)
+        first_row = max(0, int(top // self.row_height) - self.overscan)
+        last_row = min(num_rows, int((top + self.canvas.winfo_height()) // self.row_height) + 1 + self.overscan)
+        wanted = range(first_row * self.columns, min(self.count, last_row * self.columns))
+
+        for index in list(self.visible):
+            if index not in wanted or relayout:
+                cell, window = self.visible.pop(index)
+                self.canvas.itemconfigure(window, state="hidden")
+                self.spare.append((cell, window))
+
+        for index in wanted:
+            if index in self.visible:
+                continue
+            if self.spare:
+                cell, window = self.spare.pop()
+            else:
+                cell = self.make_cell(self.canvas)
+                window = self.canvas.create_window(0, 0, window=cell, anchor="nw")
+            x, width = self.column_box(index % self.columns)
+            self.canvas.coords(window, x, (index // self.columns) * self.row_height)
+            self.canvas.itemconfigure(window, width=width, height=self.row_height, state="normal")
+            self.fill_cell(cell, index)
+            self.visible[index] = (cell, window)
+
+# Table of rows shown one page at a time in a ttk.Treeview, with a filter box and page navigation underneath.
+# The rows come from fetch(sort, text, offset, limit) -> (number of matches, [(key, values), ...]), so sorting,
+# filtering and paging are done by the store and the table only ever holds one page. Clicking the heading of a
+# sortable column sorts by it (sort is the column name, or "-name" after a second click); the filter is applied as
+# the user types.
+class PagedTable(Frame):
+    def __init__(self, master, columns, fetch, sortable=(), page_size=50, font=("Comic Sans Ms", 15), bg="black"):
+        super().__init__(master, bg=bg)
+        self.fetch = fetch
+        self.headings = {name: heading for name, heading, width in columns}
+        self.sortable = sortable
+        self.page_size = page_size
+        self.sort = None
+        self.page = 0
+        self.pages = 1
+        self.keys = {}  # Treeview item -> key of the row it shows
+        self.pending_filter = None  # after() id of a filter change waiting to be applied
+
+        style = ttk.Style(self)
+        style.configure("Shop.Treeview", font=font, rowheight=int(font[1] * 2.2))
+        style.configure("Shop.Treeview.Heading", font=(font[0], font[1], "bold"))
+        self.tree = ttk.Treeview(self, columns=[name for name, heading, width in columns], show="headings",
+                                 selectmode="browse", style="Shop.Treeview")
+        for name, heading, width in columns:
+            self.tree.heading(name, text=heading,
+                              command=(lambda n=name: self.sort_by(n)) if name in sortable else "")
+            self.tree.column(name, width=width, anchor="w")
+        self.tree.place(relx=0, rely=0, relwidth=0.97, relheight=0.88)
+        scrollbar = Scrollbar(self, orient="vertical", command=self.tree.yview)
+        scrollbar.place(relx=0.97, rely=0, relwidth=0.03, relheight=0.88)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+
+        Label(self, text="Filter", font=font, bg=bg, fg="white").place(relx=0, rely=0.9)
+        self.filter_entry = Entry(self, font=font)
+        self.filter_entry.place(relx=0.08, rely=0.9, relwidth=0.3)
+        self.filter_entry.bind("<KeyRelease>", self.filter_changed)
+        self.prev_btn = Button(self, text="< Prev", font=font, command=lambda: self.show_page(self.page - 1))
+        self.prev_btn.place(relx=0.5, rely=0.9, relwidth=0.12)
+        self.page_label = Label(self, font=font, bg=bg, fg="white")
+        self.page_label.place(relx=0.63, rely=0.9, relwidth=0.22)
+        self.next_btn = Button(self, text="Next >", font=font, command=lambda: self.show_page(self.page + 1))
+        self.next_btn.place(relx=0.86, rely=0.9, relwidth=0.12)
+
+    def sort_by(self, name):
+        self.sort = "-" + name if self.sort == name else name
+        for column in self.sortable:
+            arrow = "" if self.sort.lstrip("-") != column else (" ▼" if self.sort.startswith("-") else " ▲")
+            self.tree.heading(column, text=self.headings[column] + arrow)
+        self.show_page(0)
+
+    # Waits until the user stops typing for a moment, then shows the first page of matches.
+    def filter_changed(self, event=None):
+        if self.pending_filter:
+            self.after_cancel(self.pending_filter)
+        self.pending_filter = self.after(250, lambda: self.show_page(0))
+
+    def show_page(self, page):
+        self.pending_filter = None
+        text = self.filter_entry.get().strip() or None
+        page = max(0, min(page, self.pages - 1))
+        total, rows = self.fetch(self.sort, text, page * self.page_size, self.page_size)
+        self.pages = max(1, math.ceil(total / self.page_size))
+        if page >= self.pages:  # rows were deleted since: show the last page that is left
+            page = self.pages - 1
+            total, rows = self.fetch(self.sort, text, page * self.page_size, self.page_size)
+        self.page = page
+        self.tree.delete(*self.tree.get_children())
+        self.keys = {self.tree.insert("", "end", values=values): key for key, values in rows}
+        self.page_label.configure(text=f"Page {page + 1} of {self.pages}  ({total})")
+        self.prev_btn.configure(state=NORMAL if page > 0 else DISABLED)
+        self.next_btn.configure(state=NORMAL if page < self.pages - 1 else DISABLED)
+
+    # Shows the current page again, e.g. after rows were changed.
+    def refresh(self):
+        self.show_page(self.page)
+
+    # Key of the selected row, or None.
+    def selected(self):
+        selection = self.tree.selection()
+        return self.keys.get(selection[0]) if selection else None